@@ -1,144 +1,237 @@
-import streamlit as st
-import numpy as np
+import functools
+import os
 import time
-from PIL import Image
-import joblib 
-import pandas as pd 
-import plotly.graph_objects as go
-import country_converter as coco
-from map import make_diabetes_map
 
-# PATH MODEL
-MODEL_GABUNGAN_PATH = 'model_prediksi_diabetes_gabunganv1.joblib' 
-MODEL_NON_LAB_PATH = 'model_prediksi_diabetes_nonlabv1.joblib' 
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from config import INPUT_RANGES, LAB_RANGES, risk_category
+from model_registry import RegistryModelLoader
+from prediction_cache import PredictionCache
+from validation import get_schema, input_fields, validate_record
+from metrics import (EXPLAIN_SECONDS, INTERACTION_CPU_SECONDS, PREDICT_CACHE_TOTAL, PREDICT_FALLBACK_TOTAL,
+                     PREDICT_SECONDS, RERUN_SECONDS, STEP_RENDER_SECONDS, start_exporters, timed)
 
-OPTIMAL_THRESHOLD_GABUNGAN = 0.60 
+_RERUN_START = time.perf_counter()
+_RERUN_CPU_START = time.thread_time()
 
 # FUNGSI PEMUATAN MODEL + FITUR
 @st.cache_data
-def load_and_cache_image(image_path):
+def load_static_assets():
+    # Stylesheet tunggal + <picture> varian static/img/ (python assets.py build); None = tidak ada
+    from assets import picture_html, stylesheet
+    return stylesheet(), picture_html('diabetes', "Diabetes awareness", caption="Ilustrasi: Diabetes Awareness")
+
+@st.cache_resource
+def load_ai_models():
+    # Model dimuat di thread latar; halaman 1 & 2 tidak menunggu, prediksi di langkah 3 menunggu.
+    # Versi dari registri (DIALENS_MODEL_REGISTRY) jika ada, dipantau dan diganti tanpa restart.
+    # DIALENS_STUDENT=artifacts/students/tree → sajikan model murid hasil distilasi (distill.py)
+    from distill import STUDENT_DIR
+    return RegistryModelLoader(student_dir=STUDENT_DIR).start()
+
+@st.cache_resource
+def get_prediction_cache():
+    # Satu cache untuk semua sesi; ukuran & TTL lewat DIALENS_PREDICTION_CACHE_SIZE/_TTL
+    return PredictionCache()
+
+@st.cache_resource
+def get_explanation_cache():
+    # Atribusi per vektor fitur, terpisah dari cache probabilitas
+    return PredictionCache()
+
+@st.cache_resource
+def get_feature_store():
+    # Writer append-only untuk semua sesi; opt-in lewat DIALENS_FEATURE_STORE=<dir> (tidak di-set = mati)
+    from feature_store import get_writer
     try:
-        img = Image.open(image_path)
-        return img
-    except FileNotFoundError:
+        return get_writer()
+    except OSError:
         return None
 
 @st.cache_resource
-def load_ai_models():
-    time.sleep(1)
-    model_nl = joblib.load(MODEL_NON_LAB_PATH)
-    model_gab = joblib.load(MODEL_GABUNGAN_PATH)
-    features_nl = [str(f) for f in model_nl.feature_names_in_]
-    features_gab = [str(f) for f in model_gab.feature_names_in_]
-    return model_nl, model_gab, features_nl, features_gab
-
-try:
-    MODEL_NL, MODEL_GAB, FEATURE_LIST_NON_LAB, FEATURE_LIST_GABUNGAN = load_ai_models()
-    CACHED_IMAGE = load_and_cache_image('diabetes.jpg')
-    AI_MODELS_LOADED = True
-except Exception as e:
-    st.error(f"Gagal memuat model. Pastikan file .joblib ada. Error: {e}")
-    AI_MODELS_LOADED = False
-    MODEL_NL, MODEL_GAB = None, None
-    FEATURE_LIST_NON_LAB = []
-    FEATURE_LIST_GABUNGAN = []
+def get_drift_monitor():
+    # Sketsa drift per proses; opt-in lewat DIALENS_DRIFT=<dir> (tidak di-set = mati), referensi di DIALENS_DRIFT_REFERENCE
+    from drift import get_monitor
+    try:
+        return get_monitor()
+    except OSError:
+        return None
+
+@st.cache_resource
+def get_shadow_evaluator():
+    # Model kandidat (versi registri) lewat DIALENS_SHADOW_VERSIONS=v2,v3; kosong = mati
+    from shadow import SHADOW_VERSIONS, ShadowEvaluator
+    if not SHADOW_VERSIONS:
+        return None
+    return ShadowEvaluator(SHADOW_VERSIONS).start()
+
+@st.cache_resource
+def start_metrics_exporters():
+    # Endpoint /metrics dan/atau file teks lewat DIALENS_METRICS_PORT / DIALENS_METRICS_FILE
+    try:
+        return start_exporters()
+    except OSError:
+        return {}
+
+MODEL_LOADER = load_ai_models()
+PREDICTION_CACHE = get_prediction_cache()
+EXPLANATION_CACHE = get_explanation_cache()
+STYLESHEET, HERO_IMAGE = load_static_assets()
+start_metrics_exporters()
+
+def get_active_models():
+    # Diambil sekali per rerun: semua prediksi dalam satu permintaan memakai versi yang sama
+    if not MODEL_LOADER.done:
+        with st.spinner("Memuat model AI..."):
+            return MODEL_LOADER.get()
+    return MODEL_LOADER.get()
+
+def get_models():
+    return get_active_models().bundle
 
 # STATE MANAGEMENT
+# Nilai awal form langkah 2 (lab 0 = tidak diisi)
+DEFAULT_PROFILE = {
+    'Age': 35, 'DietQuality': 5, 'HealthLiteracy': 5, 'Smoking': 0, 'Hypertension': 0,
+    'FamilyHistoryDiabetes': 0, 'FrequentUrination': 0, 'ExcessiveThirst': 0, 'UnexplainedWeightLoss': 0,
+    'HbA1c': 0.0, 'FastingBloodSugar': 0.0,
+}
+LAB_INPUT_KEYS = {'HbA1c': 'hba1c_input', 'FastingBloodSugar': 'gdp_input'}
+
 if 'step' not in st.session_state:
     st.session_state.step = 1 
 if 'data_collected' not in st.session_state:
-    st.session_state.data_collected = {}
+    st.session_state.data_collected = dict(DEFAULT_PROFILE)
 
 def go_to_step(target_step):
+    # Dipakai sebagai on_click: state berubah sebelum rerun, langkah baru langsung tampil
     st.session_state.step = target_step
 
-def predict_ai(features_dict, model, feature_list):
+def fragment_section(step, unit):
+    # st.fragment + CPU thread skrip per rerun fragmen (rerun penuh tercatat sebagai unit 'app')
+    cpu = INTERACTION_CPU_SECONDS.labels(step, unit)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ctx = get_script_run_ctx()
+                if ctx is not None and ctx.fragment_ids_this_run:
+                    cpu.observe(time.thread_time() - start)
+        return st.fragment(wrapper)
+    return decorator
+
+def predict_ai(features_dict, model, feature_list, model_path=None, model_id=None):
+    model_label = model_path.rsplit('.', 1)[0] if model_path else 'unknown'
     if model is None or not hasattr(model, 'predict_proba'):
+        PREDICT_FALLBACK_TOTAL.labels(model_label, 'no_model').inc()
         return 0.5 
     try:
         input_values = [features_dict.get(feat) for feat in feature_list]
         if None in input_values:
+            PREDICT_FALLBACK_TOTAL.labels(model_label, 'missing_feature').inc()
             return 0.5
-        df_input = pd.DataFrame([input_values], columns=feature_list)
-        prob = model.predict_proba(df_input)[0, 1] 
+        if model_path:
+            prob = PREDICTION_CACHE.get(model_path, model_id, input_values)
+            if prob is not None:
+                PREDICT_CACHE_TOTAL.labels(model_label, 'hit').inc()
+                return prob
+            PREDICT_CACHE_TOTAL.labels(model_label, 'miss').inc()
+        with PREDICT_SECONDS.labels(model_label, type(model).__name__).time():
+            if hasattr(model, 'predict_row'):
+                prob = model.predict_row(input_values)
+            else:
+                import pandas as pd
+                df_input = pd.DataFrame([input_values], columns=feature_list)
+                prob = model.predict_proba(df_input)[0, 1] 
+        if model_path:
+            PREDICTION_CACHE.put(model_path, model_id, input_values, prob)
         return prob
     except Exception as e:
+        PREDICT_FALLBACK_TOTAL.labels(model_label, 'error').inc()
         return 0.5
 
+def explain_ai(features_dict, explainer, feature_list, model_path, model_id):
+    # [(label, nilai, kontribusi poin probabilitas)]; kosong jika atribusi tidak tersedia
+    if explainer is None:
+        return []
+    try:
+        input_values = [features_dict.get(feat) for feat in feature_list]
+        if None in input_values:
+            return []
+        contributions = EXPLANATION_CACHE.get(model_path, model_id, input_values)
+        if contributions is None:
+            with EXPLAIN_SECONDS.labels(model_path.rsplit('.', 1)[0]).time():
+                contributions, _ = explainer.explain_row(input_values)
+            EXPLANATION_CACHE.put(model_path, model_id, input_values, contributions)
+        from explain import top_factors
+        return top_factors(contributions, feature_list, input_values)
+    except Exception:
+        return []
+
+def store_submission(data, prob_nl, prob_gab, final_risk):
+    # Sekali per submission: rerun dari slider what-if atau tombol lain tidak menambah rekaman
+    key = tuple(sorted(data.items()))
+    if st.session_state.get('stored_submission') == key:
+        return
+    writer = get_feature_store()
+    if writer is None:
+        return
+    try:
+        writer.append({**data, 'prob_nl': prob_nl, 'prob_gab': prob_gab, 'final_band': final_risk})
+        st.session_state.stored_submission = key
+    except Exception:
+        pass
+
+def monitor_submission(data, prob_nl, prob_gab):
+    # Hanya menambah hitungan sketsa (submission tidak disimpan); sekali per submission
+    key = tuple(sorted(data.items()))
+    if st.session_state.get('monitored_submission') == key:
+        return
+    monitor = get_drift_monitor()
+    if monitor is None:
+        return
+    monitor.record(data, prob_nl, prob_gab)
+    st.session_state.monitored_submission = key
+
+def shadow_submission(data, active, input_nl, prob_nl, input_gab, prob_gab):
+    # Hanya antre ke worker latar (tanpa menunggu); sekali per submission seperti store_submission
+    key = tuple(sorted(data.items()))
+    if st.session_state.get('shadowed_submission') == key:
+        return
+    evaluator = get_shadow_evaluator()
+    if evaluator is None:
+        return
+    models = active.bundle
+    evaluator.submit('nl', [input_nl[f] for f in models.features_nl], models.features_nl, prob_nl, active)
+    if input_gab is not None:
+        evaluator.submit('gab', [input_gab[f] for f in models.features_gab], models.features_gab, prob_gab, active)
+    st.session_state.shadowed_submission = key
+
 # STYLING
 st.set_page_config(page_title="DiaLens App", layout="centered", initial_sidebar_state="collapsed")
-st.markdown("""
-    <style>
-    .centered-text { text-align: center; margin-bottom: 20px; }
-    .big-title { font-size: 2.5em; font-weight: bold; color: #DDDDDD; }
-    .subtitle { font-size: 1.5em; font-weight: 500; color: #BBBBBB; margin-top: 15px; } 
-    .instruction-text { font-size: 1em; color: #AAAAAA; margin-bottom: 40px; }
-    .footer-text { text-align: center; margin-top: 50px; color: #6c757d; }
-    .stButton>button {
-        width: 100%; height: 50px; font-size: 1.2em; font-weight: bold; border-radius: 8px;
-        background-color: #38a745; color: white; border: none;
-    }
-    .stButton>button:focus:not(.st-ex):nth-child(1) { background-color: #6c757d; color: white; }
-    .step-header { font-size: 1.8em; font-weight: bold; color: #DDDDDD;}
-    </style>
-""", unsafe_allow_html=True)
+# Satu elemen identik di tiap rerun → setelah pertama dikirim sebagai referensi hash (lihat assets.py)
+if STYLESHEET:
+    st.markdown(STYLESHEET, unsafe_allow_html=True)
 
 # STEP 1: WELCOME
+@timed(STEP_RENDER_SECONDS, '1')
 def display_step_1():
-    st.markdown(
-        """
-        <style>
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .welcome-title {
-            font-size: 2.8em;
-            font-weight: 700;
-            color: #E76F51;
-            text-align: center;
-            margin: 20px 0 10px;
-            animation: fadeIn 0.8s ease-out;
-        }
-        .welcome-subtitle {
-            font-size: 1.4em;
-            color: #2A9D8F;
-            text-align: center;
-            margin-bottom: 30px;
-            animation: fadeIn 0.8s ease-out 0.2s both;
-        }
-        .welcome-instruction {
-            font-size: 1.1em;
-            color: #6C757D;
-            text-align: center;
-            max-width: 600px;
-            margin: 0 auto 40px;
-            line-height: 1.6;
-            animation: fadeIn 0.8s ease-out 0.4s both;
-        }
-        .footer-step {
-            text-align: center;
-            margin-top: 30px;
-            color: #ADB5BD;
-            font-size: 0.9em;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
     st.markdown('<div class="welcome-title">🩺 Selamat Datang di DiaLens!</div>', unsafe_allow_html=True)
     st.markdown('<div class="welcome-subtitle">AI untuk Deteksi Risiko Diabetes yang Cerdas & Personal</div>', unsafe_allow_html=True)
     
     col_img_left, col_img_center, col_img_right = st.columns([1, 5, 1])
     with col_img_center:
-        if CACHED_IMAGE:
-            st.image(CACHED_IMAGE, use_container_width=True, caption="Ilustrasi: Diabetes Awareness")
+        if HERO_IMAGE:
+            st.markdown(HERO_IMAGE, unsafe_allow_html=True)
+        elif os.path.exists('diabetes.jpg'):
+            # Varian belum dibuat: kirim file asli apa adanya (tanpa decode/encode ulang PIL)
+            st.image('diabetes.jpg', use_container_width=True, caption="Ilustrasi: Diabetes Awareness")
         else:
-            st.markdown(
-                '<div style="background:#f8f9fa; height:200px; display:flex; align-items:center; justify-content:center; border-radius:10px; color:#6c757d;">Gambar tidak tersedia</div>',
-                unsafe_allow_html=True
-            )
+            st.markdown('<div class="hero-placeholder">Gambar tidak tersedia</div>', unsafe_allow_html=True)
 
     st.markdown(
         '<div class="welcome-instruction">Lengkapi profil kesehatan Anda dalam 2 menit, dan dapatkan prediksi risiko diabetes berbasis AI — dengan atau tanpa data laboratorium.</div>',
@@ -147,313 +240,305 @@ def display_step_1():
 
     col_btn_left, col_btn_center, col_btn_right = st.columns([1, 2, 1])
     with col_btn_center:
-        if st.button("✨ Mulai Sekarang", key="btn_mulai", use_container_width=True):
-            go_to_step(2)
+        st.button("✨ Mulai Sekarang", key="btn_mulai", use_container_width=True, on_click=go_to_step, args=(2,))
 
     st.markdown('<div class="footer-step">Langkah 1 dari 3</div>', unsafe_allow_html=True)
 
-# STEP 2: INPUT DATA
-def display_step_2():
-    st.markdown(
-        """
-        <style>
-        .section-header {
-            font-size: 1.6em;
-            font-weight: 600;
-            color: #E76F51;
-            margin: 1.8rem 0 1rem;
-            padding-bottom: 0.4rem;
-            border-bottom: 2px solid #f0f0f0;
-        }
-        .input-hint {
-            font-size: 0.85em;
-            color: #6c757d;
-            margin-top: -8px;
-            margin-bottom: 12px;
-        }
-        .required::after {
-            content: " *";
-            color: #E76F51;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
-    st.markdown('<div class="step-header">📝 Profil Kesehatan Pribadi</div>', unsafe_allow_html=True)
-    st.markdown("Lengkapi data di bawah ini untuk mendapatkan prediksi risiko diabetes yang akurat.")
-
-    if not FEATURE_LIST_NON_LAB or not AI_MODELS_LOADED:
-        st.error("⚠️ Model atau fitur tidak tersedia. Periksa file .joblib.")
-        return
+# STEP 2: BAGIAN INPUT (FRAGMEN)
+# Tiap bagian adalah st.fragment: mengubah satu input hanya menjalankan ulang bagiannya sendiri,
+# bukan seluruh app.py (CSS global, cek model, bagian lain). Nilai masuk ke data_collected lewat
+# callback on_change; nilai awal widget diambil dari data_collected (mis. kembali dari langkah 3).
+def yes_no(x):
+    return "❌ Tidak" if x == 0 else "✅ Ya"
+
+def init_widget(key, value):
+    if key not in st.session_state:
+        st.session_state[key] = value
+
+def collect_input(field, key, cast=None):
+    value = st.session_state[key]
+    st.session_state.data_collected[field] = cast(value) if cast else value
+
+def collect_lab_inputs():
+    # Validasi + koersi lewat skema yang sama dengan skor batch (validation.py).
+    # Nilai lab kosong / tidak valid disimpan sebagai 0 (= tidak diisi, diganti nilai normal).
+    checked = validate_record({col: st.session_state[key] for col, key in LAB_INPUT_KEYS.items()})
+    imputed = checked.imputed_fields()
+    for col, value in checked.record(0, list(LAB_INPUT_KEYS)).items():
+        st.session_state.data_collected[col] = 0.0 if col in imputed else value
+    st.session_state.lab_rejected = checked.rejected_fields()
+
+@fragment_section('2', 'dasar')
+def section_basic():
+    data = st.session_state.data_collected
+    for field, key in (('Age', 'age'), ('DietQuality', 'diet'), ('HealthLiteracy', 'literacy'), ('Smoking', 'smoking')):
+        init_widget(key, data[field])
 
-    #BAGIAN 1: DATA NON-LAB (WAJIB)
-    st.markdown('<div class="section-header required">Data Dasar & Gaya Hidup (Wajib)</div>', unsafe_allow_html=True)
-    
     with st.container(border=True):
         col1, col2 = st.columns(2)
 
         with col1:
-            st.session_state.data_collected['Age'] = st.number_input(
+            st.number_input(
                 "Usia (Tahun)",
-                min_value=20,
-                max_value=90,
-                value=35,
+                min_value=INPUT_RANGES['Age'][0],
+                max_value=INPUT_RANGES['Age'][1],
                 step=1,
-                key="age"
+                key="age",
+                on_change=collect_input,
+                args=('Age', 'age')
             )
             st.caption("Rentang usia: 20–90 tahun")
 
-            st.session_state.data_collected['DietQuality'] = st.slider(
+            st.slider(
                 "Kualitas Diet",
-                0,
-                10,
-                5,
+                *INPUT_RANGES['DietQuality'],
                 key="diet",
-                help="0 = Pola makan tidak sehat, 10 = Sangat seimbang (sayur, buah, serat tinggi, gula rendah)"
+                help="0 = Pola makan tidak sehat, 10 = Sangat seimbang (sayur, buah, serat tinggi, gula rendah)",
+                on_change=collect_input,
+                args=('DietQuality', 'diet')
             )
             st.markdown('<div class="input-hint">Skor 7+ umumnya terkait risiko lebih rendah</div>', unsafe_allow_html=True)
 
         with col2:
-            st.session_state.data_collected['HealthLiteracy'] = st.slider(
+            st.slider(
                 "Literasi Kesehatan",
-                0,
-                10,
-                5,
+                *INPUT_RANGES['HealthLiteracy'],
                 key="literacy",
-                help="Seberapa paham Anda tentang informasi kesehatan, pencegahan, dan pengelolaan penyakit"
+                help="Seberapa paham Anda tentang informasi kesehatan, pencegahan, dan pengelolaan penyakit",
+                on_change=collect_input,
+                args=('HealthLiteracy', 'literacy')
             )
             st.markdown('<div class="input-hint">Pemahaman kesehatan memengaruhi keputusan pencegahan</div>', unsafe_allow_html=True)
 
-            st.session_state.data_collected['Smoking'] = st.radio(
+            st.radio(
                 "Apakah Anda merokok?",
                 [0, 1],
-                format_func=lambda x: "❌ Tidak" if x == 0 else "✅ Ya",
+                format_func=yes_no,
                 horizontal=True,
-                key="smoking"
+                key="smoking",
+                on_change=collect_input,
+                args=('Smoking', 'smoking')
             )
 
+@fragment_section('2', 'riwayat')
+def section_history():
+    data = st.session_state.data_collected
+    for field, key in (('Hypertension', 'hyper'), ('FamilyHistoryDiabetes', 'family')):
+        init_widget(key, data[field])
+    # Checkbox memegang bool; data_collected menyimpan 0/1
+    for field, key in (('FrequentUrination', 'urine'), ('ExcessiveThirst', 'thirst'), ('UnexplainedWeightLoss', 'weight')):
+        init_widget(key, bool(data[field]))
 
-    #BAGIAN 2: RIWAYAT & GEJALA
-    st.markdown('<div class="section-header required">Riwayat Kesehatan & Gejala</div>', unsafe_allow_html=True)
-    
     with st.container(border=True):
         col_left, col_right = st.columns(2)
 
         with col_left:
-            st.session_state.data_collected['Hypertension'] = st.radio(
+            st.radio(
                 "Apakah Anda memiliki hipertensi (tekanan darah tinggi)?",
                 [0, 1],
-                format_func=lambda x: "❌ Tidak" if x == 0 else "✅ Ya",
+                format_func=yes_no,
                 horizontal=True,
-                key="hyper"
+                key="hyper",
+                on_change=collect_input,
+                args=('Hypertension', 'hyper')
             )
-            st.session_state.data_collected['FamilyHistoryDiabetes'] = st.radio(
+            st.radio(
                 "Apakah ada anggota keluarga dekat (orang tua/saudara) dengan diabetes?",
                 [0, 1],
-                format_func=lambda x: "❌ Tidak" if x == 0 else "✅ Ya",
+                format_func=yes_no,
                 horizontal=True,
-                key="family"
+                key="family",
+                on_change=collect_input,
+                args=('FamilyHistoryDiabetes', 'family')
             )
 
         with col_right:
             st.markdown("**Gejala Klinis (centang jika pernah mengalami):**")
-            st.session_state.data_collected['FrequentUrination'] = st.checkbox(
-                "Sering buang air kecil (terutama malam hari)", key="urine"
+            st.checkbox(
+                "Sering buang air kecil (terutama malam hari)", key="urine",
+                on_change=collect_input, args=('FrequentUrination', 'urine', int)
             )
-            st.session_state.data_collected['ExcessiveThirst'] = st.checkbox(
-                "Rasa haus berlebihan yang tidak biasa", key="thirst"
+            st.checkbox(
+                "Rasa haus berlebihan yang tidak biasa", key="thirst",
+                on_change=collect_input, args=('ExcessiveThirst', 'thirst', int)
             )
-            st.session_state.data_collected['UnexplainedWeightLoss'] = st.checkbox(
-                "Penurunan berat badan tanpa diet atau olahraga", key="weight"
+            st.checkbox(
+                "Penurunan berat badan tanpa diet atau olahraga", key="weight",
+                on_change=collect_input, args=('UnexplainedWeightLoss', 'weight', int)
             )
 
-            # Konversi checkbox ke 0/1
-            for key in ['FrequentUrination', 'ExcessiveThirst', 'UnexplainedWeightLoss']:
-                st.session_state.data_collected[key] = int(st.session_state.data_collected[key])
-
-    # BAGIAN 3: DATA LAB 
-    st.markdown('<div class="section-header">Data Laboratorium (Opsional, Tapi Sangat Direkomendasikan)</div>', unsafe_allow_html=True)
-    st.info("💡 Jika Anda pernah melakukan pemeriksaan gula darah, masukkan nilainya. Jika tidak, biarkan **0** — sistem akan gunakan nilai normal.")
+@fragment_section('2', 'lab')
+def section_lab():
+    data = st.session_state.data_collected
+    if any(key not in st.session_state for key in LAB_INPUT_KEYS.values()):
+        # Input dibuat ulang dari data_collected (nilai valid saja): peringatan lama tidak berlaku
+        st.session_state.lab_rejected = []
+    for col, key in LAB_INPUT_KEYS.items():
+        init_widget(key, f"{data[col]:g}")
+    rejected = st.session_state.get('lab_rejected', [])
 
     with st.container(border=True):
         lab_col1, lab_col2 = st.columns(2)
 
         with lab_col1:
-            hba1c_input = st.text_input(
+            st.text_input(
                 "HbA1c (%) – Rata-rata gula darah 2–3 bulan terakhir",
-                value="0",
                 help="Normal: 4.0–5.6% | Prediabetes: 5.7–6.4% | Diabetes: ≥6.5%",
-                key="hba1c_input"
+                key="hba1c_input",
+                on_change=collect_lab_inputs
             )
-            try:
-                hba1c_val = float(hba1c_input.strip())
-                hba1c_val = hba1c_val if hba1c_val != 0 and 4.0 <= hba1c_val <= 10.0 else 0.0
-            except ValueError:
-                hba1c_val = 0.0
-                st.warning("⚠️ Format HbA1c tidak valid. Gunakan angka desimal seperti 5.7 atau 0.")
-            st.session_state.data_collected['HbA1c'] = hba1c_val
+            if 'HbA1c' in rejected:
+                low, high = LAB_RANGES['HbA1c']
+                st.warning(f"⚠️ HbA1c tidak valid atau di luar rentang {low:g}–{high:g}%. Contoh: 5.7 atau 0.")
 
         with lab_col2:
-            gdp_input = st.text_input(
+            st.text_input(
                 "Gula Darah Puasa (mg/dL)",
-                value="0",
                 help="Normal: 70–99 | Prediabetes: 100–125 | Diabetes: ≥126",
-                key="gdp_input"
+                key="gdp_input",
+                on_change=collect_lab_inputs
             )
-            try:
-                gdp_val = float(gdp_input.strip())
-                gdp_val = gdp_val if gdp_val != 0 and 70 <= gdp_val <= 200 else 0.0
-            except ValueError:
-                gdp_val = 0.0
-                st.warning("⚠️ Format gula darah tidak valid. Contoh: 95 atau 0.")
-            st.session_state.data_collected['FastingBloodSugar'] = gdp_val
+            if 'FastingBloodSugar' in rejected:
+                low, high = LAB_RANGES['FastingBloodSugar']
+                st.warning(f"⚠️ Gula darah tidak valid atau di luar rentang {low:g}–{high:g} mg/dL. Contoh: 95 atau 0.")
+
+# STEP 2: INPUT DATA
+@timed(STEP_RENDER_SECONDS, '2')
+def display_step_2():
+    st.markdown('<div class="step-header">📝 Profil Kesehatan Pribadi</div>', unsafe_allow_html=True)
+    st.markdown("Lengkapi data di bawah ini untuk mendapatkan prediksi risiko diabetes yang akurat.")
+
+    if MODEL_LOADER.failed:
+        st.error("⚠️ Model atau fitur tidak tersedia. Periksa file .joblib.")
+        return
+
+    #BAGIAN 1: DATA NON-LAB (WAJIB)
+    st.markdown('<div class="section-header required">Data Dasar & Gaya Hidup (Wajib)</div>', unsafe_allow_html=True)
+    section_basic()
+
+    #BAGIAN 2: RIWAYAT & GEJALA
+    st.markdown('<div class="section-header required">Riwayat Kesehatan & Gejala</div>', unsafe_allow_html=True)
+    section_history()
+
+    # BAGIAN 3: DATA LAB 
+    st.markdown('<div class="section-header">Data Laboratorium (Opsional, Tapi Sangat Direkomendasikan)</div>', unsafe_allow_html=True)
+    st.info("💡 Jika Anda pernah melakukan pemeriksaan gula darah, masukkan nilainya. Jika tidak, biarkan **0** — sistem akan gunakan nilai normal.")
+    section_lab()
 
     # NAVIGASI
     st.markdown("<br>", unsafe_allow_html=True)
     nav1, nav2 = st.columns([1, 1])
 
     with nav1:
-        if st.button("← Kembali ke Beranda", use_container_width=True, key="back2"):
-            go_to_step(1)
+        st.button("← Kembali ke Beranda", use_container_width=True, key="back2", on_click=go_to_step, args=(1,))
 
     with nav2:
         # Validasi kelengkapan data non-lab
-        required_keys = ['Age', 'DietQuality', 'HealthLiteracy', 'Smoking', 'Hypertension',
-                         'FamilyHistoryDiabetes', 'FrequentUrination', 'ExcessiveThirst',
-                         'UnexplainedWeightLoss']
-        incomplete = [k for k in required_keys if st.session_state.data_collected.get(k) is None]
+        incomplete = validate_record(st.session_state.data_collected).error_fields()
 
         if incomplete:
             st.error(f"❌ Mohon lengkapi semua data wajib: {', '.join(incomplete)}")
         else:
-            if st.button("➡️ Lihat Hasil Prediksi", use_container_width=True, key="next2", type="primary"):
-                go_to_step(3)
-
-    st.markdown('<div class="footer-text">Langkah 2 dari 3 • Semua data disimpan hanya di perangkat Anda</div>', unsafe_allow_html=True)
-
-# STEP 3: HASIL PREDIKSI + KONTEKS GLOBAL
-
-def display_step_3():
-    st.markdown(
-        """
-        <style>
-        .risk-high { color: #E76F51; font-weight: bold; }
-        .risk-medium { color: #F4A261; font-weight: bold; }
-        .risk-low { color: #2A9D8F; font-weight: bold; }
-        .recommendation-box {
-            padding: 16px;
-            border-radius: 10px;
-            margin: 16px 0;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
-    st.markdown('<div class="step-header">📊 Hasil Prediksi Risiko Diabetes</div>', unsafe_allow_html=True)
-    st.markdown("---")
-    data = st.session_state.data_collected
+            st.button("➡️ Lihat Hasil Prediksi", use_container_width=True, key="next2", type="primary",
+                      on_click=go_to_step, args=(3,))
+
+    if get_feature_store() is None:
+        storage_note = 'Semua data disimpan hanya di perangkat Anda'
+    else:
+        storage_note = 'Jawaban disimpan tanpa identitas di server untuk evaluasi model'
+    st.markdown(f'<div class="footer-text">Langkah 2 dari 3 • {storage_note}</div>', unsafe_allow_html=True)
+
+# STEP 3: BAGIAN HASIL
+# Prediksi dihitung sekali per (profil, versi model) dan disimpan di session_state; kartu hasil dan
+# rekomendasi hanya render ulang. Simulasi what-if dan peta adalah fragmen terpisah.
+def get_results(data, active):
+    key = (tuple(sorted(data.items())), active.version, active.non_lab_path, active.gabungan_path,
+           tuple(sorted(active.thresholds.items())))
+    memo = st.session_state.get('results')
+    if memo is not None and memo[0] == key:
+        return memo[1]
+
+    models = active.bundle
+    # Skema dari feature_names_in_ model aktif
+    checked = validate_record(data, get_schema(input_fields(models.features_nl, models.features_gab)))
+    results = {'errors': checked.error_fields()}
+    if not results['errors']:
+        # --- MODEL NON-LAB (SELALU DITAMPILKAN) ---
+        input_nl = checked.record(0, models.features_nl)
+        id_nl, id_gab = models.model_ids
+        prob_nl = predict_ai(input_nl, models.table_nl or models.fast_nl or models.model_nl,
+                             models.features_nl, active.non_lab_path, id_nl)
+
+        # --- MODEL GABUNGAN (JIKA ADA DATA LAB) ---
+        lab_available = bool(checked.lab_available[0])
+        input_gab = prob_gab = risk_gab = None
+        if lab_available:
+            input_gab = checked.record(0, models.features_gab)
+            prob_gab = predict_ai(input_gab, models.fast_gab or models.model_gab, models.features_gab,
+                                  active.gabungan_path, id_gab)
+            risk_gab = risk_category(prob_gab, *active.thresholds['gabungan'])
+
+        # 🔎 FAKTOR PALING BERPENGARUH (model yang menentukan risiko akhir)
+        if lab_available:
+            factors = explain_ai(input_gab, models.explain_gab, models.features_gab, active.gabungan_path, id_gab)
+        else:
+            factors = explain_ai(input_nl, models.explain_nl, models.features_nl, active.non_lab_path, id_nl)
+
+        risk_nl = risk_category(prob_nl, *active.thresholds['nonlab'])
+        results.update(
+            input_nl=input_nl, prob_nl=prob_nl, risk_nl=risk_nl,
+            lab_available=lab_available, lab_imputed=bool(checked.imputed_fields()),
+            input_gab=input_gab, prob_gab=prob_gab, risk_gab=risk_gab,
+            factors=factors, final_risk=risk_gab if risk_gab else risk_nl,
+        )
+    st.session_state.results = (key, results)
+    return results
 
-    # --- MODEL NON-LAB (SELALU DITAMPILKAN) ---
-    input_nl = {f: data[f] for f in FEATURE_LIST_NON_LAB}
-    prob_nl = predict_ai(input_nl, MODEL_NL, FEATURE_LIST_NON_LAB)
-    risk_nl = "Tinggi" if prob_nl >= OPTIMAL_THRESHOLD_GABUNGAN else ("Sedang" if prob_nl >= 0.5 else "Rendah")
+def risk_css(risk):
+    return "risk-high" if risk == "Tinggi" else ("risk-medium" if risk == "Sedang" else "risk-low")
 
+def render_prediction_cards(results):
     st.subheader("🧠 Prediksi Berbasis Gaya Hidup & Riwayat (Tanpa Lab)")
     with st.container(border=True):
-        risk_color = "risk-high" if risk_nl == "Tinggi" else ("risk-medium" if risk_nl == "Sedang" else "risk-low")
-        st.markdown(f"**Tingkat Risiko**: <span class='{risk_color}'>{risk_nl}</span>", unsafe_allow_html=True)
-        st.markdown(f"**Probabilitas**: {prob_nl:.1%}")
-        st.progress(float(prob_nl))
-
-    # --- CEK DATA LAB ---
-    hba1c_raw = data.get('HbA1c', 0)
-    gdp_raw = data.get('FastingBloodSugar', 0)
-    lab_available = (hba1c_raw != 0) or (gdp_raw != 0)
-
-    prob_gab = None
-    risk_gab = None
-
-    if lab_available:
-        input_gab = {}
-        for feat in FEATURE_LIST_GABUNGAN:
-            val = data.get(feat)
-            if feat == 'HbA1c' and val == 0:
-                val = 5.5
-            elif feat == 'FastingBloodSugar' and val == 0:
-                val = 95.0
-            input_gab[feat] = val
-
-        prob_gab = predict_ai(input_gab, MODEL_GAB, FEATURE_LIST_GABUNGAN)
-        risk_gab = "Tinggi" if prob_gab >= OPTIMAL_THRESHOLD_GABUNGAN else ("Sedang" if prob_gab >= 0.5 else "Rendah")
+        st.markdown(f"**Tingkat Risiko**: <span class='{risk_css(results['risk_nl'])}'>{results['risk_nl']}</span>", unsafe_allow_html=True)
+        st.markdown(f"**Probabilitas**: {results['prob_nl']:.1%}")
+        st.progress(float(results['prob_nl']))
 
+    if results['lab_available']:
         st.subheader("🧪 Prediksi dengan Data Laboratorium")
-        if hba1c_raw == 0 or gdp_raw == 0:
+        if results['lab_imputed']:
             st.warning("⚠️ Sebagian data lab diasumsikan normal karena tidak diisi.")
         else:
             st.success("✅ Prediksi diperkuat dengan hasil laboratorium Anda!")
 
         with st.container(border=True):
-            risk_color = "risk-high" if risk_gab == "Tinggi" else ("risk-medium" if risk_gab == "Sedang" else "risk-low")
-            st.markdown(f"**Tingkat Risiko**: <span class='{risk_color}'>{risk_gab}</span>", unsafe_allow_html=True)
-            st.markdown(f"**Probabilitas**: {prob_gab:.1%}")
-            st.progress(float(prob_gab))
+            st.markdown(f"**Tingkat Risiko**: <span class='{risk_css(results['risk_gab'])}'>{results['risk_gab']}</span>", unsafe_allow_html=True)
+            st.markdown(f"**Probabilitas**: {results['prob_gab']:.1%}")
+            st.progress(float(results['prob_gab']))
 
-    #  SARAN PERSONALISASI BERDASARKAN RISIKO TERTINGGI
-    final_risk = risk_gab if risk_gab else risk_nl
+    if results['factors']:
+        st.subheader("🔎 Faktor yang Paling Berpengaruh")
+        with st.container(border=True):
+            for label, value, contribution in results['factors']:
+                arrow = "⬆️ menaikkan" if contribution > 0 else "⬇️ menurunkan"
+                st.markdown(f"**{label}** ({value:g}): {arrow} risiko {abs(contribution) * 100:.1f} poin")
+            st.caption("Kontribusi dihitung dari model terhadap rata-rata populasi pelatihan, bukan diagnosis.")
+
+def render_recommendation(final_risk):
+    # Blok yang sama dipakai lembar hasil laporan massal (reports.py)
+    from reports import RECOMMENDATIONS
     st.header("💡 Rekomendasi Personal dari DiaLens")
+    st.markdown(RECOMMENDATIONS[final_risk], unsafe_allow_html=True)
 
-    if final_risk == "Rendah":
-        st.markdown(
-            """
-            <div class="recommendation-box" style="background-color: #e8f5e9; border-left: 4px solid #2A9D8F; color: #264653;">
-            <h4 style="color: #2A9D8F; margin-top: 0;">🟢 Risiko Rendah – Pertahankan Gaya Hidup Sehat!</h4>
-            <ul>
-                <li>Lanjutkan pola makan seimbang dan aktivitas fisik rutin (≥150 menit/minggu).</li>
-                <li>Periksa gula darah setiap 2–3 tahun, terutama jika usia &gt;40 tahun.</li>
-                <li>Pertahankan literasi kesehatan — Anda sudah di jalur yang tepat!</li>
-            </ul>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+@fragment_section('3', 'what_if')
+def section_what_if(profile, active):
+    from what_if import render_what_if_panel
+    # Identitas model yang dimuat (bukan file di disk saat ini): sapuan tidak tercampur antarmodel
+    versions = (active.version,) + tuple(active.bundle.model_ids)
+    render_what_if_panel(profile, active.bundle, versions, active.thresholds)
 
-    elif final_risk == "Sedang":
-        st.markdown(
-            """
-            <div class="recommendation-box" style="background-color: #fff8e1; border-left: 4px solid #F4A261; color: #264653;">
-            <h4 style="color: #E9C46A; margin-top: 0;">🟡 Risiko Sedang – Waspadai & Ambil Langkah Pencegahan</h4>
-            <ul>
-                <li>Kurangi konsumsi gula, minuman manis, dan makanan olahan.</li>
-                <li>Tingkatkan aktivitas fisik (jalan cepat, bersepeda, olahraga ringan).</li>
-                <li>Lakukan pemeriksaan gula darah puasa atau HbA1c dalam 3–6 bulan.</li>
-                <li>Konsultasi dengan tenaga kesehatan untuk skrining lebih lanjut.</li>
-            </ul>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-
-    else:  # Tinggi
-        st.markdown(
-            """
-            <div class="recommendation-box" style="background-color: #ffebee; border-left: 4px solid #E76F51; color: #1D3557;">
-            <h4 style="color: #E76F51; margin-top: 0;">🔴 Risiko Tinggi – Segera Konsultasi Medis!</h4>
-            <ul>
-                <li>Anda berada dalam kelompok berisiko tinggi untuk diabetes tipe 2.</li>
-                <li><strong>Segera konsultasi dengan dokter</strong> untuk pemeriksaan lengkap (HbA1c, GDP, profil lipid).</li>
-                <li>Hindari gula tambahan, rokok, dan gaya hidup sedentari.</li>
-                <li>Pertimbangkan program pencegahan diabetes terstruktur (jika tersedia).</li>
-            </ul>
-            <p style="font-style: italic; margin-top: 10px; color: #555;">
-                Ingat: Diagnosis dini dan intervensi gaya hidup dapat menurunkan risiko hingga 58%.
-            </p>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-        
+@fragment_section('3', 'peta')
+def section_global_context():
     # 🌍 KONTEKS GLOBAL (DATA IDF 2024)
     st.header("🌍 Fakta Global: Diabetes di Dunia (IDF Atlas 2024)")
     st.markdown("""
@@ -471,24 +556,62 @@ def display_step_3():
     """)
 
     # 🗺️ PETA GLOBAL
-    world_map = make_diabetes_map()
-    if world_map is not None:
-        st.plotly_chart(world_map, use_container_width=True)
+    from map import render_diabetes_map
+    render_diabetes_map()
+
+# STEP 3: HASIL PREDIKSI + KONTEKS GLOBAL
+
+@timed(STEP_RENDER_SECONDS, '3')
+def display_step_3():
+    st.markdown('<div class="step-header">📊 Hasil Prediksi Risiko Diabetes</div>', unsafe_allow_html=True)
+    st.markdown("---")
+    data = st.session_state.data_collected
+
+    try:
+        active = get_active_models()
+    except Exception as e:
+        st.error(f"Gagal memuat model. Pastikan file .joblib ada. Error: {e}")
+        return
+    results = get_results(data, active)
+    if results['errors']:
+        # Baris tidak valid tidak diprediksi (bukan 0.5)
+        st.error(f"❌ Data wajib kosong atau tidak valid: {', '.join(results['errors'])}")
+        st.button("← Kembali ke Profil", key="back3_invalid", on_click=go_to_step, args=(2,))
+        return
+
+    render_prediction_cards(results)
+
+    store_submission(data, results['prob_nl'], results['prob_gab'], results['final_risk'])
+    monitor_submission(data, results['prob_nl'], results['prob_gab'])
+    shadow_submission(data, active, results['input_nl'], results['prob_nl'], results['input_gab'], results['prob_gab'])
+
+    #  SARAN PERSONALISASI BERDASARKAN RISIKO TERTINGGI
+    render_recommendation(results['final_risk'])
+
+    # 🔍 SIMULASI WHAT-IF (fragmen: slider simulasi tidak menjalankan ulang bagian lain)
+    section_what_if(data, active)
+
+    # 🌍 KONTEKS GLOBAL + 🗺️ PETA (fragmen)
+    section_global_context()
 
     # NAVIGASI
     st.markdown("<br>", unsafe_allow_html=True)
-    if st.button("⇦ Kembali ke Input Data", key="back3", use_container_width=True):
-        go_to_step(2)
+    st.button("⇦ Kembali ke Input Data", key="back3", use_container_width=True, on_click=go_to_step, args=(2,))
 
     st.markdown('<div class="footer-text">Langkah 3 dari 3 • Hasil ini bukan diagnosis medis</div>', unsafe_allow_html=True)
 
 # JALANKAN APLIKASI
-if not AI_MODELS_LOADED:
+if MODEL_LOADER.failed:
+    st.error(f"Gagal memuat model. Pastikan file .joblib ada. Error: {MODEL_LOADER.error}")
     st.stop()
 
-if st.session_state.step == 1:
+current_step = st.session_state.step
+if current_step == 1:
     display_step_1()
-elif st.session_state.step == 2:
+elif current_step == 2:
     display_step_2()
-elif st.session_state.step == 3:
-    display_step_3()
\ No newline at end of file
+elif current_step == 3:
+    display_step_3()
+
+RERUN_SECONDS.labels(current_step).observe(time.perf_counter() - _RERUN_START)
+INTERACTION_CPU_SECONDS.labels(current_step, 'app').observe(time.thread_time() - _RERUN_CPU_START)
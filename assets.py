@@ -0,0 +1,188 @@
+# ASET STATIS: varian gambar responsif + satu stylesheet untuk semua langkah
+#
+# `build` mengecilkan gambar sumber ke beberapa lebar (WebP + JPEG cadangan) di static/img/ dan
+# menulis static/assets.json (ukuran, hash isi). Streamlit menyajikan static/ di URL app/static/...
+# (server.enableStaticServing di .streamlit/config.toml); URL diberi ?v=<hash> sehingga tornado
+# mengirim Cache-Control max-age 10 tahun — browser mengunduh satu varian sekali, bukan tiap
+# kunjungan ke langkah 1. Browser memilih varian lewat <picture> srcset/sizes sesuai layar.
+#
+# dialens.css menggantikan blok <style> per langkah: satu elemen identik di setiap rerun, dan
+# karena ukurannya ≥ global.minCachedMessageSize, Streamlit mengirim isinya sekali per sesi lalu
+# hanya referensi hash (cache pesan di browser).
+#
+#   python assets.py build                          # diabetes.jpg → static/img/diabetes-{320,480,612}.*
+#   python assets.py build --widths 360 720 --quality 70
+#   python assets.py check                          # exit 1 jika varian hilang / sumber berubah
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+STATIC_DIR = 'static'
+IMAGE_DIR = os.path.join(STATIC_DIR, 'img')
+MANIFEST_PATH = os.path.join(STATIC_DIR, 'assets.json')
+STATIC_URL = 'app/static'
+STYLESHEET_PATH = 'dialens.css'
+SOURCES = {'diabetes': 'diabetes.jpg'}
+DEFAULT_WIDTHS = (320, 480)
+DEFAULT_QUALITY = 75
+# Lebar tampil: kolom tengah [1, 5, 1] pada layout centered (≈ 500px), hampir penuh di ponsel
+DEFAULT_SIZES = '(max-width: 640px) 90vw, 500px'
+# (format PIL, opsi simpan); AVIF tidak didukung Pillow di lingkungan ini dan .avif disajikan
+# Streamlit sebagai text/plain, jadi tidak dibuat
+FORMATS = {
+    'webp': ('WEBP', {'method': 6}),
+    'jpg': ('JPEG', {'optimize': True, 'progressive': True}),
+}
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return _digest(f.read())
+
+
+# BUILD
+def build_image(name, source, widths=DEFAULT_WIDTHS, quality=DEFAULT_QUALITY, out_dir=IMAGE_DIR):
+    import io
+
+    from PIL import Image
+
+    img = Image.open(source)
+    img.load()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    # Tidak pernah memperbesar; lebar asli selalu ikut sebagai varian terbesar
+    sizes = sorted({w for w in widths if w < img.width} | {img.width})
+    os.makedirs(out_dir, exist_ok=True)
+    variants = {fmt: [] for fmt in FORMATS}
+    for w in sizes:
+        h = round(img.height * w / img.width)
+        resized = img if w == img.width else img.resize((w, h), Image.LANCZOS)
+        for fmt, (pil_format, options) in FORMATS.items():
+            buf = io.BytesIO()
+            resized.save(buf, pil_format, quality=quality, **options)
+            data = buf.getvalue()
+            filename = f'{name}-{w}.{fmt}'
+            with open(os.path.join(out_dir, filename), 'wb') as f:
+                f.write(data)
+            variants[fmt].append({'width': w, 'height': h, 'file': os.path.relpath(
+                os.path.join(out_dir, filename), STATIC_DIR), 'hash': _digest(data), 'bytes': len(data)})
+    return {
+        'source': source,
+        'source_hash': _file_digest(source),
+        'source_bytes': os.path.getsize(source),
+        'width': img.width,
+        'height': img.height,
+        'quality': quality,
+        'variants': variants,
+    }
+
+
+def build(sources=None, widths=DEFAULT_WIDTHS, quality=DEFAULT_QUALITY, path=MANIFEST_PATH):
+    manifest = {'images': {name: build_image(name, source, widths, quality)
+                           for name, source in (sources or SOURCES).items()}}
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+    return manifest
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def check(manifest=None):
+    # → daftar masalah (kosong = aset sesuai sumber)
+    manifest = load_manifest() if manifest is None else manifest
+    images = manifest.get('images', {})
+    problems = [f"{name}: belum dibuat" for name in SOURCES if name not in images]
+    for name, entry in images.items():
+        if os.path.exists(entry['source']) and _file_digest(entry['source']) != entry['source_hash']:
+            problems.append(f"{name}: {entry['source']} berubah sejak build")
+        for variant in (v for vs in entry['variants'].values() for v in vs):
+            path = os.path.join(STATIC_DIR, variant['file'])
+            if not os.path.exists(path) or _file_digest(path) != variant['hash']:
+                problems.append(f"{name}: {variant['file']} hilang / berbeda")
+    return problems
+
+
+# HTML
+def _srcset(variants):
+    return ', '.join(f"{STATIC_URL}/{v['file']}?v={v['hash']} {v['width']}w" for v in variants)
+
+
+def picture_html(name, alt, caption=None, sizes=DEFAULT_SIZES, manifest=None):
+    # <picture> WebP + JPEG cadangan; None jika varian belum dibuat (pemanggil pakai st.image)
+    manifest = load_manifest() if manifest is None else manifest
+    entry = manifest.get('images', {}).get(name)
+    if not entry or not all(os.path.exists(os.path.join(STATIC_DIR, v['file']))
+                            for vs in entry['variants'].values() for v in vs):
+        return None
+    fallback = entry['variants']['jpg'][-1]
+    caption_html = f'<figcaption>{caption}</figcaption>' if caption else ''
+    return (
+        f'<figure class="hero-figure"><picture>'
+        f'<source type="image/webp" srcset="{_srcset(entry["variants"]["webp"])}" sizes="{sizes}">'
+        f'<img src="{STATIC_URL}/{fallback["file"]}?v={fallback["hash"]}" '
+        f'srcset="{_srcset(entry["variants"]["jpg"])}" sizes="{sizes}" '
+        f'width="{entry["width"]}" height="{entry["height"]}" alt="{alt}" decoding="async">'
+        f'</picture>{caption_html}</figure>'
+    )
+
+
+def stylesheet(path=STYLESHEET_PATH):
+    # Isi dialens.css tanpa komentar/spasi berlebih, dibungkus <style>; None jika file tidak ada
+    try:
+        with open(path) as f:
+            css = f.read()
+    except OSError:
+        return None
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css).strip()
+    css = re.sub(r':\s+', ':', css)
+    return f'<style>{css}</style>'
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Buat / periksa aset statis DiaLens (gambar responsif).")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help="Buat varian gambar + static/assets.json")
+    p_build.add_argument('--widths', type=int, nargs='+', default=list(DEFAULT_WIDTHS),
+                         help="Lebar varian (px); lebar asli selalu ditambahkan")
+    p_build.add_argument('--quality', type=int, default=DEFAULT_QUALITY)
+    sub.add_parser('check', help="Pastikan varian ada dan sesuai sumber")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        manifest = build(widths=args.widths, quality=args.quality)
+        for name, entry in manifest['images'].items():
+            print(f"{name}: {entry['source']} {entry['width']}×{entry['height']} ({entry['source_bytes']} byte)")
+            for fmt, variants in entry['variants'].items():
+                sizes = ', '.join(f"{v['width']}px {v['bytes']} byte" for v in variants)
+                print(f"  {fmt:<5}{sizes}")
+        print(f"✅ Manifest ditulis: {MANIFEST_PATH}")
+        return 0
+
+    problems = check()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Aset statis sesuai sumber")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# BENCHMARK CPU SERVER PER INTERAKSI: server Streamlit sungguhan + klien websocket minimal
+#
+# AppTest selalu menjalankan ulang seluruh skrip, jadi tidak bisa mengukur rerun fragmen.
+# Benchmark ini menjalankan `streamlit run` headless, membuka satu sesi lewat /_stcore/stream
+# (protokol BackMsg/ForwardMsg yang sama dengan browser), lalu memutar skenario interaksi:
+# ubah input langkah 2, lanjut ke langkah 3, geser simulasi what-if, kembali ke langkah 2.
+# CPU proses server (utime+stime dari /proc, semua thread) diukur per interaksi sampai
+# script_finished diterima; hasil = rata-rata per interaksi untuk menghitung kapasitas pod.
+#
+#   python -m benchmarks.interaction_cpu --rounds 20
+#   git show HEAD~1:app.py > app_before.py && python -m benchmarks.interaction_cpu app_before.py
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+SETTLE_SECONDS = 0.05
+READ_TIMEOUT = 60
+# Sama dengan global.maxCachedMessageAge bawaan: browser membuang pesan cache yang tidak
+# dipakai selama lebih dari 2 run skrip (rerun fragmen hanya menuakan pesan fragmen itu)
+MAX_CACHED_MESSAGE_AGE = 2
+
+# (nama, key widget, nilai per putaran genap/ganjil, key yang harus ada setelahnya)
+SCENARIO = [
+    ('usia', 'age', (50, 40), None),
+    ('diet', 'diet', (7, 3), None),
+    ('merokok', 'smoking', (1, 0), None),
+    ('gejala', 'thirst', (True, False), None),
+    ('hba1c', 'hba1c_input', ('6.2', '5.4'), None),
+    ('gula_darah', 'gdp_input', ('110', '92'), None),
+    ('ke_hasil', 'next2', (True, True), 'wi_diet'),
+    ('whatif_diet', 'wi_diet', (2, 9), None),
+    ('whatif_merokok', 'wi_smoking', (0, 1), None),
+    ('kembali', 'back3', (True, True), 'age'),
+]
+
+
+def _cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_path, port, options=()):
+    # options: ('global.minCachedMessageSize=10240', ...) → --global.minCachedMessageSize 10240
+    cmd = [sys.executable, '-W', 'ignore', '-m', 'streamlit', 'run', os.path.basename(app_path),
+           '--server.headless', 'true', '--server.port', str(port), '--server.fileWatcherType', 'none',
+           '--browser.gatherUsageStats', 'false', '--logger.level', 'error']
+    for option in options:
+        name, value = option.split('=', 1)
+        cmd += [f'--{name}', value]
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(app_path)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Server Streamlit tidak siap dalam 60 dtk")
+
+
+class Session:
+    # Klien browser minimal: simpan id + fragmen tiap widget dari delta, kirim state widget.
+    # Cache pesan seperti browser: pesan `cacheable` disimpan per hash, hash dikirim di tiap rerun,
+    # dan server membalas dengan ref_hash untuk elemen yang identik.
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}  # key → (id, tipe, proto elemen, fragment_id)
+        self.values = {}   # key → nilai yang sudah diubah (dikirim ulang di setiap rerun)
+        self.cache = {}    # hash → [ForwardMsg, run terakhir dipakai, fragment_id]
+        self.runs = 0
+        self.fragment_id = ''
+        self.received_bytes = 0
+
+    async def rerun(self, key=None, value=None):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.SetInParent()
+        self.fragment_id = ''
+        states = msg.rerun_script.widget_states
+        for k, v in self.values.items():
+            if k in self.widgets and k != key:
+                self._set_state(states.widgets.add(), k, v)
+        if key is not None:
+            widget_id, kind, _, fragment_id = self.widgets[key]
+            self._set_state(states.widgets.add(), key, value)
+            if kind != 'button':
+                self.values[key] = value
+            if fragment_id:
+                msg.rerun_script.fragment_id = fragment_id
+                self.fragment_id = fragment_id
+        msg.rerun_script.cached_message_hashes.extend(self.cache)
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        return await self._read_until_finished()
+
+    def _set_state(self, state, key, value):
+        widget_id, kind, element, _ = self.widgets[key]
+        state.id = widget_id
+        if kind == 'button':
+            state.trigger_value = True
+        elif kind == 'checkbox':
+            state.bool_value = bool(value)
+        elif kind == 'text_input':
+            state.string_value = str(value)
+        elif kind == 'slider':
+            state.double_array_value.data[:] = [float(value)]
+        elif kind == 'radio':
+            state.int_value = int(value)  # opsi [0, 1] → indeks = nilai
+        elif kind == 'number_input':
+            if element.data_type == element.INT:
+                state.int_value = int(value)
+            else:
+                state.double_value = float(value)
+
+    async def _read_until_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            raw = await asyncio.wait_for(self.ws.read_message(), READ_TIMEOUT)
+            if raw is None:
+                raise RuntimeError("Koneksi websocket ditutup server")
+            self.received_bytes += len(raw)
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            kind = msg.WhichOneof('type')
+            if kind == 'ref_hash':
+                msg = self.cache[msg.ref_hash][0]
+                self.cache[msg.hash][1] = self.runs
+                kind = msg.WhichOneof('type')
+            elif msg.metadata.cacheable:
+                self.cache[msg.hash] = [msg, self.runs, msg.delta.fragment_id]
+            if kind == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+                element = msg.delta.new_element
+                etype = element.WhichOneof('type')
+                proto = getattr(element, etype)
+                self.on_element(element, etype)
+                widget_id = getattr(proto, 'id', '')
+                if widget_id.startswith('$$ID'):
+                    key = widget_id.rsplit('-', 1)[-1]
+                    if key != 'None':
+                        self.widgets[key] = (widget_id, etype, proto, msg.delta.fragment_id)
+            elif kind == 'script_finished':
+                self.runs += 1
+                self.cache = {h: entry for h, entry in self.cache.items()
+                              if self.runs - entry[1] <= MAX_CACHED_MESSAGE_AGE
+                              or (self.fragment_id and entry[2] != self.fragment_id)}
+                return msg.script_finished
+
+    def on_element(self, element, etype):
+        pass
+
+
+async def run_scenario(port, pid, rounds):
+    from tornado.websocket import websocket_connect
+
+    ws = await websocket_connect(f'ws://127.0.0.1:{port}/_stcore/stream', subprotocols=['streamlit'],
+                                 max_message_size=256 * 1024 * 1024)
+    session = Session(ws)
+    await session.rerun()
+    await session.rerun('btn_mulai', True)
+    if 'age' not in session.widgets:
+        await session.rerun()
+
+    samples = {name: [] for name, *_ in SCENARIO}
+    for r in range(rounds):
+        for name, key, values, expect in SCENARIO:
+            await asyncio.sleep(SETTLE_SECONDS)
+            cpu0, t0 = _cpu_seconds(pid), time.perf_counter()
+            if expect:
+                session.widgets.pop(expect, None)
+            await session.rerun(key, values[r % 2])
+            if expect and expect not in session.widgets:
+                # Versi lama (if st.button: go_to_step) baru pindah langkah di rerun berikutnya
+                await session.rerun()
+            wall = time.perf_counter() - t0
+            await asyncio.sleep(SETTLE_SECONDS)
+            samples[name].append((_cpu_seconds(pid) - cpu0, wall))
+    ws.close()
+    return samples
+
+
+def run(app_path='app.py', rounds=20):
+    port = _free_port()
+    proc = start_server(app_path, port)
+    try:
+        samples = asyncio.run(run_scenario(port, proc.pid, rounds))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    per_interaction = {
+        name: {
+            'cpu_ms': round(1e3 * statistics.mean(c for c, _ in values), 2),
+            'wall_ms': round(1e3 * statistics.median(w for _, w in values), 2),
+        }
+        for name, values in samples.items()
+    }
+    all_cpu = [c for values in samples.values() for c, _ in values]
+    return {
+        'app': app_path,
+        'rounds': rounds,
+        'interactions': per_interaction,
+        'mean_cpu_ms': round(1e3 * statistics.mean(all_cpu), 2),
+        # Interaksi per detik yang dapat dilayani satu inti CPU
+        'interactions_per_core_s': round(1 / max(statistics.mean(all_cpu), 1e-9), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ukur CPU server Streamlit per interaksi DiaLens.")
+    parser.add_argument('app', nargs='?', default='app.py')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.app, args.rounds), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# UJI BEBAN LOKAL untuk service.py: laporkan latensi p50/p99 dan permintaan/detik
+#
+#   python -m benchmarks.load_test                      # jalankan server sendiri
+#   python -m benchmarks.load_test --url 127.0.0.1:8600 # server yang sudah berjalan
+#   python -m benchmarks.load_test --in-process         # tanpa HTTP (PredictionClient)
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from fast_inference import random_inputs
+from scoring import load_models
+from service import (DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_QUEUE, DEFAULT_MAX_WAIT_MS, HttpServer,
+                     PredictionClient, PredictionService)
+
+FEATURES = ['Age', 'DietQuality', 'Smoking', 'FamilyHistoryDiabetes', 'Hypertension', 'FrequentUrination',
+            'ExcessiveThirst', 'UnexplainedWeightLoss', 'FastingBloodSugar', 'HealthLiteracy', 'HbA1c']
+
+
+def make_payloads(n, seed=0):
+    X = random_inputs(FEATURES, n, seed)
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for row in X:
+        data = {f: round(float(v), 1) for f, v in zip(FEATURES, row)}
+        for f in ('Age', 'DietQuality', 'HealthLiteracy'):
+            data[f] = int(data[f])
+        # Sekitar separuh pengguna tidak mengisi data lab
+        if rng.random() < 0.5:
+            data['HbA1c'] = 0
+            data['FastingBloodSugar'] = 0
+        payloads.append(data)
+    return payloads
+
+
+async def _http_worker(host, port, payloads, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for data in payloads:
+            body = json.dumps(data).encode()
+            t0 = time.perf_counter()
+            writer.write(b"POST /predict HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n" % (host.encode(), len(body)) + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def _client_worker(client, payloads, latencies, errors):
+    for data in payloads:
+        t0 = time.perf_counter()
+        try:
+            await client.predict(data)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run_load(args):
+    payloads = make_payloads(args.requests)
+    chunks = [payloads[i::args.concurrency] for i in range(args.concurrency)]
+    latencies, errors = [], {}
+    server = None
+
+    if args.in_process or not args.url:
+        service = PredictionService(load_models(fast=not args.no_fast), args.max_batch_size,
+                                    args.max_wait_ms, args.max_queue)
+    if args.in_process:
+        service.start()
+        client = PredictionClient(service)
+        workers = [_client_worker(client, c, latencies, errors) for c in chunks]
+    else:
+        if args.url:
+            host, _, port = args.url.replace('http://', '').partition(':')
+            port = int(port or 80)
+        else:
+            server = await HttpServer(service, '127.0.0.1', 0).start()
+            host, port = '127.0.0.1', server.port
+        workers = [_http_worker(host, port, c, latencies, errors) for c in chunks]
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - t0
+
+    stats = None
+    if args.in_process:
+        stats = service.stats()
+        await service.stop()
+    elif server is not None:
+        stats = service.stats()
+        await server.stop()
+
+    lat_ms = np.asarray(latencies) * 1000
+    report = {
+        'requests': len(latencies),
+        'concurrency': args.concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(lat_ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(lat_ms, 99)), 3),
+        'errors': errors,
+    }
+    if stats:
+        items = stats['nonlab']['items'] + stats['gabungan']['items']
+        batches = stats['nonlab']['batches'] + stats['gabungan']['batches']
+        report['mean_batch_size'] = round(items / max(batches, 1), 2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Uji beban layanan prediksi DiaLens.")
+    parser.add_argument('--url', help="host:port server yang sudah berjalan")
+    parser.add_argument('--in-process', action='store_true', help="Pakai PredictionClient tanpa HTTP")
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+    parser.add_argument('--no-fast', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(args))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
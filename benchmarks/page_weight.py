@@ -0,0 +1,135 @@
+# BENCHMARK BYTE PER SESI: pesan websocket + gambar yang diunduh browser dalam satu sesi DiaLens
+#
+# Memakai server + klien websocket dari interaction_cpu (termasuk cache pesan seperti browser).
+# Skenario satu sesi: buka langkah 1, mulai, isi input langkah 2, lihat hasil, geser what-if,
+# kembali ke langkah 2, lalu ke langkah 1 lagi. Dihitung:
+#   ws_bytes     — ForwardMsg yang dikirim server (CSS, elemen, data grafik), per langkah
+#   image_bytes  — gambar dari st.image (/media/...) dan <img>/<picture> (app/static/...);
+#                  varian dari srcset dipilih seperti browser untuk --slot-px × --dpr
+#   cold / warm  — kunjungan pertama vs kunjungan ulang (gambar dengan Cache-Control max-age
+#                  panjang tidak diunduh lagi)
+# Bundel JS/HTML Streamlit sama untuk kedua versi dan tidak dihitung.
+#
+#   python -m benchmarks.page_weight
+#   git show HEAD~1:app.py > app_before.py && \
+#       python -m benchmarks.page_weight app_before.py --option global.minCachedMessageSize=10240
+import argparse
+import asyncio
+import json
+import re
+import sys
+import urllib.request
+
+from benchmarks.interaction_cpu import SCENARIO, Session, _free_port, start_server
+
+LONG_CACHE_SECONDS = 86400
+# Skenario interaction_cpu (berakhir di langkah 2), lalu kembali ke langkah 1
+SESSION_STEPS = SCENARIO + [('ke_langkah1', 'back2', (True, True), 'btn_mulai')]
+SRCSET_RE = re.compile(r'<source[^>]*type="image/webp"[^>]*srcset="([^"]+)"|<img[^>]*?(?:srcset="([^"]+)"|src="([^"]+)")')
+
+
+def pick_candidate(srcset, target_px):
+    # Seperti browser: kandidat terkecil yang ≥ lebar target, selain itu yang terbesar
+    candidates = []
+    for item in srcset.split(','):
+        url, _, descriptor = item.strip().partition(' ')
+        candidates.append((int(descriptor.rstrip('w')) if descriptor.endswith('w') else 0, url))
+    candidates.sort()
+    return next((url for w, url in candidates if w >= target_px), candidates[-1][1])
+
+
+class WeightSession(Session):
+    def __init__(self, ws, target_px):
+        super().__init__(ws)
+        self.target_px = target_px
+        self.images = []  # URL relatif terhadap akar app, urut pertama kali muncul
+
+    def on_element(self, element, etype):
+        urls = []
+        if etype == 'imgs':
+            urls = [img.url for img in element.imgs.imgs if img.url]
+        elif etype == 'markdown' and '<img' in element.markdown.body:
+            for webp, srcset, src in SRCSET_RE.findall(element.markdown.body):
+                if webp or srcset:
+                    urls.append(pick_candidate(webp or srcset, self.target_px))
+                    break
+                urls.append(src)
+        for url in urls:
+            if url not in self.images:
+                self.images.append(url)
+
+
+def fetch(port, url):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/{url.lstrip("/")}', timeout=30) as r:
+        body = r.read()
+        cache_control = r.headers.get('Cache-Control') or ''
+    max_age = re.search(r'max-age=(\d+)', cache_control)
+    return len(body), bool(max_age and int(max_age.group(1)) >= LONG_CACHE_SECONDS)
+
+
+async def run_session(port, target_px):
+    from tornado.websocket import websocket_connect
+
+    ws = await websocket_connect(f'ws://127.0.0.1:{port}/_stcore/stream', subprotocols=['streamlit'],
+                                 max_message_size=256 * 1024 * 1024)
+    session = WeightSession(ws, target_px)
+    ws_bytes = {}
+
+    async def step(name, *args):
+        before = session.received_bytes
+        await session.rerun(*args)
+        ws_bytes[name] = ws_bytes.get(name, 0) + session.received_bytes - before
+
+    await step('langkah1')
+    await step('mulai', 'btn_mulai', True)
+    if 'age' not in session.widgets:
+        await step('mulai')
+    for name, key, values, expect in SESSION_STEPS:
+        if expect:
+            session.widgets.pop(expect, None)
+        await step(name, key, values[0])
+        if expect and expect not in session.widgets:
+            await step(name)
+    ws.close()
+    return ws_bytes, session.images
+
+
+def run(app_path='app.py', options=(), slot_px=351, dpr=2.0):
+    port = _free_port()
+    proc = start_server(app_path, port, options)
+    try:
+        ws_bytes, images = asyncio.run(run_session(port, slot_px * dpr))
+        fetched = {url: fetch(port, url) for url in images}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    image_bytes = sum(size for size, _ in fetched.values())
+    uncached = sum(size for size, long_cache in fetched.values() if not long_cache)
+    total_ws = sum(ws_bytes.values())
+    return {
+        'app': app_path,
+        'options': list(options),
+        'target_px': slot_px * dpr,
+        'ws_bytes': ws_bytes,
+        'images': {url: {'bytes': size, 'long_cache': long_cache} for url, (size, long_cache) in fetched.items()},
+        'total_ws_bytes': total_ws,
+        'total_image_bytes': image_bytes,
+        'cold_session_bytes': total_ws + image_bytes,
+        'warm_session_bytes': total_ws + uncached,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ukur byte per sesi DiaLens (websocket + gambar).")
+    parser.add_argument('app', nargs='?', default='app.py')
+    parser.add_argument('--option', action='append', default=[],
+                        help="Opsi config Streamlit tambahan, mis. global.minCachedMessageSize=10240")
+    parser.add_argument('--slot-px', type=int, default=351, help="Lebar tampil gambar (CSS px)")
+    parser.add_argument('--dpr', type=float, default=2.0, help="Device pixel ratio")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.app, args.option, args.slot_px, args.dpr), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# BENCHMARK SKALA WORKER: throughput ParallelScorer untuk 1, 2, 4, 8 worker
+#
+# Data sintetis dibuat di memori (tanpa I/O file) agar yang terukur hanya distribusi
+# chunk + skor. Baseline "0" = score_chunks di satu proses tanpa pool.
+#
+#   python -m benchmarks.parallel_scaling --rows 400000 --workers 1 2 4 8
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fast_inference import random_inputs
+from parallel_scoring import ParallelScorer
+from scoring import DEFAULT_CHUNKSIZE, load_models, score_chunks
+
+
+def synthetic_frame(features, n, seed=0):
+    df = pd.DataFrame(random_inputs(features, n, seed), columns=features)
+    # Separuh baris tanpa data lab, seperti skrining non-lab di lapangan
+    no_lab = np.random.default_rng(seed).random(n) < 0.5
+    df.loc[no_lab, ['HbA1c', 'FastingBloodSugar']] = 0
+    return df
+
+
+def _chunks(df, chunksize):
+    return (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+
+
+def _run(models, df, workers, chunksize):
+    t0 = time.perf_counter()
+    if workers == 0:
+        n = sum(len(out) for out in score_chunks(_chunks(df, chunksize), models, keep_columns=False))
+        return {'workers': 0, 'startup_s': 0.0, 'score_s': time.perf_counter() - t0, 'rows': n}
+    with ParallelScorer(models, workers, chunksize) as scorer:
+        # Hangatkan pool (fork + attach shared memory) sebelum diukur
+        list(scorer.score_chunks(_chunks(df.iloc[:workers], 1), keep_columns=False))
+        t_ready = time.perf_counter()
+        n = sum(len(out) for out in scorer.score_chunks(_chunks(df, chunksize), keep_columns=False))
+        t_end = time.perf_counter()
+        shared_bytes = scorer.model_store.nbytes
+    return {'workers': workers, 'startup_s': t_ready - t0, 'score_s': t_end - t_ready, 'rows': n,
+            'shared_model_bytes': shared_bytes}
+
+
+def run(rows=400_000, workers=(1, 2, 4, 8), chunksize=DEFAULT_CHUNKSIZE // 2, seed=0):
+    models = load_models(fast=True)
+    df = synthetic_frame(models[3], rows, seed)
+    results = []
+    for w in (0,) + tuple(workers):
+        r = _run(models, df, w, chunksize)
+        r['rows_per_s'] = round(r['rows'] / r['score_s'])
+        r['startup_s'] = round(r['startup_s'], 3)
+        r['score_s'] = round(r['score_s'], 3)
+        results.append(r)
+    base = next(r for r in results if r['workers'] == 1)['rows_per_s']
+    for r in results:
+        r['speedup_vs_1'] = round(r['rows_per_s'] / base, 2)
+    return {'cpu_count': os.cpu_count(), 'rows': rows, 'chunksize': chunksize, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ukur skala throughput skor multi-proses DiaLens.")
+    parser.add_argument('--rows', type=int, default=400_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE // 2)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.rows, tuple(args.workers), args.chunksize), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
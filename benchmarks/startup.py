@@ -0,0 +1,81 @@
+# BENCHMARK START DINGIN: waktu sampai render pertama dan sampai prediksi pertama
+#
+# Setiap percobaan berjalan di proses Python baru (tanpa cache Streamlit/impor),
+# memakai AppTest sehingga tidak perlu browser.
+#
+#   python -m benchmarks.startup --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SAMPLE_PROFILE = {
+    'Age': 45, 'DietQuality': 4, 'HealthLiteracy': 6, 'Smoking': 1, 'Hypertension': 0,
+    'FamilyHistoryDiabetes': 1, 'FrequentUrination': 0, 'ExcessiveThirst': 1,
+    'UnexplainedWeightLoss': 0, 'HbA1c': 6.1, 'FastingBloodSugar': 0.0,
+}
+
+
+def _child(app_path):
+    t_start = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=120)
+    at.run()
+    t_render = time.perf_counter()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    at.session_state['data_collected'] = dict(SAMPLE_PROFILE)
+    at.session_state['step'] = 3
+    at.run()
+    t_predict = time.perf_counter()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    if not any('Probabilitas' in m.value for m in at.markdown):
+        raise RuntimeError("Prediksi tidak muncul di langkah 3")
+
+    print(json.dumps({
+        'first_render_s': t_render - t_start,
+        'first_prediction_s': t_predict - t_start,
+    }))
+
+
+def run(app_path='app.py', runs=5):
+    results = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-m', 'benchmarks.startup', '--child', app_path],
+                             capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - t0
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result['process_wall_s'] = wall
+        results.append(result)
+    summary = {
+        key: round(statistics.median(r[key] for r in results), 4)
+        for key in ('first_render_s', 'first_prediction_s', 'process_wall_s')
+    }
+    summary['runs'] = runs
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ukur waktu start dingin DiaLens.")
+    parser.add_argument('app', nargs='?', default='app.py')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.app)
+        return 0
+    print(json.dumps(run(args.app, args.runs), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
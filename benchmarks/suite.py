@@ -0,0 +1,318 @@
+# SUITE BENCHMARK DIALENS: prediksi, skor batch, muat model, peta, dan rerun tiap langkah
+#
+# Hasil disimpan sebagai JSON agar antar-run bisa dibandingkan; `compare` gagal (exit 1)
+# jika ada metrik yang lebih buruk dari baseline melebihi ambang.
+#
+#   python -m benchmarks.suite run                              # → artifacts/bench/latest.json
+#   python -m benchmarks.suite run --save-baseline              # jadikan baseline mesin ini
+#   python -m benchmarks.suite run --check --threshold 0.2      # run + bandingkan dengan baseline
+#   python -m benchmarks.suite compare artifacts/bench/latest.json --baseline artifacts/bench/baseline.json
+import argparse
+import contextlib
+import datetime
+import gzip
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.join('artifacts', 'bench')
+LATEST_PATH = os.path.join(BENCH_DIR, 'latest.json')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_THRESHOLD = 0.2
+# Selisih absolut di bawah ini dianggap derau pengukuran, bukan regresi
+NOISE_FLOOR = {'s': 0.01, 'us': 5.0}
+GROUPS = ('predict', 'batch', 'load', 'map', 'steps')
+BATCH_SIZES = (1, 64, 1024, 16384, 100_000)
+
+
+def _metric(value, unit, better='lower'):
+    return {'value': round(float(value), 6), 'unit': unit, 'better': better}
+
+
+def _median_time(fn, repeat, number=None, budget_s=0.2):
+    if number is None:
+        # Jumlah panggilan per ulangan disesuaikan agar satu ulangan ≈ budget_s
+        t0 = time.perf_counter()
+        fn()
+        number = max(1, int(budget_s / max(time.perf_counter() - t0, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return statistics.median(times)
+
+
+@contextlib.contextmanager
+def _quiet_logging():
+    # app.py dijalankan tanpa `streamlit run` / lewat AppTest; peringatan bare mode tidak relevan
+    logging.disable(logging.WARNING)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+# PREDIKSI SATU BARIS (predict_ai dari app.py, dijalankan dalam bare mode)
+def bench_predict(quick=False):
+    from benchmarks.startup import SAMPLE_PROFILE
+    from fast_inference import random_inputs
+
+    with _quiet_logging():
+        import app
+    active = app.get_active_models()
+    models = active.bundle
+    model_nl = models.table_nl or models.fast_nl or models.model_nl
+    model_gab = models.fast_gab or models.model_gab
+    n = 200 if quick else 2000
+    rows_nl = [dict(zip(models.features_nl, map(float, r))) for r in random_inputs(models.features_nl, n, seed=1)]
+    rows_gab = [dict(zip(models.features_gab, map(float, r))) for r in random_inputs(models.features_gab, n, seed=2)]
+
+    def per_call(model, features, rows, model_path=None):
+        # Tanpa model_path → cache prediksi dilewati, yang terukur murni model + konversi input
+        t0 = time.perf_counter()
+        for row in rows:
+            app.predict_ai(row, model, features, model_path)
+        return (time.perf_counter() - t0) / len(rows)
+
+    per_call(model_nl, models.features_nl, rows_nl[:50])
+    results = {
+        'predict_ai_nl_us': _metric(1e6 * statistics.median(
+            per_call(model_nl, models.features_nl, rows_nl) for _ in range(5)), 'us'),
+        'predict_ai_gab_us': _metric(1e6 * statistics.median(
+            per_call(model_gab, models.features_gab, rows_gab) for _ in range(5)), 'us'),
+    }
+    profile = dict(SAMPLE_PROFILE)
+    id_nl = models.model_ids[0]
+    app.predict_ai(profile, model_nl, models.features_nl, active.non_lab_path, id_nl)
+    hit = _median_time(lambda: app.predict_ai(profile, model_nl, models.features_nl, active.non_lab_path, id_nl),
+                       repeat=5)
+    results['predict_ai_cache_hit_us'] = _metric(1e6 * hit, 'us')
+    return results, {'predict_nl_impl': type(model_nl).__name__, 'predict_gab_impl': type(model_gab).__name__}
+
+
+# SKOR BATCH (score_frame dengan model yang sama seperti app)
+def bench_batch(quick=False):
+    from benchmarks.parallel_scaling import synthetic_frame
+    from model_loader import load_bundle
+    from scoring import score_frame
+
+    bundle = load_bundle()
+    model_nl = bundle.fast_nl or bundle.model_nl
+    model_gab = bundle.fast_gab or bundle.model_gab
+    sizes = BATCH_SIZES[:-1] if quick else BATCH_SIZES
+    df = synthetic_frame(bundle.features_gab, max(sizes), seed=0)
+    results = {}
+    for size in sizes:
+        block = df.iloc[:size]
+        t = _median_time(lambda: score_frame(block, model_nl, model_gab, bundle.features_nl, bundle.features_gab),
+                         repeat=3 if quick else 7)
+        results[f'batch_{size}_rows_per_s'] = _metric(size / t, 'rows/s', better='higher')
+    return results, {'batch_impl': type(model_nl).__name__}
+
+
+# MUAT MODEL DINGIN (proses baru, seperti load_ai_models di app.py)
+def _child_load():
+    t0 = time.perf_counter()
+    from model_registry import RegistryModelLoader
+    loader = RegistryModelLoader().start()
+    bundle = loader.get().bundle
+    print(json.dumps({
+        'total_s': time.perf_counter() - t0,
+        'load_s': loader.load_seconds,
+        'source': 'joblib' if bundle.model_nl is not None else 'compiled',
+    }))
+
+
+def bench_load(quick=False):
+    runs = []
+    for _ in range(2 if quick else 5):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-m', 'benchmarks.suite', '--child-load'],
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        'load_ai_models_cold_s': _metric(statistics.median(r['total_s'] for r in runs), 's'),
+        'load_bundle_s': _metric(statistics.median(r['load_s'] for r in runs), 's'),
+    }, {'load_source': runs[-1]['source']}
+
+
+# PETA GLOBAL
+def bench_map(quick=False):
+    import plotly.io as pio
+
+    from map import build_diabetes_figure, compact_json, load_map_data
+
+    def build():
+        return build_diabetes_figure(load_map_data())
+
+    fig = build()
+    t = _median_time(build, repeat=3 if quick else 7, number=1)
+    t_json = _median_time(lambda: pio.to_json(fig, validate=False), repeat=3 if quick else 7)
+    full = pio.to_json(fig, validate=False).encode()
+    compact = compact_json(fig).encode()
+    return {
+        'map_build_s': _metric(t, 's'),
+        'map_to_json_s': _metric(t_json, 's'),
+        'map_figure_bytes': _metric(len(full), 'B'),
+        'map_figure_gzip_bytes': _metric(len(gzip.compress(full)), 'B'),
+        'map_compact_bytes': _metric(len(compact), 'B'),
+    }, {}
+
+
+# RERUN PER LANGKAH (AppTest, tanpa browser)
+def bench_steps(quick=False, app_path='app.py'):
+    from streamlit.testing.v1 import AppTest
+
+    from benchmarks.startup import SAMPLE_PROFILE
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+    at = AppTest.from_file(app_path, default_timeout=120)
+    t0 = time.perf_counter()
+    at.run()
+    results = {'step_1_first_run_s': _metric(time.perf_counter() - t0, 's')}
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    at.session_state['data_collected'] = dict(SAMPLE_PROFILE)
+    repeat = 3 if quick else 7
+    for step in (1, 2, 3):
+        at.session_state['step'] = step
+        at.run()  # rerun pertama di langkah ini (cache model/peta terisi)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        results[f'step_{step}_rerun_s'] = _metric(_median_time(at.run, repeat, number=1), 's')
+    return results, {}
+
+
+def _bench_steps_quiet(quick=False):
+    with _quiet_logging():
+        return bench_steps(quick)
+
+
+BENCHES = {'predict': bench_predict, 'batch': bench_batch, 'load': bench_load, 'map': bench_map,
+           'steps': _bench_steps_quiet}
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(groups=GROUPS, quick=False):
+    metrics, info = {}, {}
+    for group in groups:
+        t0 = time.perf_counter()
+        group_metrics, group_info = BENCHES[group](quick)
+        metrics.update(group_metrics)
+        info.update(group_info)
+        print(f"✅ {group}: {len(group_metrics)} metrik ({time.perf_counter() - t0:.1f} dtk)", file=sys.stderr)
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'quick': quick,
+            **info,
+        },
+        'metrics': metrics,
+    }
+
+
+# PERBANDINGAN DENGAN BASELINE
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    rows, regressions = [], []
+    for name, base in baseline['metrics'].items():
+        cur = current['metrics'].get(name)
+        if cur is None:
+            continue
+        if base['better'] == 'higher':
+            change = base['value'] / cur['value'] - 1 if cur['value'] else float('inf')
+        else:
+            change = cur['value'] / base['value'] - 1 if base['value'] else 0.0
+        # change > 0 berarti lebih buruk, apa pun arah metriknya
+        worse = change > threshold and abs(cur['value'] - base['value']) > NOISE_FLOOR.get(cur['unit'], 0)
+        rows.append((name, base['value'], cur['value'], cur['unit'], change, worse))
+        if worse:
+            regressions.append(name)
+    return rows, regressions
+
+
+def format_comparison(rows):
+    lines = [f"{'metrik':<28} {'baseline':>14} {'sekarang':>14} {'unit':<7} {'lebih buruk':>11}"]
+    for name, base, cur, unit, change, worse in rows:
+        flag = '  ❌' if worse else ''
+        lines.append(f"{name:<28} {base:>14.4g} {cur:>14.4g} {unit:<7} {change:>+10.1%}{flag}")
+    return '\n'.join(lines)
+
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _check(current, baseline_path, threshold):
+    if not os.path.exists(baseline_path):
+        print(f"❌ Baseline {baseline_path} belum ada (jalankan dengan --save-baseline)", file=sys.stderr)
+        return 2
+    rows, regressions = compare(current, _load_json(baseline_path), threshold)
+    print(format_comparison(rows))
+    if regressions:
+        print(f"❌ {len(regressions)} metrik lebih buruk > {threshold:.0%}: {', '.join(regressions)}",
+              file=sys.stderr)
+        return 1
+    print(f"✅ Tidak ada regresi > {threshold:.0%}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    if argv is None and sys.argv[1:] == ['--child-load']:
+        _child_load()
+        return 0
+
+    parser = argparse.ArgumentParser(description="Suite benchmark DiaLens.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help="Jalankan benchmark dan simpan JSON")
+    p_run.add_argument('--only', nargs='+', choices=GROUPS, default=list(GROUPS))
+    p_run.add_argument('--quick', action='store_true', help="Ulangan lebih sedikit (untuk uji cepat)")
+    p_run.add_argument('--out', default=LATEST_PATH)
+    p_run.add_argument('--save-baseline', action='store_true')
+    p_run.add_argument('--check', action='store_true', help="Bandingkan dengan baseline setelah run")
+    p_run.add_argument('--baseline', default=BASELINE_PATH)
+    p_run.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    p_cmp = sub.add_parser('compare', help="Bandingkan file hasil dengan baseline")
+    p_cmp.add_argument('current')
+    p_cmp.add_argument('--baseline', default=BASELINE_PATH)
+    p_cmp.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        return _check(_load_json(args.current), args.baseline, args.threshold)
+
+    result = run(args.only, args.quick)
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"✅ Hasil disimpan di {args.out}", file=sys.stderr)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        shutil.copyfile(args.out, args.baseline)
+        print(f"✅ Baseline diperbarui: {args.baseline}", file=sys.stderr)
+    if args.check:
+        return _check(result, args.baseline, args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
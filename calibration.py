@@ -0,0 +1,358 @@
+# EVALUASI AMBANG & KALIBRASI: kurva sensitivitas/spesifisitas/PPV, bin kalibrasi, ambang optimal
+#
+# File skrining berlabel (mis. kolom Diagnosis 0/1) dibaca per chunk dan diskor kedua model
+# (seperti scoring.py; model gabungan hanya baris dengan data lab). Probabilitas tidak disimpan:
+# tiap chunk cukup menambah histogram halus (resolusi 1/10000) per label = counting sort, jadi
+# memori konstan untuk jutaan baris. Satu cumsum dari kanan atas histogram memberi TP/FP/FN/TN
+# di semua 10001 ambang sekaligus; AUC, Brier, ECE dan bin kalibrasi dihitung dari histogram
+# yang sama. Bootstrap = resampling multinomial atas sel histogram (B sampel dalam satu array).
+#
+# Ambang per model:
+#   tinggi = biaya minimum  cost_fn × FN + cost_fp × FP
+#   sedang = ambang tertinggi (≤ tinggi) dengan sensitivitas ≥ --target-sensitivity
+# --write menulis thresholds.json (DIALENS_THRESHOLDS) yang dibaca config.py → app, scoring, service.
+# Jika ambang tinggi biaya minimum sudah memenuhi target sensitivitas, sedang jatuh tepat di bawah
+# tinggi dan kategori Sedang praktis hilang; --write menolak lebar pita < --min-band-width
+# (kecuali --allow-narrow-band).
+#
+#   python calibration.py skrining_berlabel.parquet --label Diagnosis
+#   python calibration.py hasil_skor.parquet --scored --cost-fn 5 --bootstrap 500 --json laporan.json
+#   python calibration.py skrining_berlabel.parquet --write
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import MODEL_NAMES, MODEL_THRESHOLDS, THRESHOLDS_PATH
+
+RESOLUTION = 10_000
+CALIBRATION_BINS = 10
+CURVE_STEP = 0.01
+DEFAULT_LABEL = 'Diagnosis'
+DEFAULT_COST_FN = 3.0
+DEFAULT_COST_FP = 1.0
+DEFAULT_TARGET_SENSITIVITY = 0.90
+DEFAULT_BOOTSTRAP = 200
+DEFAULT_MIN_BAND_WIDTH = 0.05
+BOOTSTRAP_BLOCK = 50
+SCORE_COLUMNS = {'nonlab': 'prob_nl', 'gabungan': 'prob_gab'}
+
+
+# AKUMULASI (histogram per label)
+class LabeledHistogram:
+    def __init__(self, resolution=RESOLUTION):
+        self.resolution = resolution
+        # counts[y, b]: baris berlabel y dengan floor(p × resolusi) = b (p = 1 → bin terakhir)
+        self.counts = np.zeros((2, resolution + 1), dtype=np.int64)
+        self.sum_prob = np.zeros((2, resolution + 1))
+        self.sum_prob_sq = 0.0
+
+    @property
+    def rows(self):
+        return int(self.counts.sum())
+
+    def update(self, prob, label):
+        prob = np.asarray(prob, dtype=np.float64)
+        label = np.asarray(label, dtype=np.float64)
+        keep = np.isfinite(prob) & ((label == 0) | (label == 1))
+        prob, label = np.clip(prob[keep], 0.0, 1.0), label[keep].astype(np.int64)
+        cell = label * (self.resolution + 1) + (prob * self.resolution).astype(np.int64)
+        size = 2 * (self.resolution + 1)
+        self.counts += np.bincount(cell, minlength=size).reshape(2, -1)
+        self.sum_prob += np.bincount(cell, weights=prob, minlength=size).reshape(2, -1)
+        self.sum_prob_sq += float(np.dot(prob, prob))
+        return int(keep.sum())
+
+
+# KURVA (vektor; dimensi depan = sampel bootstrap)
+def confusion_at_cutoffs(counts):
+    # counts (..., 2, R+1) → TP, FP, FN, TN (..., R+1) untuk ambang k / R (positif = p ≥ ambang)
+    suffix = np.cumsum(counts[..., ::-1], axis=-1)[..., ::-1]
+    tp, fp = suffix[..., 1, :], suffix[..., 0, :]
+    positives, negatives = tp[..., :1], fp[..., :1]
+    return tp, fp, positives - tp, negatives - fp
+
+
+def _ratio(num, den):
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=np.float64), np.asarray(den, dtype=np.float64))
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def rates(counts):
+    tp, fp, fn, tn = confusion_at_cutoffs(counts)
+    return {
+        'sensitivity': _ratio(tp, tp + fn),
+        'specificity': _ratio(tn, tn + fp),
+        'ppv': _ratio(tp, tp + fp),
+        'npv': _ratio(tn, tn + fn),
+    }
+
+
+def auc(counts):
+    # Trapesium atas titik ROC di semua ambang (ikatan dalam satu bin = garis diagonal)
+    tp, fp, fn, tn = confusion_at_cutoffs(counts)
+    tpr, fpr = _ratio(tp, tp + fn), _ratio(fp, fp + tn)
+    # Ambang naik → FPR turun; tambahkan titik (0, 0) di ujung
+    tpr = np.concatenate([tpr, np.zeros(tpr.shape[:-1] + (1,))], axis=-1)
+    fpr = np.concatenate([fpr, np.zeros(fpr.shape[:-1] + (1,))], axis=-1)
+    return np.sum((fpr[..., :-1] - fpr[..., 1:]) * (tpr[..., :-1] + tpr[..., 1:]) / 2, axis=-1)
+
+
+def optimal_cutoffs(counts, cost_fn=DEFAULT_COST_FN, cost_fp=DEFAULT_COST_FP,
+                    target_sensitivity=DEFAULT_TARGET_SENSITIVITY):
+    # → (indeks ambang tinggi, indeks ambang sedang); argmin pertama = ambang terendah dengan biaya minimum
+    tp, fp, fn, tn = confusion_at_cutoffs(counts)
+    high = np.argmin(cost_fn * fn + cost_fp * fp, axis=-1)
+    sensitivity = _ratio(tp, tp + fn)
+    # Sensitivitas tidak naik terhadap ambang → jumlah ambang yang memenuhi target = indeks terakhir + 1
+    medium = np.maximum((sensitivity >= target_sensitivity).sum(axis=-1) - 1, 0)
+    return high, np.minimum(medium, high)
+
+
+def youden_cutoff(counts):
+    r = rates(counts)
+    return np.nanargmax(r['sensitivity'] + r['specificity'] - 1, axis=-1)
+
+
+def calibration_table(hist, bins=CALIBRATION_BINS):
+    counts, sums = hist.counts.sum(axis=0), hist.sum_prob.sum(axis=0)
+    group = np.minimum(np.arange(hist.resolution + 1) * bins // hist.resolution, bins - 1)
+    n = np.bincount(group, weights=counts, minlength=bins)
+    positives = np.bincount(group, weights=hist.counts[1], minlength=bins)
+    mean_prob = _ratio(np.bincount(group, weights=sums, minlength=bins), n)
+    observed = _ratio(positives, n)
+    table = [{
+        'bin': f"{b / bins:.1f}–{(b + 1) / bins:.1f}",
+        'rows': int(n[b]),
+        'mean_prob': None if np.isnan(mean_prob[b]) else round(float(mean_prob[b]), 4),
+        'observed_rate': None if np.isnan(observed[b]) else round(float(observed[b]), 4),
+    } for b in range(bins)]
+    filled = n > 0
+    ece = float(np.sum(n[filled] * np.abs(observed[filled] - mean_prob[filled])) / max(n.sum(), 1))
+    return table, ece
+
+
+def brier(hist):
+    # Σ (p - y)² = Σ p² - 2 Σ_{y=1} p + jumlah positif
+    n = hist.rows
+    return (hist.sum_prob_sq - 2 * hist.sum_prob[1].sum() + hist.counts[1].sum()) / max(n, 1)
+
+
+# BOOTSTRAP (multinomial atas sel histogram)
+def bootstrap(hist, cutoff_indices, n_boot=DEFAULT_BOOTSTRAP, seed=0, cost_fn=DEFAULT_COST_FN,
+              cost_fp=DEFAULT_COST_FP, target_sensitivity=DEFAULT_TARGET_SENSITIVITY):
+    # → {nama statistik: array (n_boot,)}; cutoff_indices: {nama ambang: indeks} yang metriknya diuji
+    rng = np.random.default_rng(seed)
+    flat = hist.counts.ravel()
+    n = int(flat.sum())
+    samples = {'auc': [], 'high': [], 'medium': []}
+    for name in cutoff_indices:
+        for metric in ('sensitivity', 'specificity', 'ppv'):
+            samples[f'{name}.{metric}'] = []
+    for start in range(0, n_boot, BOOTSTRAP_BLOCK):
+        size = min(BOOTSTRAP_BLOCK, n_boot - start)
+        counts = rng.multinomial(n, flat / n, size=size).reshape(size, 2, -1)
+        samples['auc'].append(auc(counts))
+        high, medium = optimal_cutoffs(counts, cost_fn, cost_fp, target_sensitivity)
+        samples['high'].append(high / hist.resolution)
+        samples['medium'].append(medium / hist.resolution)
+        r = rates(counts)
+        for name, k in cutoff_indices.items():
+            for metric in ('sensitivity', 'specificity', 'ppv'):
+                samples[f'{name}.{metric}'].append(r[metric][:, k])
+    return {name: np.concatenate(values) for name, values in samples.items()}
+
+
+def _ci(values, level=0.95):
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    low, high = np.quantile(values, [(1 - level) / 2, (1 + level) / 2])
+    return [round(float(low), 4), round(float(high), 4)]
+
+
+def _round(value):
+    return None if value is None or not np.isfinite(value) else round(float(value), 4)
+
+
+# LAPORAN
+def evaluate(hist, current=None, cost_fn=DEFAULT_COST_FN, cost_fp=DEFAULT_COST_FP,
+             target_sensitivity=DEFAULT_TARGET_SENSITIVITY, n_boot=DEFAULT_BOOTSTRAP, seed=0):
+    R = hist.resolution
+    positives = int(hist.counts[1].sum())
+    result = {'rows': hist.rows, 'positives': positives}
+    if not hist.rows or positives in (0, hist.rows):
+        result['error'] = "butuh baris berlabel 0 dan 1"
+        return result
+    r = rates(hist.counts)
+    high, medium = (int(k) for k in optimal_cutoffs(hist.counts, cost_fn, cost_fp, target_sensitivity))
+    cutoff_indices = {'high': high, 'medium': medium}
+    if current is not None:
+        cutoff_indices['current_high'] = int(round(current[0] * R))
+        cutoff_indices['current_medium'] = int(round(current[1] * R))
+    boot = bootstrap(hist, cutoff_indices, n_boot, seed, cost_fn, cost_fp, target_sensitivity) if n_boot else {}
+
+    def at(name, k):
+        entry = {'threshold': round(k / R, 4)}
+        for metric in ('sensitivity', 'specificity', 'ppv', 'npv'):
+            entry[metric] = _round(r[metric][k])
+            if f'{name}.{metric}' in boot:
+                entry[f'{metric}_ci'] = _ci(boot[f'{name}.{metric}'])
+        if name in boot:
+            entry['threshold_ci'] = _ci(boot[name])
+        return entry
+
+    calibration, ece = calibration_table(hist)
+    steps = np.arange(0, R + 1, int(round(CURVE_STEP * R)))
+    result.update({
+        'prevalence': round(positives / hist.rows, 4),
+        'auc': _round(auc(hist.counts)),
+        'auc_ci': _ci(boot['auc']) if boot else None,
+        'brier': _round(brier(hist)),
+        'ece': _round(ece),
+        'chosen': {name: at(name, k) for name, k in cutoff_indices.items() if not name.startswith('current')},
+        'current': {name[len('current_'):]: at(name, k) for name, k in cutoff_indices.items()
+                    if name.startswith('current')},
+        'youden_threshold': round(int(youden_cutoff(hist.counts)) / R, 4),
+        'calibration': calibration,
+        'curve': [{'threshold': round(k / R, 2), **{m: _round(r[m][k]) for m in r}} for k in steps],
+    })
+    return result
+
+
+def accumulate(path, label=DEFAULT_LABEL, scored=False, chunksize=None, models=None):
+    from scoring import DEFAULT_CHUNKSIZE, iter_chunks
+
+    hists = {name: LabeledHistogram() for name in MODEL_NAMES}
+    if not scored:
+        from scoring import load_models, score_validated
+        from validation import get_schema, input_fields, validate_columns
+        model_nl, model_gab, features_nl, features_gab = models or load_models(fast=True)
+        schema = get_schema(input_fields(features_nl, features_gab))
+    for chunk in iter_chunks(path, chunksize or DEFAULT_CHUNKSIZE):
+        if label not in chunk.columns:
+            raise ValueError(f"Kolom label '{label}' tidak ada di {path}")
+        y = chunk[label].to_numpy(dtype=np.float64, na_value=np.nan)
+        if scored:
+            probs = {name: chunk[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                     for name, col in SCORE_COLUMNS.items()}
+        else:
+            checked = validate_columns(chunk, schema)
+            probs = dict(zip(MODEL_NAMES, score_validated(checked, model_nl, model_gab, features_nl, features_gab)))
+        for name, hist in hists.items():
+            hist.update(probs[name], y)
+    return hists
+
+
+def narrow_bands(results, min_width=DEFAULT_MIN_BAND_WIDTH):
+    # {model: lebar pita Sedang} untuk usulan yang pitanya lebih sempit dari min_width
+    narrow = {}
+    for name, result in results.items():
+        if 'chosen' not in result:
+            continue
+        width = result['chosen']['high']['threshold'] - result['chosen']['medium']['threshold']
+        if width < min_width:
+            narrow[name] = round(width, 4)
+    return narrow
+
+
+def write_thresholds(results, path=THRESHOLDS_PATH, params=None):
+    data = {}
+    for name, result in results.items():
+        if 'chosen' not in result:
+            continue
+        data[name] = {
+            'high': result['chosen']['high']['threshold'],
+            'medium': result['chosen']['medium']['threshold'],
+            'rows': result['rows'],
+            **(params or {}),
+        }
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+    return data
+
+
+def format_report(results):
+    lines = []
+    for name, r in results.items():
+        if 'error' in r:
+            lines.append(f"[{name}] {r['rows']:,} baris: {r['error']}")
+            continue
+        auc_ci = f" (95% CI {r['auc_ci'][0]:.4f}–{r['auc_ci'][1]:.4f})" if r['auc_ci'] else ''
+        lines.append(f"[{name}] {r['rows']:,} baris, prevalensi {r['prevalence']:.1%}: AUC {r['auc']:.4f}{auc_ci}, "
+                     f"Brier {r['brier']:.4f}, ECE {r['ece']:.4f}, Youden {r['youden_threshold']:.3f}")
+        for group, label in (('current', 'saat ini'), ('chosen', 'usulan')):
+            for cutoff in ('high', 'medium'):
+                e = r[group].get(cutoff)
+                if e is None:
+                    continue
+                ci = f" [{e['threshold_ci'][0]:.3f}–{e['threshold_ci'][1]:.3f}]" if e.get('threshold_ci') else ''
+                lines.append(f"    {label:<8} {'Tinggi' if cutoff == 'high' else 'Sedang'} ≥ {e['threshold']:.4f}{ci}: "
+                             f"sens {e['sensitivity']:.3f}, spes {e['specificity']:.3f}, PPV {e['ppv']:.3f}")
+    return '\n'.join(lines)
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluasi ambang risiko & kalibrasi model DiaLens pada data berlabel.")
+    parser.add_argument('input', help="File berlabel (.csv atau .parquet)")
+    parser.add_argument('--label', default=DEFAULT_LABEL, help="Kolom label 0/1")
+    parser.add_argument('--scored', action='store_true',
+                        help="Pakai kolom prob_nl/prob_gab yang sudah ada (output scoring.py) tanpa skor ulang")
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--cost-fn', type=float, default=DEFAULT_COST_FN, help="Biaya satu kasus terlewat (FN)")
+    parser.add_argument('--cost-fp', type=float, default=DEFAULT_COST_FP, help="Biaya satu rujukan tidak perlu (FP)")
+    parser.add_argument('--target-sensitivity', type=float, default=DEFAULT_TARGET_SENSITIVITY,
+                        help="Sensitivitas minimum untuk ambang Sedang")
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP, help="Jumlah sampel bootstrap (0 = tanpa CI)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Simpan laporan lengkap (kurva, kalibrasi, CI) ke file JSON")
+    parser.add_argument('--write', action='store_true', help="Tulis ambang usulan ke file ambang yang dibaca app")
+    parser.add_argument('--thresholds-out', default=THRESHOLDS_PATH)
+    parser.add_argument('--min-band-width', type=float, default=DEFAULT_MIN_BAND_WIDTH,
+                        help="Lebar minimum pita Sedang (tinggi − sedang) agar --write diizinkan")
+    parser.add_argument('--allow-narrow-band', action='store_true',
+                        help="Tetap tulis walau pita Sedang lebih sempit dari --min-band-width")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        hists = accumulate(args.input, args.label, args.scored, args.chunksize)
+    except (ValueError, KeyError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    t_pass = time.perf_counter() - t0
+    results = {name: evaluate(hist, MODEL_THRESHOLDS[name], args.cost_fn, args.cost_fp, args.target_sensitivity,
+                              args.bootstrap, args.seed)
+               for name, hist in hists.items()}
+    print(format_report(results))
+    print(f"✅ {hists['nonlab'].rows:,} baris dievaluasi (skor + histogram {t_pass:.2f} dtk, "
+          f"kurva + bootstrap {time.perf_counter() - t0 - t_pass:.2f} dtk)", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.write:
+        narrow = narrow_bands(results, args.min_band_width)
+        for name, width in narrow.items():
+            print(f"❌ [{name}] pita Sedang hanya {width:.4f} (< {args.min_band_width}): kategori Sedang akan "
+                  f"hilang dari app. Naikkan --target-sensitivity / turunkan --cost-fn, atau --allow-narrow-band",
+                  file=sys.stderr)
+        if narrow and not args.allow_narrow_band:
+            print(f"❌ {args.thresholds_out} tidak ditulis", file=sys.stderr)
+            return 1
+        params = {'cost_fn': args.cost_fn, 'cost_fp': args.cost_fp, 'target_sensitivity': args.target_sensitivity,
+                  'source': os.path.basename(args.input), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        written = write_thresholds(results, args.thresholds_out, params)
+        print(f"✅ Ambang {', '.join(written)} ditulis ke {args.thresholds_out} (dibaca app saat start)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# AGREGASI RISIKO POPULASI: skor file kohort skrining per chunk (paralel lewat parallel_scoring) dan
+# hitung jumlah Rendah/Sedang/Tinggi + rata-rata probabilitas per wilayah dalam satu lintasan.
+#
+#   python cohort.py skrining_nasional.parquet --region-col Country --out ringkasan.csv \
+#       --map peta_kohort.html --workers 4
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import MODEL_THRESHOLDS
+from scoring import DEFAULT_CHUNKSIZE, iter_chunks, load_models, score_chunks
+
+BAND_COLUMNS = ['n_rendah', 'n_sedang', 'n_tinggi']
+_BAND_INDEX = {'Rendah': 0, 'Sedang': 1, 'Tinggi': 2}
+UNKNOWN_REGION = '(tidak diketahui)'
+
+
+class RegionAggregator:
+    # Akumulator streaming: hanya menyimpan jumlah per wilayah, bukan baris
+    def __init__(self):
+        self.counts = {}   # wilayah -> array [rendah, sedang, tinggi]
+        self.prob_sum = {}
+        self.n_unscored = 0
+
+    def update(self, regions, probs, risks):
+        regions = pd.Series(regions, dtype=object).fillna(UNKNOWN_REGION).to_numpy()
+        probs = np.asarray(probs, dtype=float)
+        band = pd.Series(risks).map(_BAND_INDEX).to_numpy()
+        scored = ~np.isnan(probs) & ~pd.isna(band)
+        self.n_unscored += int((~scored).sum())
+        if not scored.any():
+            return self
+        codes, uniques = pd.factorize(regions[scored])
+        band = band[scored].astype(np.int64)
+        counts = np.zeros((len(uniques), 3), dtype=np.int64)
+        np.add.at(counts, (codes, band), 1)
+        sums = np.bincount(codes, weights=probs[scored], minlength=len(uniques))
+        for region, c, s in zip(uniques, counts, sums):
+            if region in self.counts:
+                self.counts[region] += c
+                self.prob_sum[region] += s
+            else:
+                self.counts[region] = c
+                self.prob_sum[region] = float(s)
+        return self
+
+    def merge(self, other):
+        for region, c in other.counts.items():
+            if region in self.counts:
+                self.counts[region] += c
+                self.prob_sum[region] += other.prob_sum[region]
+            else:
+                self.counts[region] = c.copy()
+                self.prob_sum[region] = other.prob_sum[region]
+        self.n_unscored += other.n_unscored
+        return self
+
+    def result(self):
+        regions = sorted(self.counts)
+        counts = np.array([self.counts[r] for r in regions], dtype=np.int64).reshape(-1, 3)
+        n = counts.sum(axis=1)
+        df = pd.DataFrame(counts, columns=BAND_COLUMNS)
+        df.insert(0, 'region', regions)
+        df.insert(1, 'n', n)
+        df['mean_prob'] = np.array([self.prob_sum[r] for r in regions]) / np.maximum(n, 1)
+        df['share_tinggi'] = df['n_tinggi'] / np.maximum(n, 1)
+        return df
+
+
+def _aggregate_scored(scored, region_col):
+    # Probabilitas akhir sama dengan rekomendasi di display_step_3: gabungan jika ada lab
+    prob = scored['prob_gab'].fillna(scored['prob_nl']).to_numpy()
+    return RegionAggregator().update(scored[region_col].to_numpy(), prob, scored['final_risk'])
+
+
+def aggregate_file(path, region_col, workers=1, chunksize=DEFAULT_CHUNKSIZE, fast=True, progress=None):
+    models = load_models(fast=fast or workers > 1)
+    total = RegionAggregator()
+    n_rows = 0
+    scorer = None
+    if workers > 1:
+        # Bobot model dibagi lewat shared memory; hanya probabilitas yang kembali ke induk
+        from parallel_scoring import ParallelScorer
+        scorer = ParallelScorer(models, workers, chunksize)
+    try:
+        chunks = iter_chunks(path, chunksize)
+        scored = scorer.score_chunks(chunks) if scorer else score_chunks(chunks, models)
+        for out in scored:
+            total.merge(_aggregate_scored(out, region_col))
+            n_rows += len(out)
+            if progress:
+                progress(n_rows)
+    finally:
+        if scorer:
+            scorer.close()
+    return total, n_rows
+
+
+# PETA KOHORT (dibangun seperti make_diabetes_map)
+def build_cohort_map(summary, value='share_tinggi', geojson=None, featureidkey='properties.name',
+                     title='Proporsi Risiko Tinggi per Wilayah (Kohort Skrining)'):
+    import plotly.graph_objects as go
+
+    df = summary[summary['region'] != UNKNOWN_REGION].copy()
+    if geojson is None:
+        from map import resolve_iso3
+        df['iso_alpha'] = resolve_iso3(df['region'].astype(str).tolist())
+        df = df.dropna(subset=['iso_alpha'])
+        geo_args = dict(locations=df['iso_alpha'])
+    else:
+        geo_args = dict(locations=df['region'], geojson=geojson, featureidkey=featureidkey)
+
+    is_share = value in ('share_tinggi', 'mean_prob')
+    fig = go.Figure(data=go.Choropleth(
+        z=df[value],
+        colorscale=[[0, '#2A9D8F'], [0.5, '#F4A261'], [1, '#E76F51']],
+        zmin=0,
+        zmax=1 if is_share else float(df[value].max() or 1),
+        text=df['region'],
+        customdata=df[['n', 'n_rendah', 'n_sedang', 'n_tinggi']].to_numpy(),
+        hovertemplate=("<b>%{text}</b><br>"
+                       + ("Nilai: %{z:.1%}" if is_share else "Nilai: %{z:,}")
+                       + "<br>Diskrining: %{customdata[0]:,}"
+                       "<br>Rendah/Sedang/Tinggi: %{customdata[1]:,} / %{customdata[2]:,} / %{customdata[3]:,}"
+                       "<extra></extra>"),
+        marker_line_color='darkgray',
+        colorbar=dict(title='', tickformat='.0%' if is_share else ','),
+        **geo_args,
+    ))
+    fig.update_layout(
+        title_text=title,
+        geo=dict(
+            showframe=False,
+            showcoastlines=False,
+            projection_type='equirectangular',
+            bgcolor='rgba(0,0,0,0)',
+            fitbounds='locations' if geojson is not None else False,
+        ),
+        margin=dict(l=0, r=0, t=60, b=0),
+        annotations=[dict(
+            x=0.95, y=0.02, xref='paper', yref='paper', showarrow=False, font=dict(size=10),
+            text=(f"Ambang Tinggi ≥ {MODEL_THRESHOLDS['gabungan'][0]:.0%} (lab) / "
+                  f"{MODEL_THRESHOLDS['nonlab'][0]:.0%} (non-lab) • DiaLens"),
+        )],
+    )
+    return fig
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agregasi risiko diabetes per wilayah dari file kohort.")
+    parser.add_argument('input', help="File kohort (.csv atau .parquet)")
+    parser.add_argument('--region-col', default='Country')
+    parser.add_argument('--out', default='ringkasan_kohort.csv')
+    parser.add_argument('--map', help="Simpan peta choropleth ke file .html / .json")
+    parser.add_argument('--map-value', default='share_tinggi', choices=['share_tinggi', 'mean_prob', 'n_tinggi', 'n'])
+    parser.add_argument('--geojson', help="GeoJSON wilayah (mis. provinsi); default: nama negara → ISO3")
+    parser.add_argument('--featureidkey', default='properties.name')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--no-fast', action='store_true')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+
+    def progress(n):
+        print(f"\r{n:,} baris ({n / (time.perf_counter() - t0):,.0f} baris/dtk)", end='', file=sys.stderr)
+
+    agg, n_rows = aggregate_file(args.input, args.region_col, args.workers, args.chunksize,
+                                 fast=not args.no_fast, progress=progress)
+    print(file=sys.stderr)
+    summary = agg.result()
+    summary.to_csv(args.out, index=False)
+    print(f"✅ {n_rows:,} baris, {len(summary)} wilayah, {agg.n_unscored:,} tidak diskor → {args.out} "
+          f"({time.perf_counter() - t0:.1f} dtk)", file=sys.stderr)
+
+    if args.map:
+        geojson = None
+        if args.geojson:
+            import json
+            with open(args.geojson) as f:
+                geojson = json.load(f)
+        fig = build_cohort_map(summary, args.map_value, geojson, args.featureidkey)
+        if args.map.endswith('.json'):
+            fig.write_json(args.map)
+        else:
+            fig.write_html(args.map, include_plotlyjs='cdn')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# KONFIGURASI BERSAMA (ringan: tanpa pandas / scikit-learn agar app cepat start)
+import json
+import os
+import warnings
+
+# PATH MODEL
+MODEL_GABUNGAN_PATH = 'model_prediksi_diabetes_gabunganv1.joblib'
+MODEL_NON_LAB_PATH = 'model_prediksi_diabetes_nonlabv1.joblib'
+
+# AMBANG RISIKO (sama dengan display_step_3)
+OPTIMAL_THRESHOLD_GABUNGAN = 0.60
+MEDIUM_THRESHOLD = 0.5
+
+# AMBANG PER MODEL (ditulis calibration.py --write); file tidak ada → konstanta di atas untuk kedua model
+THRESHOLDS_PATH = os.environ.get('DIALENS_THRESHOLDS', 'thresholds.json')
+MODEL_NAMES = ('nonlab', 'gabungan')
+
+
+def _threshold_pair(entry):
+    # (tinggi, sedang) dari entri file; ValueError jika rusak atau di luar 0 ≤ sedang ≤ tinggi ≤ 1
+    try:
+        high, medium = float(entry['high']), float(entry['medium'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"entri ambang tidak valid: {entry!r}")
+    if not 0.0 <= medium <= high <= 1.0:
+        raise ValueError(f"ambang harus 0 ≤ medium ≤ high ≤ 1: medium={medium}, high={high}")
+    return high, medium
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    # {'nonlab': (tinggi, sedang), 'gabungan': (tinggi, sedang)}; file/entri rusak → default per model
+    # (peringatan, bukan error: app dan CLI tetap start)
+    cutoffs = {name: (OPTIMAL_THRESHOLD_GABUNGAN, MEDIUM_THRESHOLD) for name in MODEL_NAMES}
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except OSError:
+        return cutoffs
+    except ValueError as e:
+        warnings.warn(f"{path} bukan JSON valid ({e}); memakai ambang default")
+        return cutoffs
+    if not isinstance(data, dict):
+        warnings.warn(f"{path} harus berisi objek JSON; memakai ambang default")
+        return cutoffs
+    for name in MODEL_NAMES:
+        if name in data:
+            try:
+                cutoffs[name] = _threshold_pair(data[name])
+            except ValueError as e:
+                warnings.warn(f"{path} [{name}]: {e}; memakai ambang default")
+    return cutoffs
+
+
+MODEL_THRESHOLDS = load_thresholds()
+
+# NILAI LAB DEFAULT jika tidak diisi (0)
+LAB_DEFAULTS = {'HbA1c': 5.5, 'FastingBloodSugar': 95.0}
+
+# RENTANG NILAI LAB YANG DITERIMA (di luar rentang dianggap tidak diisi, sama dengan display_step_2)
+LAB_RANGES = {'HbA1c': (4.0, 10.0), 'FastingBloodSugar': (70.0, 200.0)}
+
+# RENTANG INPUT WAJIB (widget display_step_2; di luar rentang = baris tidak valid, lihat validation.py)
+INPUT_RANGES = {'Age': (20, 90), 'DietQuality': (0, 10), 'HealthLiteracy': (0, 10)}
+BINARY_FEATURES = ['Smoking', 'Hypertension', 'FamilyHistoryDiabetes', 'FrequentUrination',
+                   'ExcessiveThirst', 'UnexplainedWeightLoss']
+
+
+# KATEGORI RISIKO
+def risk_category(prob, threshold=OPTIMAL_THRESHOLD_GABUNGAN, medium=MEDIUM_THRESHOLD):
+    return "Tinggi" if prob >= threshold else ("Sedang" if prob >= medium else "Rendah")
@@ -0,0 +1,384 @@
+# DISTILASI MODEL: model murid ringkas yang meniru MODEL_NL / MODEL_GAB
+#
+# Data latih = sampel sintetis rapat dari ruang input app: seluruh grid non-lab (usia, diet,
+# literasi, 6 fitur biner) untuk model non-lab; titik grid acak + nilai lab acak / nilai default
+# (lab yang tidak diisi) untuk model gabungan. Labelnya probabilitas model guru. Jenis murid:
+#   tree      — ensemble pohon dangkal (XGBoost binary:logistic dengan label lunak)
+#   scorecard — scorecard logistik berbinning: satu pohon seimbang per fitur, poin log-odds per bin
+# Keduanya disimpan sebagai CompiledTreeEnsemble (.npy, mmap): app, what-if, atribusi faktor dan
+# canary registri memakai jalur yang sama dengan model guru terkompilasi. meta.json menyimpan
+# hash file guru; murid dari guru lain (versi registri baru) tidak dipakai.
+#
+# Laporan per model: kesepakatan kategori Rendah/Sedang/Tinggi, AUC murid terhadap label guru
+# (probabilitas guru ≥ ambang Tinggi), selisih probabilitas, ukuran artefak, waktu muat dingin
+# (proses baru) dan latensi per baris.
+#
+#   python distill.py train --kind tree --trees 60 --depth 3     # → artifacts/students/tree
+#   python distill.py train --kind scorecard
+#   python distill.py report artifacts/students/tree
+#   DIALENS_STUDENT=artifacts/students/tree streamlit run app.py   # app menyajikan murid
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from config import (LAB_DEFAULTS, LAB_RANGES, MEDIUM_THRESHOLD, MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH,
+                    MODEL_THRESHOLDS, OPTIMAL_THRESHOLD_GABUNGAN)
+from fast_inference import CompiledTreeEnsemble, _pack, load_compiled, save_compiled
+
+STUDENT_ROOT = os.path.join('artifacts', 'students')
+# Direktori murid yang disajikan app (mis. artifacts/students/tree); kosong = model guru
+STUDENT_DIR = os.environ.get('DIALENS_STUDENT') or None
+STUDENT_INFO = 'student.json'
+TEACHERS = {'nonlab': MODEL_NON_LAB_PATH, 'gabungan': MODEL_GABUNGAN_PATH}
+KINDS = ('tree', 'scorecard')
+
+GAB_TRAIN_ROWS = 400_000
+EVAL_ROWS = 100_000
+# Porsi nilai lab = nilai default (tidak diisi → diimputasi) pada sampel model gabungan
+LAB_DEFAULT_SHARE = 0.25
+SCORECARD_MAX_BINS = 16
+LOGIT_CLIP = 1e-4
+
+
+# SAMPEL SINTETIS
+def synthetic_inputs(features, n=None, seed=0):
+    # n=None dan tanpa fitur lab → seluruh grid input langkah 2
+    from lookup_table import grid_rows, grid_spec
+
+    grid_features = [f for f in features if f not in LAB_RANGES]
+    size = int(np.prod(grid_spec(grid_features)[1]))
+    rng = np.random.default_rng(seed)
+    if n is None and len(grid_features) == len(features):
+        indices = np.arange(size)
+    else:
+        indices = rng.integers(0, size, n or GAB_TRAIN_ROWS)
+    grid = grid_rows(grid_features, indices)
+    columns = {f: grid[:, j] for j, f in enumerate(grid_features)}
+    for f in features:
+        if f in LAB_RANGES:
+            values = rng.uniform(*LAB_RANGES[f], len(indices))
+            values[rng.random(len(indices)) < LAB_DEFAULT_SHARE] = LAB_DEFAULTS[f]
+            columns[f] = values
+    return np.column_stack([columns[f] for f in features]).astype(np.float32)
+
+
+def teacher_proba(teacher, X):
+    if hasattr(teacher, 'predict_row'):
+        return teacher.predict_proba(X)[:, 1]
+    import pandas as pd
+    return teacher.predict_proba(pd.DataFrame(X, columns=[str(f) for f in teacher.feature_names_in_]))[:, 1]
+
+
+# MURID: ENSEMBLE POHON DANGKAL
+def fit_tree(X, y, features, trees=60, depth=3, learning_rate=0.3, seed=0):
+    import pandas as pd
+    from xgboost import XGBRegressor
+
+    from fast_inference import compile_xgboost
+
+    # binary:logistic menerima label lunak [0, 1] → murid meminimalkan cross-entropy terhadap guru
+    model = XGBRegressor(objective='binary:logistic', n_estimators=trees, max_depth=depth,
+                         learning_rate=learning_rate, tree_method='hist', random_state=seed)
+    model.fit(pd.DataFrame(X, columns=features), y)
+    return compile_xgboost(model)
+
+
+# MURID: SCORECARD LOGISTIK BERBINNING
+def bin_edges(values, max_bins=SCORECARD_MAX_BINS):
+    unique = np.unique(values)
+    if len(unique) <= max_bins:
+        return (unique[:-1] + unique[1:]) / 2
+    edges = np.quantile(values, np.linspace(0, 1, max_bins + 1)[1:-1])
+    if np.all(unique == np.round(unique)):
+        # Fitur bilangan bulat: batas di x.5 agar tidak ada nilai tepat di batas
+        edges = np.floor(edges) + 0.5
+    return np.unique(edges)
+
+
+def _balanced_tree(feature, edges, points, counts):
+    # Pohon pencarian seimbang atas bin; strict_less: x >= edges[mid - 1] → kanan
+    nodes = []
+
+    def build(lo, hi):
+        node = len(nodes)
+        nodes.append(None)
+        if hi - lo == 1:
+            nodes[node] = (0, 0.0, -1, -1, points[lo], counts[lo:hi].sum())
+            return node
+        mid = (lo + hi) // 2
+        left, right = build(lo, mid), build(mid, hi)
+        nodes[node] = (feature, edges[mid - 1], left, right, 0.0, counts[lo:hi].sum())
+        return node
+
+    build(0, len(points))
+    feat, thr, left, right, value, cover = (np.array(col) for col in zip(*nodes))
+    depth = int(np.ceil(np.log2(len(points)))) if len(points) > 1 else 0
+    return dict(feature=feat, threshold=thr.astype(np.float64), left=left, right=right,
+                missing_left=np.ones(len(nodes), dtype=bool), value=value.astype(np.float64),
+                cover=cover.astype(np.float64), depth=depth)
+
+
+def fit_scorecard(X, y, features, max_bins=SCORECARD_MAX_BINS):
+    # Log-odds guru = intersep + Σ poin[fitur, bin]; kuadrat terkecil berbobot p(1-p) (≈ cross-entropy),
+    # dihitung lewat matriks Gram kecil dari bincount (tanpa matriks one-hot n × bin)
+    p = np.clip(y, LOGIT_CLIP, 1 - LOGIT_CLIP)
+    z = np.log(p / (1 - p))
+    w = p * (1 - p)
+    edges = [bin_edges(X[:, j], max_bins) for j in range(len(features))]
+    bins = [np.searchsorted(e, X[:, j], side='right') for j, e in enumerate(edges)]
+    sizes = [len(e) + 1 for e in edges]
+    offsets = np.cumsum([0] + sizes)
+    k = offsets[-1] + 1  # kolom terakhir = intersep
+    gram = np.zeros((k, k))
+    rhs = np.zeros(k)
+    for a in range(len(features)):
+        rhs[offsets[a]:offsets[a + 1]] = np.bincount(bins[a], weights=w * z, minlength=sizes[a])
+        for b in range(a, len(features)):
+            block = np.bincount(bins[a] * sizes[b] + bins[b], weights=w,
+                                minlength=sizes[a] * sizes[b]).reshape(sizes[a], sizes[b])
+            gram[offsets[a]:offsets[a + 1], offsets[b]:offsets[b + 1]] = block
+            gram[offsets[b]:offsets[b + 1], offsets[a]:offsets[a + 1]] = block.T
+        gram[offsets[a]:offsets[a + 1], -1] = gram[-1, offsets[a]:offsets[a + 1]] = np.diag(
+            gram[offsets[a]:offsets[a + 1], offsets[a]:offsets[a + 1]])
+    gram[-1, -1] = w.sum()
+    rhs[-1] = (w * z).sum()
+    coef = np.linalg.lstsq(gram, rhs, rcond=None)[0]
+
+    trees = []
+    for j in range(len(features)):
+        points = coef[offsets[j]:offsets[j + 1]]
+        counts = np.bincount(bins[j], minlength=sizes[j]).astype(np.float64)
+        trees.append(_balanced_tree(j, edges[j], points, counts))
+    return CompiledTreeEnsemble(**_pack(trees, strict_less=True), feature_names=features,
+                                base_margin=float(coef[-1]), link='logistic')
+
+
+# SIMPAN / MUAT
+def save_student(compiled, directory, teacher_path, info):
+    save_compiled(compiled, directory, source_path=teacher_path)
+    # student.json juga kunci cache prediksi di app: hash berubah setiap kali murid dilatih ulang
+    with open(os.path.join(directory, STUDENT_INFO), 'w') as f:
+        json.dump({**info, 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, f, indent=2)
+
+
+def load_student(directory, teacher_path):
+    # (model, path student.json) atau None jika murid tidak ada / dilatih dari file guru lain
+    info_path = os.path.join(directory, STUDENT_INFO)
+    if not os.path.exists(info_path):
+        return None
+    compiled = load_compiled(directory, source_path=teacher_path)
+    return None if compiled is None else (compiled, info_path)
+
+
+def student_models(active, student_dir=STUDENT_DIR):
+    # ActiveModels dengan murid menggantikan guru (ambang risiko tetap dari guru); None jika tidak bisa
+    from explain import build_explainer
+    from model_loader import ModelBundle
+    from prediction_cache import model_fingerprint
+
+    loaded = {name: load_student(os.path.join(student_dir, name), path)
+              for name, path in (('nonlab', active.non_lab_path), ('gabungan', active.gabungan_path))}
+    if any(s is None for s in loaded.values()):
+        return None
+    (nl, nl_path), (gab, gab_path) = loaded['nonlab'], loaded['gabungan']
+    if nl.feature_names != list(active.bundle.features_nl) or gab.feature_names != list(active.bundle.features_gab):
+        return None
+    bundle = ModelBundle(None, None, nl.feature_names, gab.feature_names, nl, gab, None,
+                         build_explainer(nl), build_explainer(gab),
+                         (model_fingerprint(nl_path), model_fingerprint(gab_path)))
+    kind = os.path.basename(os.path.normpath(student_dir))
+    return active._replace(version=f'{active.version}+{kind}', bundle=bundle,
+                           non_lab_path=nl_path, gabungan_path=gab_path)
+
+
+# EVALUASI
+def _bands(prob, threshold, medium):
+    return (prob >= medium).astype(np.int8) + (prob >= threshold)
+
+
+def agreement_report(prob_teacher, prob_student, threshold=OPTIMAL_THRESHOLD_GABUNGAN, medium=MEDIUM_THRESHOLD):
+    from sklearn.metrics import roc_auc_score
+
+    from shadow import BAND_NAMES
+
+    band_t, band_s = _bands(prob_teacher, threshold, medium), _bands(prob_student, threshold, medium)
+    matrix = np.bincount(band_t * 3 + band_s, minlength=9).reshape(3, 3)
+    positive = prob_teacher >= threshold
+    abs_diff = np.abs(prob_student - prob_teacher)
+    return {
+        'rows': int(len(prob_teacher)),
+        'band_agreement': round(float(np.trace(matrix)) / len(prob_teacher), 4),
+        'confusion': {BAND_NAMES[i]: dict(zip(BAND_NAMES, map(int, matrix[i]))) for i in range(3)},
+        'auc_vs_teacher': round(float(roc_auc_score(positive, prob_student)), 5)
+        if 0 < positive.sum() < len(positive) else None,
+        'mean_abs_diff': round(float(abs_diff.mean()), 5),
+        'p99_abs_diff': round(float(np.quantile(abs_diff, 0.99)), 5),
+        'max_abs_diff': round(float(abs_diff.max()), 5),
+    }
+
+
+def _bytes(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _cold_load_seconds(code, repeat=3):
+    # Proses baru: impor + muat, seperti start app
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c',
+                              'import time; t0 = time.perf_counter()\n' + code +
+                              '\nprint(time.perf_counter() - t0)'],
+                             capture_output=True, text=True, check=True)
+        runs.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(runs)
+
+
+def _row_latency(fn, row, repeat=2000):
+    fn(row)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(row)
+    return (time.perf_counter() - t0) / repeat
+
+
+def cost_report(teacher_path, teacher, student_dir, student, repeat=3):
+    import pandas as pd
+
+    from model_loader import COMPILED_DIR
+
+    name = os.path.basename(os.path.normpath(student_dir))
+    teacher_compiled_dir = os.path.join(COMPILED_DIR, name)
+    row = synthetic_inputs(student.feature_names, 1, seed=1)[0]
+    df_row = pd.DataFrame([row], columns=student.feature_names)
+    report = {
+        'teacher_bytes': _bytes(teacher_path),
+        'student_bytes': _bytes(student_dir),
+        'teacher_load_s': round(_cold_load_seconds(f"import joblib; joblib.load({teacher_path!r})", repeat), 4),
+        'student_load_s': round(_cold_load_seconds(
+            f"from fast_inference import load_compiled; load_compiled({student_dir!r})", repeat), 4),
+        'teacher_row_us': round(_row_latency(lambda r: teacher.predict_proba(r)[0, 1], df_row, 50) * 1e6, 1),
+        'student_row_us': round(_row_latency(student.predict_row, row) * 1e6, 1),
+        'student_trees': student.n_trees,
+        'student_nodes': int(len(student.threshold)),
+    }
+    # Guru terkompilasi (jalur yang dipakai app saat ini) sebagai pembanding kedua
+    compiled = load_compiled(teacher_compiled_dir, source_path=teacher_path)
+    if compiled is not None:
+        report['teacher_compiled_bytes'] = _bytes(teacher_compiled_dir)
+        report['teacher_compiled_load_s'] = round(_cold_load_seconds(
+            f"from fast_inference import load_compiled; load_compiled({teacher_compiled_dir!r})", repeat), 4)
+        report['teacher_compiled_row_us'] = round(_row_latency(compiled.predict_row, row) * 1e6, 1)
+    return report
+
+
+def evaluate(student_root, eval_rows=EVAL_ROWS, seed=0, repeat=3):
+    import joblib
+
+    result = {}
+    for name, teacher_path in TEACHERS.items():
+        directory = os.path.join(student_root, name)
+        loaded = load_student(directory, teacher_path)
+        if loaded is None:
+            raise FileNotFoundError(f"Murid {directory} tidak ada atau dilatih dari {teacher_path} versi lain")
+        student = loaded[0]
+        teacher = joblib.load(teacher_path)
+        # Non-lab: seluruh grid input (persis populasi input app); gabungan: sampel baru (seed berbeda)
+        X = synthetic_inputs(student.feature_names, None if name == 'nonlab' else eval_rows, seed + 1)
+        result[name] = {
+            **agreement_report(teacher_proba(teacher, X), student.predict_proba(X)[:, 1], *MODEL_THRESHOLDS[name]),
+            **cost_report(teacher_path, teacher, directory, student, repeat),
+        }
+    return result
+
+
+# PIPELINE
+def train(kind='tree', out=None, trees=60, depth=3, learning_rate=0.3, max_bins=SCORECARD_MAX_BINS,
+          rows=GAB_TRAIN_ROWS, seed=0):
+    import joblib
+
+    out = out or os.path.join(STUDENT_ROOT, kind)
+    for name, teacher_path in TEACHERS.items():
+        teacher = joblib.load(teacher_path)
+        features = [str(f) for f in teacher.feature_names_in_]
+        X = synthetic_inputs(features, None if name == 'nonlab' else rows, seed)
+        y = teacher_proba(teacher, X)
+        t0 = time.perf_counter()
+        if kind == 'tree':
+            student = fit_tree(X, y, features, trees, depth, learning_rate, seed)
+            params = {'trees': trees, 'depth': depth, 'learning_rate': learning_rate}
+        else:
+            student = fit_scorecard(X, y, features, max_bins)
+            params = {'max_bins': max_bins}
+        save_student(student, os.path.join(out, name), teacher_path, {
+            'kind': kind, 'params': params, 'teacher': teacher_path, 'train_rows': int(len(X)),
+            'seed': seed, 'fit_s': round(time.perf_counter() - t0, 2),
+        })
+    return out
+
+
+def format_report(result):
+    lines = []
+    for name, r in result.items():
+        auc = 'n/a' if r['auc_vs_teacher'] is None else f"{r['auc_vs_teacher']:.4f}"
+        lines.append(
+            f"[{name}] {r['rows']:,} baris: kesepakatan kategori {r['band_agreement']:.1%}, AUC vs guru {auc}, "
+            f"|Δp| rata-rata {r['mean_abs_diff']:.4f} (p99 {r['p99_abs_diff']:.4f}, maks {r['max_abs_diff']:.4f})")
+        lines.append(
+            f"    ukuran {r['student_bytes'] / 1024:.0f} KB (guru joblib {r['teacher_bytes'] / 1024:.0f} KB), "
+            f"muat dingin {r['student_load_s'] * 1e3:.0f} ms (guru {r['teacher_load_s'] * 1e3:.0f} ms), "
+            f"1 baris {r['student_row_us']:.0f} µs (guru {r['teacher_row_us']:.0f} µs)")
+        if 'teacher_compiled_bytes' in r:
+            lines.append(
+                f"    guru terkompilasi: {r['teacher_compiled_bytes'] / 1024:.0f} KB, "
+                f"muat dingin {r['teacher_compiled_load_s'] * 1e3:.0f} ms, 1 baris {r['teacher_compiled_row_us']:.0f} µs")
+    return '\n'.join(lines)
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distilasi model DiaLens ke model murid ringkas.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_train = sub.add_parser('train', help="Latih murid untuk kedua model lalu tulis laporan")
+    p_train.add_argument('--kind', choices=KINDS, default='tree')
+    p_train.add_argument('--out', help="Direktori murid (default artifacts/students/<kind>)")
+    p_train.add_argument('--trees', type=int, default=60)
+    p_train.add_argument('--depth', type=int, default=3)
+    p_train.add_argument('--learning-rate', type=float, default=0.3)
+    p_train.add_argument('--max-bins', type=int, default=SCORECARD_MAX_BINS)
+    p_train.add_argument('--rows', type=int, default=GAB_TRAIN_ROWS, help="Sampel latih model gabungan")
+    p_train.add_argument('--seed', type=int, default=0)
+    p_report = sub.add_parser('report', help="Evaluasi ulang murid yang sudah dilatih")
+    p_report.add_argument('student_dir')
+    for p in (p_train, p_report):
+        p.add_argument('--eval-rows', type=int, default=EVAL_ROWS)
+        p.add_argument('--repeat', type=int, default=3, help="Pengulangan ukur waktu muat dingin")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.command == 'train':
+        student_dir = train(args.kind, args.out, args.trees, args.depth, args.learning_rate, args.max_bins,
+                            args.rows, args.seed)
+        print(f"✅ Murid {args.kind} disimpan di {student_dir} ({time.perf_counter() - t0:.1f} dtk)")
+    else:
+        student_dir = args.student_dir
+    try:
+        result = evaluate(student_dir, args.eval_rows, repeat=args.repeat)
+    except FileNotFoundError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    with open(os.path.join(student_dir, 'report.json'), 'w') as f:
+        json.dump(result, f, indent=2)
+    print(format_report(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
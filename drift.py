@@ -0,0 +1,444 @@
+# MONITOR DRIFT: sketsa streaming ukuran tetap untuk input & probabilitas, PSI/KS vs referensi
+#
+# Tiap submission (display_step_3) hanya menambah satu hitungan per kolom ke histogram bin
+# tetap — submission tidak disimpan. Kolom = semua fitur model gabungan (usia/slider per 1,
+# biner per kategori, HbA1c per 0.1, gula darah per 1) + prob_nl/prob_gab per 0.001. Slot 0
+# tiap kolom menghitung nilai kosong/diimputasi (lab 0 atau di luar rentang → 5.5/95.0), jadi
+# laju imputasi dan proporsi pengisi lab ikut terpantau. Kuantil dibaca dari histogram yang sama.
+#
+# Sketsa bisa dijumlahkan antarproses: tiap proses menulis sketch-<hari>-<pid>-<token>.npz di
+# DIALENS_DRIFT tiap FLUSH_INTERVAL dtk. Monitor bersifat opt-in: DIALENS_DRIFT tidak di-set →
+# mati, sehingga AppTest/benchmark tidak ikut masuk jendela produksi (CLI memakai artifacts/drift).
+# Token acak per start, jadi proses yang restart dengan pid sama (mis. pid 1 di container) tidak
+# menimpa hitungan hari itu. `check`
+# menjumlahkan jendela N hari terakhir lalu menghitung PSI (10 bin kuantil referensi) dan KS
+# terhadap reference.npz.
+# Hasil juga diekspor sebagai gauge dialens_drift_psi/_ks/_rate untuk alert (metrics.py).
+#
+#   python drift.py reference data_latih.parquet               # → artifacts/drift/reference.npz
+#   python drift.py reference hasil_skor.parquet --scored
+#   python drift.py reference --feature-store artifacts/feature_store
+#   python drift.py check --days 7                             # exit 1 jika ada drift
+#   python drift.py merge a.npz b.npz --out gabungan.npz
+import argparse
+import atexit
+import datetime
+import glob
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from config import BINARY_FEATURES, INPUT_RANGES, LAB_RANGES
+from metrics import DRIFT_KS, DRIFT_PSI, DRIFT_RATE, DRIFT_ROWS
+from validation import DECLARED_FIELDS
+
+DEFAULT_DRIFT_DIR = os.path.join('artifacts', 'drift')
+DRIFT_DIR = os.environ.get('DIALENS_DRIFT', '')
+REFERENCE_PATH = (os.environ.get('DIALENS_DRIFT_REFERENCE')
+                  or os.path.join(DRIFT_DIR or DEFAULT_DRIFT_DIR, 'reference.npz'))
+WINDOW_DAYS = int(os.environ.get('DIALENS_DRIFT_WINDOW_DAYS', 7))
+FLUSH_INTERVAL = 30.0
+LAB_STEPS = {'HbA1c': 0.1, 'FastingBloodSugar': 1.0}
+PROB_COLUMNS = ('prob_nl', 'prob_gab')
+PROB_BINS = 1000
+PSI_BINS = 10
+PSI_ALERT = 0.2
+KS_ALERT = 0.1
+RATE_ALERT = 0.1
+MIN_ROWS = 100
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+_EPS = 1e-4
+
+
+# SPESIFIKASI BIN: kolom → (jenis, batas bawah bin pertama, lebar bin, jumlah bin)
+# Slot: 0 = kosong/diimputasi, 1 = di bawah rentang, 2..n+1 = bin, n+2 = di atas rentang
+def _specs():
+    specs = {}
+    for name in DECLARED_FIELDS:
+        if name in INPUT_RANGES:
+            low, high = INPUT_RANGES[name]
+            specs[name] = ('input', low - 0.5, 1.0, int(high - low) + 1)
+        elif name in BINARY_FEATURES:
+            specs[name] = ('binary', -0.5, 1.0, 2)
+        elif name in LAB_RANGES:
+            low, high = LAB_RANGES[name]
+            specs[name] = ('lab', low, LAB_STEPS[name], round((high - low) / LAB_STEPS[name]))
+    for name in PROB_COLUMNS:
+        specs[name] = ('prob', 0.0, 1.0 / PROB_BINS, PROB_BINS)
+    return specs
+
+
+SPECS = _specs()
+
+
+def _slot(spec, value):
+    kind, low, step, n = spec
+    if value is None or value != value or (kind == 'lab' and value == 0):
+        return 0
+    k = math.floor((value - low) / step + 1e-9)
+    if k < 0:
+        return 0 if kind == 'lab' else 1
+    if k >= n:
+        if kind == 'lab':
+            # Tepi atas rentang lab masih valid, selebihnya diimputasi (sama dengan validation.py)
+            return n + 1 if value <= low + n * step + 1e-9 else 0
+        return n + 1 if kind == 'prob' and value <= 1.0 else n + 2
+    return k + 2
+
+
+def _slots(spec, values):
+    kind, low, step, n = spec
+    x = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(x)
+    # -1 → slot 1 (di bawah), n → slot n+2 (di atas)
+    k = np.floor((np.where(missing, low, x) - low) / step + 1e-9)
+    slots = np.clip(k, -1, n).astype(np.int64) + 2
+    if kind == 'prob':
+        slots[x == 1.0] = n + 1
+    elif kind == 'lab':
+        slots[(slots == n + 2) & (x <= low + n * step + 1e-9)] = n + 1
+        missing |= (x == 0) | (slots == 1) | (slots == n + 2)
+    slots[missing] = 0
+    return slots
+
+
+# SKETSA
+class DriftSketch:
+    def __init__(self, counts=None, rows=0, lab_rows=0):
+        self.counts = counts or {name: np.zeros(spec[3] + 3, dtype=np.int64) for name, spec in SPECS.items()}
+        self.rows = rows
+        self.lab_rows = lab_rows
+
+    def update_record(self, record, prob_nl=None, prob_gab=None):
+        # Satu submission (data_collected); tanpa alokasi array
+        lab = False
+        for name, spec in SPECS.items():
+            value = prob_nl if name == 'prob_nl' else prob_gab if name == 'prob_gab' else record.get(name)
+            slot = _slot(spec, None if value is None else float(value))
+            self.counts[name][slot] += 1
+            lab |= spec[0] == 'lab' and slot != 0
+        self.rows += 1
+        self.lab_rows += lab
+
+    def update(self, columns, prob_nl=None, prob_gab=None):
+        # Batch: columns = DataFrame / {nama: array}; kolom yang tidak ada dihitung kosong
+        from validation import coerce_column
+
+        n = len(prob_nl) if prob_nl is not None else len(columns[next(iter(columns))])
+        lab = np.zeros(n, dtype=bool)
+        for name, spec in SPECS.items():
+            values = prob_nl if name == 'prob_nl' else prob_gab if name == 'prob_gab' else (
+                coerce_column(columns[name], np.float64)[0] if name in columns else None)
+            slots = np.zeros(n, dtype=np.int64) if values is None else _slots(spec, values)
+            self.counts[name] += np.bincount(slots, minlength=spec[3] + 3)
+            if spec[0] == 'lab':
+                lab |= slots != 0
+        self.rows += n
+        self.lab_rows += int(lab.sum())
+        return n
+
+    def merge(self, other):
+        for name in self.counts:
+            self.counts[name] += other.counts[name]
+        self.rows += other.rows
+        self.lab_rows += other.lab_rows
+        return self
+
+    def rates(self):
+        rows = max(self.rows, 1)
+        out = {'lab_share': self.lab_rows / rows}
+        for name, spec in SPECS.items():
+            if spec[0] == 'lab':
+                out[f'imputed_{name}'] = int(self.counts[name][0]) / rows
+        return out
+
+    def quantiles(self, name, qs=QUANTILES):
+        # Dari titik tengah bin; kosong/diimputasi tidak ikut
+        _, low, step, n = SPECS[name]
+        counts = self.counts[name][2:n + 2]
+        total = counts.sum()
+        if total == 0:
+            return [None] * len(qs)
+        idx = np.searchsorted(np.cumsum(counts), np.asarray(qs) * total, side='left')
+        return (low + (np.minimum(idx, n - 1) + 0.5) * step).round(4).tolist()
+
+    def save(self, path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, rows=self.rows, lab_rows=self.lab_rows, **self.counts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            counts = {name: data[name].astype(np.int64) for name in SPECS}
+            return cls(counts, int(data['rows']), int(data['lab_rows']))
+
+
+# PSI / KS
+def column_drift(current, reference):
+    # current/reference: hitungan slot 1..n+2 (tanpa kosong); PSI pada ≤ PSI_BINS kelompok kuantil
+    # referensi (bin halus dikelompokkan menurut massa kumulatif), KS pada bin halus
+    cur_n, ref_n = current.sum(), reference.sum()
+    if cur_n == 0 or ref_n == 0:
+        return None, None
+    ref_cdf = np.cumsum(reference) / ref_n
+    ks = float(np.abs(np.cumsum(current) / cur_n - ref_cdf).max())
+    if len(reference) <= PSI_BINS:
+        groups = np.arange(len(reference))
+    else:
+        groups = np.minimum(((ref_cdf - reference / (2 * ref_n)) * PSI_BINS).astype(np.int64), PSI_BINS - 1)
+    p = np.maximum(np.bincount(groups, weights=current) / cur_n, _EPS)
+    q = np.maximum(np.bincount(groups, weights=reference) / ref_n, _EPS)
+    return float(((p - q) * np.log(p / q)).sum()), ks
+
+
+def compare(current, reference, psi_alert=PSI_ALERT, ks_alert=KS_ALERT, rate_alert=RATE_ALERT,
+            min_rows=MIN_ROWS):
+    columns = {}
+    for name, spec in SPECS.items():
+        cur, ref = current.counts[name][1:], reference.counts[name][1:]
+        psi, ks = column_drift(cur, ref)
+        columns[name] = {
+            'psi': psi, 'ks': ks, 'rows': int(cur.sum()), 'reference_rows': int(ref.sum()),
+            'quantiles': current.quantiles(name) if spec[0] != 'binary' else None,
+            'reference_quantiles': reference.quantiles(name) if spec[0] != 'binary' else None,
+            'alert': bool(cur.sum() >= min_rows and psi is not None and (psi > psi_alert or ks > ks_alert)),
+        }
+    cur_rates, ref_rates = current.rates(), reference.rates()
+    rates = {
+        name: {'current': cur_rates[name], 'reference': ref_rates[name],
+               'alert': bool(current.rows >= min_rows and abs(cur_rates[name] - ref_rates[name]) > rate_alert)}
+        for name in cur_rates
+    }
+    alerts = [name for name, r in {**columns, **rates}.items() if r['alert']]
+    return {'rows': current.rows, 'reference_rows': reference.rows, 'columns': columns, 'rates': rates,
+            'alerts': alerts}
+
+
+def publish(result):
+    DRIFT_ROWS.set(result['rows'])
+    for name, r in result['columns'].items():
+        if r['psi'] is not None:
+            DRIFT_PSI.labels(name).set(r['psi'])
+            DRIFT_KS.labels(name).set(r['ks'])
+    for name, r in result['rates'].items():
+        DRIFT_RATE.labels(name).set(r['current'])
+
+
+# PENYIMPANAN PER PROSES + JENDELA
+def _today():
+    return time.strftime('%Y%m%d')
+
+
+def window_paths(root=DRIFT_DIR or DEFAULT_DRIFT_DIR, days=WINDOW_DAYS, today=None):
+    today = datetime.datetime.strptime(today or _today(), '%Y%m%d').date()
+    first = (today - datetime.timedelta(days=days - 1)).strftime('%Y%m%d')
+    paths = []
+    for path in sorted(glob.glob(os.path.join(root, 'sketch-*.npz'))):
+        day = os.path.basename(path).split('-')[1]
+        if first <= day <= today.strftime('%Y%m%d'):
+            paths.append(path)
+    return paths
+
+
+def merge_paths(paths):
+    merged = DriftSketch()
+    for path in paths:
+        try:
+            merged.merge(DriftSketch.load(path))
+        except (OSError, ValueError, KeyError):
+            pass
+    return merged
+
+
+def load_reference(path=REFERENCE_PATH):
+    try:
+        return DriftSketch.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class DriftMonitor:
+    # Satu sketsa harian per proses (≈ 18 KB); record() hanya menambah hitungan
+    def __init__(self, root=DRIFT_DIR or DEFAULT_DRIFT_DIR, reference_path=REFERENCE_PATH, flush_interval=FLUSH_INTERVAL,
+                 window_days=WINDOW_DAYS):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.window_days = window_days
+        self.reference = load_reference(reference_path)
+        self.last_result = None
+        self._lock = threading.Lock()
+        self._day = _today()
+        self._token = f'{os.getpid()}-{os.urandom(4).hex()}'
+        self._sketch = DriftSketch()
+        self._dirty = False
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, day):
+        return os.path.join(self.root, f'sketch-{day}-{self._token}.npz')
+
+    def record(self, record, prob_nl=None, prob_gab=None):
+        with self._lock:
+            day = _today()
+            if day != self._day:
+                self._flush_locked()
+                self._day, self._sketch = day, DriftSketch()
+            self._sketch.update_record(record, prob_nl, prob_gab)
+            self._dirty = True
+
+    def _flush_locked(self):
+        if self._dirty:
+            self._sketch.save(self._path(self._day))
+            self._dirty = False
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def check(self):
+        # Jumlahkan sketsa semua proses dalam jendela → PSI/KS vs referensi → gauge
+        if self.reference is None:
+            return None
+        self.flush()
+        self.last_result = compare(merge_paths(window_paths(self.root, self.window_days)), self.reference)
+        publish(self.last_result)
+        return self.last_result
+
+    def start(self):
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.check() if self.reference is not None else self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=loop, name='dialens-drift', daemon=True).start()
+        return self
+
+
+_MONITOR = None
+_MONITOR_LOCK = threading.Lock()
+
+
+def get_monitor(root=DRIFT_DIR):
+    # Satu monitor per proses; root kosong (DIALENS_DRIFT tidak di-set) → monitor mati, None
+    global _MONITOR
+    if not root:
+        return None
+    with _MONITOR_LOCK:
+        if _MONITOR is None:
+            _MONITOR = DriftMonitor(root).start()
+            atexit.register(_MONITOR.flush)
+    return _MONITOR
+
+
+# REFERENSI DARI FILE / FEATURE STORE
+def build_reference(path=None, scored=False, feature_store=None, chunksize=None):
+    sketch = DriftSketch()
+    if feature_store:
+        from feature_store import iter_arrays
+        for block in iter_arrays(feature_store):
+            prob_gab = block['prob_gab'].astype(np.float64)
+            sketch.update(block, block['prob_nl'].astype(np.float64), prob_gab)
+        return sketch
+
+    from scoring import DEFAULT_CHUNKSIZE, iter_chunks, load_models, score_validated
+    from validation import get_schema, input_fields, validate_columns
+
+    models = None if scored else load_models(fast=True)
+    for chunk in iter_chunks(path, chunksize or DEFAULT_CHUNKSIZE):
+        if scored:
+            prob_nl = chunk['prob_nl'].to_numpy(dtype=np.float64, na_value=np.nan)
+            prob_gab = chunk['prob_gab'].to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            model_nl, model_gab, features_nl, features_gab = models
+            checked = validate_columns(chunk, get_schema(input_fields(features_nl, features_gab)))
+            prob_nl, prob_gab = score_validated(checked, model_nl, model_gab, features_nl, features_gab)
+        sketch.update(chunk, prob_nl, prob_gab)
+    return sketch
+
+
+# CLI
+def _fmt(value, digits=3):
+    return '-' if value is None else f'{value:.{digits}f}'
+
+
+def format_report(result, elapsed_ms):
+    lines = [f"{result['rows']} submission vs referensi {result['reference_rows']} baris "
+             f"(PSI/KS {elapsed_ms:.2f} ms)",
+             f"{'kolom':<26}{'PSI':>8}{'KS':>8}  {'median (ref)':<20}"]
+    for name, r in result['columns'].items():
+        median = '-' if r['quantiles'] is None else f"{_fmt(r['quantiles'][2], 2)} ({_fmt(r['reference_quantiles'][2], 2)})"
+        flag = ' ❌' if r['alert'] else ''
+        lines.append(f"{name:<26}{_fmt(r['psi']):>8}{_fmt(r['ks']):>8}  {median:<20}{flag}")
+    for name, r in result['rates'].items():
+        flag = ' ❌' if r['alert'] else ''
+        lines.append(f"{name:<26}{r['current']:>8.1%} (ref {r['reference']:.1%}){flag}")
+    lines.append(f"❌ Drift: {', '.join(result['alerts'])}" if result['alerts'] else "✅ Tidak ada drift")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor drift input & probabilitas DiaLens.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_ref = sub.add_parser('reference', help="Bangun sketsa referensi dari file atau feature store")
+    p_ref.add_argument('input', nargs='?', help="File (.csv/.parquet) populasi referensi")
+    p_ref.add_argument('--scored', action='store_true', help="Input sudah berisi prob_nl/prob_gab")
+    p_ref.add_argument('--feature-store', default=None, help="Direktori feature store sebagai sumber")
+    p_ref.add_argument('--chunksize', type=int, default=None)
+    p_ref.add_argument('--out', default=REFERENCE_PATH)
+    p_check = sub.add_parser('check', help="Bandingkan jendela saat ini dengan referensi")
+    p_check.add_argument('--dir', default=DRIFT_DIR or DEFAULT_DRIFT_DIR)
+    p_check.add_argument('--days', type=int, default=WINDOW_DAYS)
+    p_check.add_argument('--reference', default=REFERENCE_PATH)
+    p_check.add_argument('--psi-alert', type=float, default=PSI_ALERT)
+    p_check.add_argument('--ks-alert', type=float, default=KS_ALERT)
+    p_check.add_argument('--rate-alert', type=float, default=RATE_ALERT)
+    p_check.add_argument('--min-rows', type=int, default=MIN_ROWS)
+    p_check.add_argument('--json', default=None, help="Tulis hasil lengkap ke file JSON")
+    p_merge = sub.add_parser('merge', help="Jumlahkan beberapa sketsa")
+    p_merge.add_argument('paths', nargs='+')
+    p_merge.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'reference':
+        if not args.input and not args.feature_store:
+            parser.error("butuh file input atau --feature-store")
+        t0 = time.perf_counter()
+        sketch = build_reference(args.input, args.scored, args.feature_store, args.chunksize)
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        sketch.save(args.out)
+        print(f"✅ Referensi {sketch.rows} baris ({sketch.rates()['lab_share']:.1%} dengan lab) → {args.out} "
+              f"({time.perf_counter() - t0:.2f} dtk)")
+        return 0
+
+    if args.command == 'merge':
+        merged = merge_paths(args.paths)
+        merged.save(args.out)
+        print(f"✅ {len(args.paths)} sketsa, {merged.rows} baris → {args.out}")
+        return 0
+
+    reference = load_reference(args.reference)
+    if reference is None:
+        print(f"❌ Referensi tidak ditemukan: {args.reference}", file=sys.stderr)
+        return 2
+    current = merge_paths(window_paths(args.dir, args.days))
+    t0 = time.perf_counter()
+    result = compare(current, reference, args.psi_alert, args.ks_alert, args.rate_alert, args.min_rows)
+    elapsed_ms = (time.perf_counter() - t0) * 1e3
+    print(format_report(result, elapsed_ms))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 1 if result['alerts'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# ATRIBUSI FITUR (TreeSHAP path-dependent) untuk model pohon terkompilasi
+#
+# Struktur pohon diproses sekali saat model dimuat: untuk tiap daun disimpan node di
+# jalurnya, fitur unik (≤ max_depth), fraksi cover z per fitur, dan tabel kontribusi
+# Shapley untuk semua 2^D pola "x lolos / tidak lolos" kondisi fitur tersebut.
+# Per baris cukup hitung keputusan tiap node, bentuk pola per daun, lalu gather + bincount.
+#
+# Cek terhadap pred_contribs bawaan XGBoost dan local accuracy (jumlah kontribusi = skor):
+#   python explain.py --check
+import argparse
+import sys
+import time
+from math import factorial
+
+import numpy as np
+
+BLOCK_ROWS = 64
+# Tabel Shapley = L × 2^D × D float (perantara poly/shifted sama besar); di atas kedalaman ini
+# atribusi dimatikan agar model dalam dari registry/retrain tidak menghabiskan memori saat dimuat
+MAX_EXPLAIN_DEPTH = 10
+
+FEATURE_LABELS = {
+    'Age': 'Usia',
+    'DietQuality': 'Kualitas diet',
+    'Smoking': 'Merokok',
+    'FamilyHistoryDiabetes': 'Riwayat diabetes keluarga',
+    'Hypertension': 'Hipertensi',
+    'FrequentUrination': 'Sering buang air kecil',
+    'ExcessiveThirst': 'Haus berlebihan',
+    'UnexplainedWeightLoss': 'Penurunan berat badan tanpa sebab',
+    'HealthLiteracy': 'Literasi kesehatan',
+    'HbA1c': 'HbA1c',
+    'FastingBloodSugar': 'Gula darah puasa',
+}
+
+
+def _leaf_paths(compiled):
+    # Daftar (daun, [(node, ke_kanan), ...]) untuk setiap pohon, ditelusuri dari akar
+    children = compiled.children
+    for root in compiled.roots:
+        stack = [(int(root), [])]
+        while stack:
+            node, path = stack.pop()
+            left, right = int(children[2 * node]), int(children[2 * node + 1])
+            if left == node:
+                yield node, path
+                continue
+            stack.append((right, path + [(node, True)]))
+            stack.append((left, path + [(node, False)]))
+
+
+def _shapley_tables(value, z, depth):
+    # value (L,), z (L, D) → tabel (L, 2^D, D) kontribusi per pola bit o dan slot fitur.
+    # Slot kosong diisi z = o = 1: pemain nol, tidak mengubah nilai Shapley slot lain.
+    n_patterns = 1 << depth
+    bits = ((np.arange(n_patterns)[:, None] >> np.arange(depth)) & 1).astype(np.float64)  # (P, D)
+    weights = np.array([factorial(s) * factorial(depth - s - 1) / factorial(depth) for s in range(depth)])
+    o = np.broadcast_to(bits[None], (len(value), n_patterns, depth))
+    zz = np.broadcast_to(z[:, None, :], o.shape)
+    table = np.empty(o.shape)
+    for i in range(depth):
+        # Koefisien t^s dari prod_{j != i} (z_j + o_j t) = jumlah bobot semua subset S berukuran s
+        poly = np.zeros(o.shape[:2] + (depth,))
+        poly[..., 0] = 1.0
+        for j in range(depth):
+            if j == i:
+                continue
+            shifted = np.zeros_like(poly)
+            shifted[..., 1:] = poly[..., :-1]
+            poly = poly * zz[..., j:j + 1] + shifted * o[..., j:j + 1]
+        table[..., i] = value[:, None] * (o[..., i] - zz[..., i]) * (poly @ weights)
+    return table
+
+
+class TreeExplainer:
+    def __init__(self, compiled):
+        if compiled.cover is None:
+            raise ValueError("Model terkompilasi tidak punya cover; ekspor ulang dengan model_loader.py export")
+        self.model = compiled
+        self.feature_names = list(compiled.feature_names)
+        self.link = compiled.link
+        depth = compiled.max_depth
+        cover = np.asarray(compiled.cover, dtype=np.float64)
+        scale = 1.0 / compiled.n_trees if compiled.link == 'mean' else 1.0
+        n_features = len(self.feature_names)
+
+        leaves = list(_leaf_paths(compiled))
+        split_nodes = sorted({node for _, path in leaves for node, _ in path})
+        position = {node: k for k, node in enumerate(split_nodes)}
+        L = len(leaves)
+        step_pos = np.zeros((L, depth), dtype=np.intp)
+        step_dir = np.zeros((L, depth), dtype=bool)
+        step_slot = np.full((L, depth), -1, dtype=np.intp)
+        slot_feature = np.full((L, depth), n_features, dtype=np.intp)  # n_features = slot kosong
+        z = np.ones((L, depth))
+        value = np.empty(L)
+        for l, (leaf, path) in enumerate(leaves):
+            value[l] = compiled.value[leaf] * scale
+            slots = {}
+            for s, (node, go_right) in enumerate(path):
+                feat = int(compiled.feature[node])
+                if feat not in slots:
+                    slots[feat] = len(slots)
+                    slot_feature[l, slots[feat]] = feat
+                child = int(compiled.children[2 * node + go_right])
+                z[l, slots[feat]] *= cover[child] / cover[node]
+                step_pos[l, s] = position[node]
+                step_dir[l, s] = go_right
+                step_slot[l, s] = slots[feat]
+
+        self.split_nodes = np.array(split_nodes, dtype=np.intp)
+        self.split_feature = np.asarray(compiled.feature)[self.split_nodes]
+        self.split_threshold = np.asarray(compiled.threshold)[self.split_nodes]
+        self.split_missing_left = np.asarray(compiled.missing_left)[self.split_nodes]
+        self.step_pos = step_pos
+        self.step_dir = step_dir
+        # Bit slot tiap langkah; langkah kosong = 0 sehingga tidak pernah menggagalkan pola
+        self.step_bit = np.where(step_slot >= 0, 1 << np.maximum(step_slot, 0), 0).astype(np.intp)
+        self.slot_feature = slot_feature
+        self.n_patterns = 1 << depth
+        self.table = _shapley_tables(value, z, depth).reshape(L * self.n_patterns, depth)
+        self.leaf_offset = np.arange(L, dtype=np.intp) * self.n_patterns
+        self.depth = depth
+        self.n_features = n_features
+        # Nilai harapan: semua fitur "tidak diketahui" → tiap daun berbobot prod z
+        expected = float((value * z.prod(axis=1)).sum())
+        self.expected_value = expected + (compiled.base_margin if compiled.link == 'logistic' else 0.0)
+
+    def _decisions(self, X):
+        x = X[:, self.split_feature]
+        go_right = (x >= self.split_threshold) if self.model.strict_less else (x > self.split_threshold)
+        nan = np.isnan(x)
+        if nan.any():
+            go_right = np.where(nan, ~self.split_missing_left, go_right)
+        return go_right
+
+    def shap_values(self, X):
+        # Kontribusi dalam ruang skor model: probabilitas rata-rata (RF) atau log-odds (XGBoost)
+        X = self.model._as_matrix(X)
+        n = X.shape[0]
+        width = self.n_features + 1
+        out = np.empty((n, self.n_features))
+        for start in range(0, n, BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            r = block.shape[0]
+            # Pola per daun: semua bit 1, lalu bit slot dimatikan untuk langkah yang tidak lolos
+            failed = self._decisions(block)[:, self.step_pos] != self.step_dir
+            pattern = (self.n_patterns - 1) & ~np.bitwise_or.reduce(np.where(failed, self.step_bit, 0), axis=2)
+            contrib = self.table[self.leaf_offset + pattern]  # (r, L, D)
+            flat = (np.arange(r)[:, None, None] * width + self.slot_feature).ravel()
+            phi = np.bincount(flat, weights=contrib.ravel(), minlength=r * width)
+            out[start:start + r] = phi.reshape(r, width)[:, :self.n_features]
+        return out
+
+    def explain_proba(self, X):
+        # Kontribusi dalam poin probabilitas. Untuk XGBoost, log-odds diskalakan proporsional
+        # sehingga jumlahnya tetap sama dengan p(x) - p(nilai harapan).
+        phi = self.shap_values(X)
+        if self.link != 'logistic':
+            return phi, self.expected_value
+        margin = self.expected_value + phi.sum(axis=1)
+        p0 = 1.0 / (1.0 + np.exp(-self.expected_value))
+        p = 1.0 / (1.0 + np.exp(-margin))
+        delta = margin - self.expected_value
+        slope = np.where(np.abs(delta) > 1e-9, (p - p0) / np.where(delta == 0, 1, delta), p * (1 - p))
+        return phi * slope[:, None], p0
+
+    def explain_row(self, values):
+        phi, base = self.explain_proba(np.asarray(values, dtype=np.float32).reshape(1, -1))
+        return phi[0], base
+
+
+def build_explainer(compiled):
+    if compiled is None or getattr(compiled, 'cover', None) is None:
+        return None
+    if compiled.max_depth > MAX_EXPLAIN_DEPTH:
+        return None
+    return TreeExplainer(compiled)
+
+
+def top_factors(contributions, feature_names, values, k=4, min_abs=0.005):
+    # [(label, nilai input, kontribusi)] diurutkan menurut besar pengaruh
+    order = np.argsort(-np.abs(contributions))
+    factors = []
+    for i in order[:k]:
+        if abs(contributions[i]) < min_abs:
+            break
+        name = feature_names[i]
+        factors.append((FEATURE_LABELS.get(name, name), values[i], float(contributions[i])))
+    return factors
+
+
+# CEK
+def check(n=2000, seed=0):
+    import joblib
+
+    from config import MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH
+    from fast_inference import compile_model, random_inputs
+
+    ok = True
+    for label, path in (('non-lab', MODEL_NON_LAB_PATH), ('gabungan', MODEL_GABUNGAN_PATH)):
+        model = joblib.load(path)
+        compiled = compile_model(model)
+        t0 = time.perf_counter()
+        explainer = TreeExplainer(compiled)
+        t_build = time.perf_counter() - t0
+        X = random_inputs(compiled.feature_names, n, seed)
+        phi = explainer.shap_values(X)
+        score = compiled.decision_function(X)
+        accuracy = float(np.abs(phi.sum(axis=1) + explainer.expected_value - score).max())
+        t0 = time.perf_counter()
+        for row in X[:200]:
+            explainer.explain_row(row)
+        t_row = (time.perf_counter() - t0) / 200
+        print(f"{label}: bangun {t_build * 1e3:.0f} ms, {t_row * 1e6:.0f} µs/baris, "
+              f"local accuracy maks {accuracy:.2e}")
+        ok &= accuracy < 1e-6
+        if hasattr(model, 'get_booster'):
+            import pandas as pd
+            import xgboost as xgb
+            dm = xgb.DMatrix(pd.DataFrame(X, columns=compiled.feature_names))
+            ref = model.get_booster().predict(dm, pred_contribs=True)
+            diff = float(np.abs(ref[:, :-1] - phi).max())
+            print(f"{label}: selisih maks vs XGBoost pred_contribs {diff:.2e}, "
+                  f"nilai harapan {explainer.expected_value:.6f} vs {float(ref[0, -1]):.6f}")
+            ok &= diff < 1e-4
+    print("✅ Atribusi konsisten" if ok else "❌ Atribusi tidak konsisten")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Atribusi fitur TreeSHAP untuk model DiaLens.")
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--n', type=int, default=2000)
+    args = parser.parse_args(argv)
+    if args.check:
+        return 0 if check(args.n) else 1
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
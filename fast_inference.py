@@ -0,0 +1,332 @@
+# INFERENSI CEPAT: ubah model pohon (RandomForest / XGBoost) menjadi array NumPy datar
+#
+# Model dikompilasi sekali saat dimuat, lalu diskor langsung dari matriks float32
+# tanpa membuat DataFrame atau validasi kolom pandas.
+#
+# Cek kesamaan probabilitas dengan predict_proba asli:
+#   python fast_inference.py --check
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BLOCK_ROWS = 1024
+
+
+class CompiledTreeEnsemble:
+    # Semua pohon disimpan dalam satu array node. Daun menunjuk ke dirinya sendiri,
+    # sehingga semua baris x pohon dapat ditelusuri bersama sebanyak max_depth langkah.
+    # Array yang bisa disimpan ke .npy dan dimuat ulang dengan mmap
+    ARRAYS = ('feature', 'threshold', 'children', 'missing_left', 'value', 'roots')
+    # Tidak dibutuhkan untuk prediksi; cover (bobot sampel per node) dipakai explain.py
+    OPTIONAL_ARRAYS = ('cover',)
+
+    def __init__(self, feature, threshold, children, missing_left, value, roots,
+                 max_depth, feature_names, strict_less, base_margin=0.0, link='mean', cover=None):
+        # threshold: float32 siap pakai; children[2 * node] = kiri, children[2 * node + 1] = kanan
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.children = np.asarray(children)
+        self.missing_left = np.asarray(missing_left)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots)
+        self.cover = None if cover is None else np.asarray(cover)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+        self.strict_less = bool(strict_less)
+        self.base_margin = float(base_margin)
+        self.link = link
+        self.classes_ = np.array([0, 1])
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_features_in_(self):
+        return len(self.feature_names)
+
+    @property
+    def feature_names_in_(self):
+        return np.array(self.feature_names, dtype=object)
+
+    def _as_matrix(self, X):
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names].to_numpy()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Jumlah fitur {X.shape[1]} tidak sesuai, model butuh {self.n_features_in_}")
+        return X
+
+    def leaves(self, X):
+        X = self._as_matrix(X)
+        n_features = X.shape[1]
+        flat = X.ravel()
+        has_nan = bool(np.isnan(flat).any())
+        row_offset = (np.arange(X.shape[0]) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = flat[row_offset + self.feature[node]]
+            thr = self.threshold[node]
+            go_right = (x >= thr) if self.strict_less else (x > thr)
+            if has_nan:
+                nan = np.isnan(x)
+                go_right[nan] = ~self.missing_left[node[nan]]
+            node = self.children[2 * node + go_right]
+        return node
+
+    def decision_function(self, X):
+        X = self._as_matrix(X)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        # Diproses per blok agar array sementara (baris x pohon) tetap muat di cache
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            values = self.value[self.leaves(X[start:start + BLOCK_ROWS])]
+            if self.link == 'logistic':
+                out[start:start + BLOCK_ROWS] = self.base_margin + values.sum(axis=1)
+            else:
+                out[start:start + BLOCK_ROWS] = values.mean(axis=1)
+        return out
+
+    def predict_proba(self, X):
+        score = self.decision_function(X)
+        if self.link == 'logistic':
+            score = 1.0 / (1.0 + np.exp(-score))
+        return np.column_stack([1.0 - score, score])
+
+    def meta(self):
+        # Atribut non-array; bersama ARRAYS cukup untuk membangun ulang model
+        return {
+            'max_depth': self.max_depth,
+            'feature_names': self.feature_names,
+            'strict_less': self.strict_less,
+            'base_margin': self.base_margin,
+            'link': self.link,
+        }
+
+    def predict_row(self, values):
+        return float(self.predict_proba(np.asarray(values, dtype=np.float32).reshape(1, -1))[0, 1])
+
+
+def _float32_threshold(threshold, strict_less):
+    # Input diskor sebagai float32. Ambang float64 scikit-learn (x <= t) dibulatkan ke bawah
+    # ke float32 terdekat agar hasil perbandingan identik tanpa konversi input ke float64.
+    threshold = np.asarray(threshold, dtype=np.float64)
+    thr32 = threshold.astype(np.float32)
+    if not strict_less:
+        too_big = thr32.astype(np.float64) > threshold
+        thr32[too_big] = np.nextafter(thr32[too_big], np.float32(-np.inf))
+    return np.ascontiguousarray(thr32)
+
+
+def _pack(trees, strict_less):
+    # trees: list of dict(feature, threshold, left, right, missing_left, value, cover, depth) per pohon
+    offsets = np.cumsum([0] + [len(t['feature']) for t in trees])
+    parts = {k: [] for k in ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'cover')}
+    for off, t in zip(offsets, trees):
+        is_leaf = t['left'] < 0
+        own = np.arange(len(t['feature'])) + off
+        parts['feature'].append(np.where(is_leaf, 0, t['feature']))
+        parts['threshold'].append(np.where(is_leaf, 0.0, t['threshold']))
+        parts['left'].append(np.where(is_leaf, own, t['left'] + off))
+        parts['right'].append(np.where(is_leaf, own, t['right'] + off))
+        parts['missing_left'].append(t['missing_left'])
+        parts['value'].append(np.where(is_leaf, t['value'], 0.0))
+        parts['cover'].append(t['cover'])
+    left, right = np.concatenate(parts['left']), np.concatenate(parts['right'])
+    return {
+        'feature': np.concatenate(parts['feature']).astype(np.intp),
+        'threshold': _float32_threshold(np.concatenate(parts['threshold']), strict_less),
+        'children': np.ascontiguousarray(np.column_stack([left, right]).ravel(), dtype=np.intp),
+        'missing_left': np.concatenate(parts['missing_left']).astype(bool),
+        'value': np.concatenate(parts['value']).astype(np.float64),
+        'roots': offsets[:-1].astype(np.intp),
+        'cover': np.concatenate(parts['cover']).astype(np.float64),
+        'max_depth': max(t['depth'] for t in trees),
+        'strict_less': strict_less,
+    }
+
+
+def _depth(left, right):
+    depth = np.zeros(len(left), dtype=int)
+    for i in range(len(left)):
+        if left[i] >= 0:
+            depth[left[i]] = depth[right[i]] = depth[i] + 1
+    return int(depth.max())
+
+
+# KONVERSI SCIKIT-LEARN
+def compile_forest(model):
+    trees = []
+    for est in model.estimators_:
+        tree = est.tree_
+        value = tree.value[:, 0, :]
+        prob = value[:, 1] / value.sum(axis=1)
+        missing = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8))
+        trees.append(dict(
+            feature=tree.feature, threshold=tree.threshold,
+            left=tree.children_left, right=tree.children_right,
+            missing_left=np.asarray(missing, dtype=bool), value=prob,
+            cover=tree.weighted_n_node_samples, depth=tree.max_depth,
+        ))
+    return CompiledTreeEnsemble(**_pack(trees, strict_less=False),
+                                feature_names=[str(f) for f in model.feature_names_in_], link='mean')
+
+
+# KONVERSI XGBOOST
+def compile_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw('json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"Objective XGBoost tidak didukung: {objective}")
+    base_score = float(learner['learner_model_param']['base_score'])
+    base_margin = float(np.log(base_score / (1.0 - base_score)))
+    n_trees = len(learner['gradient_booster']['model']['trees'])
+    best = getattr(model, 'best_iteration', None)
+    if best is not None:
+        n_trees = best + 1
+
+    trees = []
+    for t in learner['gradient_booster']['model']['trees'][:n_trees]:
+        left = np.asarray(t['left_children'], dtype=np.intp)
+        right = np.asarray(t['right_children'], dtype=np.intp)
+        cond = np.asarray(t['split_conditions'], dtype=np.float32).astype(np.float64)
+        trees.append(dict(
+            feature=np.asarray(t['split_indices'], dtype=np.intp), threshold=cond,
+            left=left, right=right, missing_left=np.asarray(t['default_left'], dtype=bool),
+            value=cond, cover=np.asarray(t['sum_hessian'], dtype=np.float64), depth=_depth(left, right),
+        ))
+    feature_names = [str(f) for f in model.feature_names_in_]
+    return CompiledTreeEnsemble(**_pack(trees, strict_less=True), feature_names=feature_names,
+                                base_margin=base_margin, link='logistic')
+
+
+def compile_model(model):
+    if hasattr(model, 'get_booster'):
+        return compile_xgboost(model)
+    if hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'tree_'):
+        return compile_forest(model)
+    raise TypeError(f"Model {type(model).__name__} belum didukung inferensi cepat")
+
+
+# SIMPAN / MUAT (format .npy yang bisa di-mmap, tanpa scikit-learn/XGBoost)
+def save_compiled(compiled, directory, source_path=None):
+    os.makedirs(directory, exist_ok=True)
+    for name in CompiledTreeEnsemble.ARRAYS + CompiledTreeEnsemble.OPTIONAL_ARRAYS:
+        if getattr(compiled, name) is not None:
+            np.save(os.path.join(directory, name + '.npy'), getattr(compiled, name))
+    meta = compiled.meta()
+    if source_path:
+        from prediction_cache import file_hash
+        meta['source_path'] = source_path
+        meta['source_sha256'] = file_hash(source_path)
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_compiled(directory, source_path=None, mmap_mode='r'):
+    # None jika artefak tidak ada atau dibuat dari file model yang berbeda
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if source_path:
+        from prediction_cache import file_hash
+        if meta.get('source_sha256') != file_hash(source_path):
+            return None
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+              for name in CompiledTreeEnsemble.ARRAYS}
+    for name in CompiledTreeEnsemble.OPTIONAL_ARRAYS:
+        path = os.path.join(directory, name + '.npy')
+        if os.path.exists(path):
+            arrays[name] = np.load(path, mmap_mode=mmap_mode)
+    meta.pop('source_path', None)
+    meta.pop('source_sha256', None)
+    return CompiledTreeEnsemble(**arrays, **meta)
+
+
+# UJI KESAMAAN (PARITY)
+def random_inputs(feature_names, n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    ranges = {
+        'Age': (20, 90), 'DietQuality': (0, 10), 'HealthLiteracy': (0, 10),
+        'HbA1c': (4.0, 10.0), 'FastingBloodSugar': (70, 200),
+    }
+    cols = []
+    for feat in feature_names:
+        lo, hi = ranges.get(feat, (0, 1))
+        if hi == 1 or feat in ('Age', 'DietQuality', 'HealthLiteracy'):
+            col = rng.integers(lo, hi + 1, n).astype(np.float32)
+            # Sebagian nilai kontinu agar ambang di antara bilangan bulat ikut teruji
+            if hi > 1:
+                frac = rng.random(n) < 0.3
+                col[frac] = rng.uniform(lo, hi, frac.sum())
+        else:
+            col = rng.uniform(lo, hi, n).astype(np.float32)
+        cols.append(col)
+    return np.column_stack(cols).astype(np.float32)
+
+
+def boundary_inputs(compiled, seed=0):
+    # Satu baris per node dengan nilai fitur tepat di ambang split, sebagian diisi NaN
+    rng = np.random.default_rng(seed)
+    base = random_inputs(compiled.feature_names, len(compiled.threshold), seed)
+    base[np.arange(len(base)), compiled.feature] = compiled.threshold
+    with_nan = base.copy()
+    with_nan[rng.random(with_nan.shape) < 0.1] = np.nan
+    return np.vstack([base, with_nan])
+
+
+def check_parity(model, compiled, n=10_000, seed=0, atol=1e-6):
+    import pandas as pd
+    X = np.vstack([random_inputs(compiled.feature_names, n, seed), boundary_inputs(compiled, seed)])
+    expected = model.predict_proba(pd.DataFrame(X, columns=compiled.feature_names))[:, 1]
+    actual = compiled.predict_proba(X)[:, 1]
+    max_err = float(np.max(np.abs(expected - actual)))
+    return max_err <= atol, max_err
+
+
+def _single_row_latency(fn, row, repeat=2000):
+    fn(row)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(row)
+    return (time.perf_counter() - t0) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kompilasi model DiaLens ke inferensi NumPy dan cek kesamaan.")
+    parser.add_argument('--check', action='store_true', help="Bandingkan dengan predict_proba asli")
+    parser.add_argument('--n', type=int, default=20_000)
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--atol', type=float, default=1e-6)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from scoring import load_models
+    model_nl, model_gab, _, _ = load_models()
+
+    ok = True
+    for name, model in (('non-lab', model_nl), ('gabungan', model_gab)):
+        compiled = compile_model(model)
+        row = random_inputs(compiled.feature_names, 1)[0]
+        df_row = pd.DataFrame([row], columns=compiled.feature_names)
+        t_fast = _single_row_latency(compiled.predict_row, row)
+        t_orig = _single_row_latency(lambda r: model.predict_proba(r)[0, 1], df_row, repeat=50)
+        print(f"{name}: {compiled.n_trees} pohon, 1 baris {t_fast * 1e6:.0f} µs (asli {t_orig * 1e6:.0f} µs)")
+        if args.check:
+            for seed in range(args.seeds):
+                passed, err = check_parity(model, compiled, args.n, seed, args.atol)
+                ok &= passed
+                print(f"   seed {seed}: selisih maks {err:.2e} {'✅' if passed else '❌'}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+# FEATURE STORE KOLUMNAR: simpan setiap submission skrining secara append-only
+#
+# Tiap kolom punya dtype sempit (uint8 untuk usia/slider/biner, float32 untuk lab dan
+# probabilitas) sehingga satu rekaman 34 byte. Append hanya menambah tuple ke buffer; per
+# FLUSH_ROWS baris / FLUSH_INTERVAL detik buffer ditulis per kolom ke segmen memory-mapped
+# (satu .npy per kolom, kapasitas tetap) dan jumlah baris yang sah di-commit ke meta.json.
+# Segmen penuh/tertutup bisa dipadatkan ke Parquet atau Feather.
+#
+# Penyimpanan dari app bersifat opt-in: writer hanya aktif jika DIALENS_FEATURE_STORE=<dir>
+# di-set (default kosong = tidak ada yang disimpan di server). Rekaman tidak memuat identitas
+# dan disimpan sampai dihapus/diekspor oleh operator; CLI membaca <dir> tersebut atau
+# artifacts/feature_store.
+#
+#   python feature_store.py stats
+#   python feature_store.py compact --format parquet
+#   python feature_store.py export hasil.parquet
+import argparse
+import atexit
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+WRITE_DIR = os.environ.get('DIALENS_FEATURE_STORE', '')
+STORE_DIR = WRITE_DIR or os.path.join('artifacts', 'feature_store')
+SEGMENT_ROWS = int(os.environ.get('DIALENS_FEATURE_STORE_SEGMENT_ROWS', 65536))
+FLUSH_ROWS = 64
+FLUSH_INTERVAL = 5.0
+
+# Urutan kolom = urutan penyimpanan; fitur model memakai nama yang sama dengan data_collected
+SCHEMA = (
+    ('ts', 'float64'),
+    ('Age', 'uint8'),
+    ('DietQuality', 'uint8'),
+    ('HealthLiteracy', 'uint8'),
+    ('Smoking', 'uint8'),
+    ('Hypertension', 'uint8'),
+    ('FamilyHistoryDiabetes', 'uint8'),
+    ('FrequentUrination', 'uint8'),
+    ('ExcessiveThirst', 'uint8'),
+    ('UnexplainedWeightLoss', 'uint8'),
+    ('HbA1c', 'float32'),
+    ('FastingBloodSugar', 'float32'),
+    ('prob_nl', 'float32'),
+    ('prob_gab', 'float32'),
+    ('final_band', 'uint8'),
+)
+COLUMNS = [name for name, _ in SCHEMA]
+DTYPES = {name: np.dtype(dtype) for name, dtype in SCHEMA}
+RECORD_BYTES = sum(dtype.itemsize for dtype in DTYPES.values())
+_UINT_MAX = {name: int(np.iinfo(dtype).max) for name, dtype in DTYPES.items() if dtype.kind == 'u'}
+
+BAND_CODES = {'Rendah': 0, 'Sedang': 1, 'Tinggi': 2}
+NO_BAND = 255
+
+
+def _encode(name, value):
+    upper = _UINT_MAX.get(name)
+    if value is None:
+        return 0 if upper else np.nan
+    if name == 'final_band':
+        return BAND_CODES.get(value, NO_BAND) if isinstance(value, str) else value
+    if upper:
+        return min(max(int(value), 0), upper)
+    return value
+
+
+# SEGMEN
+class _Segment:
+    def __init__(self, path, capacity, mode):
+        self.path = path
+        self.capacity = capacity
+        self.columns = {}
+        self.views = {}
+        for name in COLUMNS:
+            file = os.path.join(path, f'{name}.npy')
+            if mode == 'w+':
+                self.columns[name] = np.lib.format.open_memmap(file, mode='w+', dtype=DTYPES[name],
+                                                               shape=(capacity,))
+                # View ndarray biasa: tulis skalar per rekaman jauh lebih murah daripada lewat np.memmap
+                self.views[name] = self.columns[name].view(np.ndarray)
+            else:
+                self.columns[name] = np.load(file, mmap_mode='r')
+
+    @staticmethod
+    def read_meta(path):
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, rows, sealed):
+        tmp = os.path.join(self.path, f'meta.json.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'rows': rows, 'capacity': self.capacity, 'sealed': sealed}, f)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+
+class FeatureStoreWriter:
+    def __init__(self, root=STORE_DIR, segment_rows=SEGMENT_ROWS, flush_rows=FLUSH_ROWS,
+                 flush_interval=FLUSH_INTERVAL):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._segment = None
+        self._rows = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._seq = 0
+        os.makedirs(os.path.join(root, 'segments'), exist_ok=True)
+
+    def _open_segment(self):
+        # Nama memuat pid → beberapa proses bisa menulis ke root yang sama tanpa lock file
+        self._seq += 1
+        name = f'seg-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{self._seq:04d}'
+        path = os.path.join(self.root, 'segments', name)
+        os.makedirs(path)
+        self._segment = _Segment(path, self.segment_rows, 'w+')
+        self._rows = 0
+        self._segment.write_meta(0, sealed=False)
+
+    def append(self, record, ts=None):
+        # Satu tuple per rekaman di buffer; kolom ditulis ke segmen sekaligus saat flush
+        row = (time.time() if ts is None else ts,) + tuple(_encode(name, record.get(name)) for name in COLUMNS[1:])
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_buffer()
+
+    def append_batch(self, columns, ts=None):
+        # columns: {nama: array}; kolom yang tidak ada diisi 0/NaN
+        n = len(next(iter(columns.values())))
+        encoded = {'ts': np.full(n, time.time()) if ts is None else np.broadcast_to(np.asarray(ts, dtype=np.float64), (n,))}
+        for name in COLUMNS[1:]:
+            dtype = DTYPES[name]
+            if name not in columns:
+                encoded[name] = np.full(n, np.nan if dtype.kind == 'f' else 0, dtype=dtype)
+                continue
+            values = np.asarray(columns[name])
+            if dtype.kind == 'u' and values.dtype.kind in 'fi':
+                values = np.clip(np.nan_to_num(values), 0, _UINT_MAX[name])
+            encoded[name] = values.astype(dtype, copy=False)
+        with self._lock:
+            self._flush_buffer()
+            self._write(encoded, n)
+        return n
+
+    def _flush_buffer(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        columns = {name: np.fromiter((row[j] for row in rows), DTYPES[name], len(rows))
+                   for j, name in enumerate(COLUMNS)}
+        self._write(columns, len(rows))
+
+    def _write(self, columns, n):
+        done = 0
+        while done < n:
+            if self._segment is None:
+                self._open_segment()
+            take = min(n - done, self.segment_rows - self._rows)
+            dest = slice(self._rows, self._rows + take)
+            for name in COLUMNS:
+                self._segment.views[name][dest] = columns[name][done:done + take]
+            self._rows += take
+            done += take
+            if self._rows >= self.segment_rows:
+                self._seal()
+        if self._segment is not None:
+            # Mapping bersama sudah terlihat proses lain lewat page cache; msync hanya saat segmen ditutup
+            self._segment.write_meta(self._rows, sealed=False)
+
+    def _seal(self):
+        for column in self._segment.columns.values():
+            column.flush()
+        self._segment.write_meta(self._rows, sealed=True)
+        self._segment = None
+
+    def flush(self):
+        with self._lock:
+            self._flush_buffer()
+
+    def start_flusher(self):
+        # Flush berkala agar rekaman di trafik rendah tetap terlihat pembaca
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=loop, name='dialens-feature-store', daemon=True).start()
+        return self
+
+    def close(self):
+        with self._lock:
+            self._flush_buffer()
+            if self._segment is not None:
+                self._seal()
+
+
+# PEMBACA
+def _writer_alive(path):
+    # seg-<waktu>-<pid>-<seq>: segmen terbuka milik proses yang sudah mati dianggap tertutup
+    try:
+        pid = int(os.path.basename(path).split('-')[2])
+        os.kill(pid, 0)
+    except (IndexError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _segment_paths(root, sealed_only=False):
+    for path in sorted(glob.glob(os.path.join(root, 'segments', 'seg-*'))):
+        meta = _Segment.read_meta(path)
+        if meta is None or (sealed_only and not meta['sealed'] and _writer_alive(path)):
+            continue
+        yield path, meta
+
+
+def _part_paths(root):
+    return sorted(glob.glob(os.path.join(root, 'compacted', 'part-*')))
+
+
+def _read_part(path, columns):
+    if path.endswith('.feather'):
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns)
+    return {name: table.column(name).to_numpy() for name in columns}
+
+
+def iter_arrays(root=STORE_DIR, columns=None, include_compacted=True):
+    # Yield {kolom: ndarray} per part/segmen; segmen dibaca lewat mmap (tanpa salin)
+    columns = list(columns or COLUMNS)
+    if include_compacted:
+        for path in _part_paths(root):
+            yield _read_part(path, columns)
+    for path, meta in _segment_paths(root):
+        if meta['rows']:
+            segment = _Segment(path, meta['capacity'], 'r')
+            yield {name: segment.columns[name][:meta['rows']] for name in columns}
+
+
+def read_arrays(root=STORE_DIR, columns=None):
+    columns = list(columns or COLUMNS)
+    blocks = list(iter_arrays(root, columns))
+    if not blocks:
+        return {name: np.empty(0, dtype=DTYPES[name]) for name in columns}
+    return {name: np.concatenate([b[name] for b in blocks]) for name in columns}
+
+
+def iter_feature_matrices(features, root=STORE_DIR):
+    # Matriks float32 (n, len(features)) per blok, siap untuk predict_proba skor ulang massal
+    for block in iter_arrays(root, features):
+        yield np.column_stack([block[name].astype(np.float32, copy=False) for name in features])
+
+
+def stats(root=STORE_DIR):
+    n_segments = n_open = rows = 0
+    for _, meta in _segment_paths(root):
+        n_segments += 1
+        n_open += not meta['sealed']
+        rows += meta['rows']
+    parts = _part_paths(root)
+    compacted_rows = sum(len(_read_part(path, ['final_band'])['final_band']) for path in parts)
+    return {'segments': n_segments, 'open_segments': n_open, 'segment_rows': rows,
+            'compacted_parts': len(parts), 'compacted_rows': compacted_rows, 'bytes_per_record': RECORD_BYTES}
+
+
+# KOMPAKSI
+def _table(block):
+    import pyarrow as pa
+    return pa.table({name: block[name] for name in COLUMNS})
+
+
+def write_file(block, path, fmt=None):
+    fmt = fmt or ('feather' if path.endswith('.feather') else 'parquet')
+    table = _table(block)
+    if fmt == 'feather':
+        import pyarrow.feather as feather
+        feather.write_feather(table, path, compression='zstd')
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(table, path, compression='zstd')
+
+
+def compact(root=STORE_DIR, fmt='parquet'):
+    # Segmen tertutup → satu file part; segmen dihapus setelah file selesai ditulis
+    import shutil
+
+    sealed = [(path, meta) for path, meta in _segment_paths(root, sealed_only=True)]
+    if not sealed:
+        return None, 0
+    blocks = []
+    for path, meta in sealed:
+        segment = _Segment(path, meta['capacity'], 'r')
+        blocks.append({name: np.array(segment.columns[name][:meta['rows']]) for name in COLUMNS})
+    block = {name: np.concatenate([b[name] for b in blocks]) for name in COLUMNS}
+    out_dir = os.path.join(root, 'compacted')
+    os.makedirs(out_dir, exist_ok=True)
+    out = os.path.join(out_dir, f'part-{time.strftime("%Y%m%dT%H%M%S")}-{time.time_ns() % 10**9:09d}.{fmt}')
+    tmp = out + '.tmp'
+    write_file(block, tmp, fmt)
+    os.replace(tmp, out)
+    for path, _ in sealed:
+        shutil.rmtree(path, ignore_errors=True)
+    return out, len(block['ts'])
+
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_writer(root=WRITE_DIR):
+    # Satu writer per proses; ditutup (segmen di-seal) saat proses berakhir.
+    # root kosong (DIALENS_FEATURE_STORE tidak di-set) → penyimpanan mati, None
+    global _WRITER
+    if not root:
+        return None
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = FeatureStoreWriter(root).start_flusher()
+            atexit.register(_WRITER.close)
+        return _WRITER
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Feature store kolumnar submission DiaLens.")
+    parser.add_argument('--root', default=STORE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help="Ringkasan segmen dan part terkompaksi")
+    p_compact = sub.add_parser('compact', help="Padatkan segmen tertutup ke Parquet/Feather")
+    p_compact.add_argument('--format', choices=['parquet', 'feather'], default='parquet')
+    p_export = sub.add_parser('export', help="Tulis semua rekaman ke satu file .parquet/.feather")
+    p_export.add_argument('output')
+    args = parser.parse_args(argv)
+
+    if args.command == 'stats':
+        print(json.dumps(stats(args.root), indent=2))
+        return 0
+    if args.command == 'compact':
+        out, n = compact(args.root, args.format)
+        print(f"✅ {n} rekaman dipadatkan ke {out}" if out else "Tidak ada segmen tertutup untuk dipadatkan")
+        return 0
+    block = read_arrays(args.root)
+    write_file(block, args.output)
+    print(f"✅ {len(block['ts'])} rekaman ditulis ke {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+# STREAM HASIL LAB: skor ulang inkremental pasien yang hasil lab-nya baru masuk
+#
+# Jawaban kuesioner non-lab disimpan sekali dalam store ringkas (id + matriks float32 +
+# probabilitas/kategori terakhir + penanda valid). Rekaman lab (JSON Lines: {"id": ..., "HbA1c": ...,
+# "FastingBloodSugar": ...}) dibaca sebagai generator dari file (tail) atau queue lokal,
+# divalidasi dengan rentang yang sama dengan display_step_2, dikumpulkan per micro-batch,
+# lalu hanya pasien terdampak yang diskor ulang dengan model gabungan. Yang dikeluarkan:
+# event perpindahan kategori risiko (Rendah/Sedang/Tinggi).
+#
+#   python lab_stream.py build skrining.parquet --store artifacts/lab_stream/store.npz
+#   python lab_stream.py run lab_feed.jsonl --store artifacts/lab_stream/store.npz --events transisi.jsonl
+#   python lab_stream.py run lab_feed.jsonl --follow          # terus membaca baris baru (tail -f)
+import argparse
+import json
+import os
+import queue
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import LAB_DEFAULTS, LAB_RANGES, MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH, MODEL_THRESHOLDS
+from metrics import LAB_RECORDS_TOTAL, LAB_RESCORE_SECONDS, RISK_TRANSITIONS_TOTAL
+from scoring import (DEFAULT_CHUNKSIZE, RISK_LABELS, iter_chunks, load_models, risk_categories,
+                     score_validated)
+from validation import get_schema, input_fields, validate_columns
+
+STORE_PATH = os.path.join('artifacts', 'lab_stream', 'store.npz')
+LAB_COLUMNS = list(LAB_DEFAULTS)
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_MAX_WAIT = 0.5
+POLL_INTERVAL = 0.2
+NO_BAND = -1
+
+
+def band_codes(probs, thresholds=MODEL_THRESHOLDS['gabungan']):
+    # 0/1/2 = Rendah/Sedang/Tinggi, -1 = tidak diskor; ambang (tinggi, sedang) skalar atau per baris
+    labels = risk_categories(probs, *thresholds)
+    codes = np.full(len(labels), NO_BAND, dtype=np.int8)
+    for code, label in enumerate(RISK_LABELS):
+        codes[labels == label] = code
+    return codes
+
+
+def band_label(code):
+    return None if code == NO_BAND else RISK_LABELS[code]
+
+
+# STORE PASIEN
+class PatientStore:
+    def __init__(self, ids, features, X, prob, band, valid=None):
+        self.ids = np.asarray(ids, dtype=str)
+        self.features = list(features)
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.prob = np.asarray(prob, dtype=np.float32)
+        self.band = np.asarray(band, dtype=np.int8)
+        # Baris non-lab tidak valid (tidak diskor saat build) tidak pernah diskor ulang
+        self.valid = np.ones(len(self.ids), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+        self._lab_cols = [self.features.index(col) for col in LAB_COLUMNS]
+        self._index = pd.Index(self.ids)
+        if not self._index.is_unique:
+            raise ValueError("Kolom id pasien harus unik")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.X.nbytes + self.prob.nbytes + self.band.nbytes + self.valid.nbytes
+
+    def locate(self, ids):
+        return self._index.get_indexer(pd.Index(np.asarray(ids, dtype=str)))
+
+    def lab_values(self, rows):
+        return self.X[np.ix_(rows, self._lab_cols)]
+
+    @classmethod
+    def build(cls, path, models, id_col='id', chunksize=DEFAULT_CHUNKSIZE):
+        # Skor awal sekali (sama dengan scoring.py); setelah itu hanya pembaruan lab yang diskor
+        model_nl, model_gab, features_nl, features_gab = models
+        schema = get_schema(input_fields(features_nl, features_gab))
+        ids, blocks, probs, cutoffs, valids = [], [], [], [], []
+        for chunk in iter_chunks(path, chunksize):
+            if id_col not in chunk.columns:
+                raise ValueError(f"Kolom id '{id_col}' tidak ada di {path}")
+            checked = validate_columns(chunk, schema)
+            prob_nl, prob_gab = score_validated(checked, model_nl, model_gab, features_nl, features_gab)
+            # Store menyimpan lab mentah: 0 = tidak diisi / tidak valid (nilai normal dipakai saat skor)
+            X = checked.matrix(features_gab).copy()
+            for col in LAB_COLUMNS:
+                X[:, features_gab.index(col)][checked.imputed & schema.bits([col]) != 0] = 0
+            ids.append(chunk[id_col].astype(str).to_numpy())
+            blocks.append(X)
+            valids.append(checked.valid(features_gab))
+            probs.append(np.where(np.isnan(prob_gab), prob_nl, prob_gab))
+            # Ambang model yang menghasilkan probabilitas baris tersebut
+            cutoffs.append(np.where(np.isnan(prob_gab)[:, None], MODEL_THRESHOLDS['nonlab'],
+                                    MODEL_THRESHOLDS['gabungan']))
+        prob = np.concatenate(probs) if probs else np.empty(0)
+        band = band_codes(prob, np.concatenate(cutoffs).T if cutoffs else MODEL_THRESHOLDS['gabungan'])
+        return cls(np.concatenate(ids) if ids else np.empty(0, dtype=str), features_gab,
+                   np.vstack(blocks) if blocks else np.empty((0, len(features_gab))), prob, band,
+                   np.concatenate(valids) if valids else np.empty(0, dtype=bool))
+
+    def save(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp, ids=self.ids, features=np.array(self.features), X=self.X, prob=self.prob, band=self.band,
+                 valid=self.valid)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        with np.load(path) as data:
+            # Store lama tanpa penanda valid: baris yang tidak diskor saat build (band -1) dianggap tidak valid
+            valid = data['valid'] if 'valid' in data.files else data['band'] != NO_BAND
+            return cls(data['ids'], [str(f) for f in data['features']], data['X'], data['prob'], data['band'],
+                       valid)
+
+
+# SUMBER REKAMAN LAB (generator; None = tidak ada data baru, dipakai untuk flush berbasis waktu)
+def tail_records(path, follow=False, poll_interval=POLL_INTERVAL, stop=None):
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        while True:
+            line = f.readline()
+            if line:
+                buffer += line
+                if not buffer.endswith('\n') and follow:
+                    continue  # baris belum selesai ditulis
+                text, buffer = buffer.strip(), ''
+                if text:
+                    try:
+                        yield json.loads(text)
+                    except json.JSONDecodeError:
+                        LAB_RECORDS_TOTAL.labels('malformed').inc()
+                continue
+            if not follow or (stop is not None and stop.is_set()):
+                return
+            yield None
+            time.sleep(poll_interval)
+
+
+def queue_records(q, poll_interval=POLL_INTERVAL):
+    # Produsen mengirim None ke queue untuk menutup stream
+    while True:
+        try:
+            record = q.get(timeout=poll_interval)
+        except queue.Empty:
+            yield None
+            continue
+        if record is None:
+            return
+        yield record
+
+
+# VALIDASI
+def parse_lab_record(record):
+    # → (id, {kolom: nilai valid}); nilai di luar LAB_RANGES / 0 / bukan angka diabaikan
+    if not isinstance(record, dict) or record.get('id') is None:
+        return None, {}
+    values = {}
+    for col, (low, high) in LAB_RANGES.items():
+        try:
+            val = float(record.get(col) or 0)
+        except (TypeError, ValueError):
+            continue
+        if val != 0 and low <= val <= high:
+            values[col] = val
+    return str(record['id']), values
+
+
+# SKOR ULANG INKREMENTAL
+class LabStreamScorer:
+    def __init__(self, store, model_gab, batch_size=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT):
+        self.store = store
+        self.model = model_gab
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.stats = {'accepted': 0, 'invalid': 0, 'unknown': 0, 'unscored': 0, 'batches': 0, 'rescored': 0, 'transitions': 0}
+        self._pending = {}
+        self._first_pending = None
+        self._lab_cols = [store.features.index(col) for col in LAB_COLUMNS]
+
+    def add(self, record):
+        patient_id, values = parse_lab_record(record)
+        if not values:
+            self.stats['invalid'] += 1
+            LAB_RECORDS_TOTAL.labels('invalid').inc()
+            return
+        # Beberapa rekaman untuk pasien yang sama dalam satu batch digabung (nilai terbaru menang)
+        self.stats['accepted'] += 1
+        LAB_RECORDS_TOTAL.labels('accepted').inc()
+        self._pending.setdefault(patient_id, {}).update(values)
+        if self._first_pending is None:
+            self._first_pending = time.monotonic()
+
+    def due(self):
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.batch_size or time.monotonic() - self._first_pending >= self.max_wait
+
+    def flush(self):
+        if not self._pending:
+            return []
+        pending, self._pending, self._first_pending = self._pending, {}, None
+        ids = list(pending)
+        rows = self.store.locate(ids)
+        known = rows >= 0
+        n_unknown = int((~known).sum())
+        if n_unknown:
+            self.stats['unknown'] += n_unknown
+            LAB_RECORDS_TOTAL.labels('unknown').inc(n_unknown)
+        # Data non-lab pasien tidak valid (tidak diskor saat build): tidak diskor ulang
+        scored = known.copy()
+        scored[known] = self.store.valid[rows[known]]
+        n_unscored = int((known & ~scored).sum())
+        if n_unscored:
+            self.stats['unscored'] += n_unscored
+            LAB_RECORDS_TOTAL.labels('unscored').inc(n_unscored)
+        rows = rows[scored]
+        updates = [pending[i] for i, ok in zip(ids, scored) if ok]
+        if not len(rows):
+            return []
+
+        # Nilai lab baru menimpa yang lama per kolom; kolom yang tidak dikirim tetap
+        labs = self.store.lab_values(rows)
+        for j, col in enumerate(LAB_COLUMNS):
+            new = np.array([u.get(col, np.nan) for u in updates], dtype=np.float32)
+            labs[:, j] = np.where(np.isnan(new), labs[:, j], new)
+        X = self.store.X[rows]
+        X[:, self._lab_cols] = labs
+        X_model = X.copy()
+        for j, col in zip(self._lab_cols, LAB_COLUMNS):
+            X_model[:, j] = np.where(X_model[:, j] == 0, LAB_DEFAULTS[col], X_model[:, j])
+
+        with LAB_RESCORE_SECONDS.time():
+            prob = _predict(self.model, X_model, self.store.features)
+        band = band_codes(prob)
+        old_band, old_prob = self.store.band[rows], self.store.prob[rows]
+        self.store.X[rows] = X
+        self.store.prob[rows] = prob
+        self.store.band[rows] = band
+        self.stats['batches'] += 1
+        self.stats['rescored'] += len(rows)
+
+        events = []
+        now = time.time()
+        for k in np.flatnonzero(band != old_band):
+            event = {
+                'id': str(self.store.ids[rows[k]]),
+                'from': band_label(old_band[k]),
+                'to': band_label(band[k]),
+                'prob_before': None if np.isnan(old_prob[k]) else round(float(old_prob[k]), 4),
+                'prob_after': round(float(prob[k]), 4),
+                **{col: round(float(labs[k, j]), 2) for j, col in enumerate(LAB_COLUMNS)},
+                'ts': now,
+            }
+            RISK_TRANSITIONS_TOTAL.labels(event['from'], event['to']).inc()
+            events.append(event)
+        self.stats['transitions'] += len(events)
+        return events
+
+    def process(self, records):
+        # Generator event transisi; rekaman None dari sumber memicu flush berbasis waktu
+        for record in records:
+            if record is not None:
+                self.add(record)
+            if self.due():
+                yield from self.flush()
+        yield from self.flush()
+
+
+def _predict(model, X, features):
+    if hasattr(model, 'predict_row'):
+        return model.predict_proba(X)[:, 1]
+    return model.predict_proba(pd.DataFrame(X, columns=features))[:, 1]
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Skor ulang inkremental DiaLens dari stream hasil lab.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help="Bangun store pasien dari file kuesioner (CSV/Parquet)")
+    p_build.add_argument('input')
+    p_build.add_argument('--store', default=STORE_PATH)
+    p_build.add_argument('--id-col', default='id')
+    p_build.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    p_run = sub.add_parser('run', help="Baca rekaman lab (JSON Lines) dan keluarkan event transisi")
+    p_run.add_argument('feed')
+    p_run.add_argument('--store', default=STORE_PATH)
+    p_run.add_argument('--events', help="File JSON Lines event transisi (default: stdout)")
+    p_run.add_argument('--follow', action='store_true', help="Terus membaca baris baru seperti tail -f")
+    p_run.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    p_run.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT, help="Detik maksimum menahan batch")
+    for p in (p_build, p_run):
+        p.add_argument('--model-nl', default=MODEL_NON_LAB_PATH)
+        p.add_argument('--model-gab', default=MODEL_GABUNGAN_PATH)
+    args = parser.parse_args(argv)
+
+    models = load_models(args.model_nl, args.model_gab, fast=True)
+    t0 = time.perf_counter()
+    if args.command == 'build':
+        store = PatientStore.build(args.input, models, args.id_col, args.chunksize)
+        store.save(args.store)
+        print(f"✅ {len(store)} pasien disimpan di {args.store} ({store.nbytes / 1e6:.1f} MB) "
+              f"dalam {time.perf_counter() - t0:.2f} dtk", file=sys.stderr)
+        return 0
+
+    store = PatientStore.load(args.store)
+    scorer = LabStreamScorer(store, models[1], args.batch_size, args.max_wait)
+    out = open(args.events, 'a', encoding='utf-8') if args.events else sys.stdout
+    try:
+        for event in scorer.process(tail_records(args.feed, follow=args.follow)):
+            out.write(json.dumps(event, ensure_ascii=False) + '\n')
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        # Store diperbarui agar nilai lab terbaru menjadi dasar event berikutnya
+        store.save(args.store)
+    stats = scorer.stats
+    print(f"✅ {stats['accepted']} rekaman lab diterima ({stats['invalid']} tidak valid, {stats['unknown']} id tidak "
+          f"dikenal, {stats['unscored']} data non-lab tidak valid), {stats['rescored']} pasien diskor ulang dalam {stats['batches']} batch, "
+          f"{stats['transitions']} transisi, {time.perf_counter() - t0:.2f} dtk", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# TABEL LOOKUP NON-LAB: seluruh grid fitur non-lab diskor sekali lalu disimpan
+# sebagai array uint16 (atau float16) yang di-mmap, sehingga prediksi = 1 indeks array.
+#
+#   python lookup_table.py build            # buat artifacts/nonlab_table.npy + .json
+#   python lookup_table.py verify --n 5000  # cek acak terhadap MODEL_NL
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import MEDIUM_THRESHOLD, MODEL_NON_LAB_PATH, MODEL_THRESHOLDS, OPTIMAL_THRESHOLD_GABUNGAN
+from prediction_cache import file_hash
+
+ARTIFACT_DIR = 'artifacts'
+TABLE_PATH = os.path.join(ARTIFACT_DIR, 'nonlab_table.npy')
+
+# Rentang input display_step_2 (semua bilangan bulat)
+GRID_RANGES = {
+    'Age': (20, 90),
+    'DietQuality': (0, 10),
+    'HealthLiteracy': (0, 10),
+}
+BINARY_RANGE = (0, 1)
+UINT16_SCALE = 65535
+DEFAULT_TOLERANCE = {'uint16': 2e-5, 'float16': 5e-4}
+
+
+def _meta_path(table_path):
+    return os.path.splitext(table_path)[0] + '.json'
+
+
+def grid_spec(feature_names):
+    lows = np.array([GRID_RANGES.get(f, BINARY_RANGE)[0] for f in feature_names], dtype=np.int64)
+    highs = np.array([GRID_RANGES.get(f, BINARY_RANGE)[1] for f in feature_names], dtype=np.int64)
+    return lows, highs - lows + 1
+
+
+def band_cutoffs(thresholds=None):
+    # Ambang kategori yang dijaga saat kuantisasi; ikut disimpan di metadata tabel.
+    # thresholds = (tinggi, sedang) non-lab milik versi registri; None → ambang global (config)
+    pair = MODEL_THRESHOLDS['nonlab'] if thresholds is None else thresholds
+    return sorted({MEDIUM_THRESHOLD, OPTIMAL_THRESHOLD_GABUNGAN, *(float(t) for t in pair)})
+
+
+def quantize(prob, cutoffs=None):
+    q = np.round(prob * UINT16_SCALE).astype(np.int64)
+    # Pembulatan tidak boleh memindahkan probabilitas melewati ambang kategori risiko
+    for t in band_cutoffs() if cutoffs is None else cutoffs:
+        q_t = int(np.ceil(t * UINT16_SCALE))
+        q = np.where((prob >= t) & (q < q_t), q_t, q)
+        q = np.where((prob < t) & (q >= q_t), q_t - 1, q)
+    return q.astype(np.uint16)
+
+
+def grid_rows(feature_names, indices):
+    # Baris grid untuk indeks datar dalam urutan C (fitur terakhir berubah paling cepat)
+    lows, sizes = grid_spec(feature_names)
+    idx = np.unravel_index(np.asarray(indices, dtype=np.int64), tuple(sizes))
+    return np.column_stack([i + lo for i, lo in zip(idx, lows)]).astype(np.float32)
+
+
+class NonLabLookupTable:
+    def __init__(self, table, feature_names, dtype_name, fallback=None):
+        self.table = table
+        self.feature_names = list(feature_names)
+        self.lows, self.sizes = grid_spec(self.feature_names)
+        self.strides = np.array([int(np.prod(self.sizes[i + 1:])) for i in range(len(self.sizes))], dtype=np.int64)
+        self._grid = list(zip(self.lows.tolist(), self.sizes.tolist(), self.strides.tolist()))
+        self.quantized = dtype_name == 'uint16'
+        self.fallback = fallback
+        self.classes_ = np.array([0, 1])
+
+    @property
+    def feature_names_in_(self):
+        return np.array(self.feature_names, dtype=object)
+
+    def _decode(self, raw):
+        raw = np.asarray(raw, dtype=np.float64)
+        return raw / UINT16_SCALE if self.quantized else raw
+
+    def indices(self, X):
+        # Indeks grid per baris; -1 jika nilai di luar grid (bukan bilangan bulat / di luar rentang)
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names].to_numpy()
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        offset = X - self.lows
+        on_grid = (np.all(offset == np.round(offset), axis=1)
+                   & np.all((offset >= 0) & (offset < self.sizes), axis=1))
+        idx = np.where(on_grid, np.nan_to_num(offset).astype(np.int64) @ self.strides, -1)
+        return idx
+
+    def predict_proba(self, X):
+        idx = self.indices(X)
+        prob = np.empty(len(idx), dtype=np.float64)
+        hit = idx >= 0
+        prob[hit] = self._decode(self.table[idx[hit]])
+        if not hit.all():
+            if self.fallback is None:
+                raise ValueError("Nilai di luar grid tabel lookup dan tidak ada model cadangan")
+            X = X[self.feature_names].to_numpy() if hasattr(X, 'columns') else np.asarray(X)
+            X = X.reshape(len(idx), -1)
+            prob[~hit] = self.fallback.predict_proba(X[~hit])[:, 1]
+        return np.column_stack([1.0 - prob, prob])
+
+    def row_index(self, values):
+        # Versi Python murni dari indices() untuk satu baris (tanpa overhead NumPy)
+        idx = 0
+        for v, (lo, size, stride) in zip(values, self._grid):
+            off = v - lo
+            if not 0 <= off < size or off != int(off):
+                return -1
+            idx += int(off) * stride
+        return idx
+
+    def predict_row(self, values):
+        idx = self.row_index(values)
+        if idx >= 0:
+            raw = int(self.table[idx]) if self.quantized else float(self.table[idx])
+            return raw / UINT16_SCALE if self.quantized else raw
+        if self.fallback is None:
+            raise ValueError("Nilai di luar grid tabel lookup dan tidak ada model cadangan")
+        if hasattr(self.fallback, 'predict_row'):
+            return self.fallback.predict_row(values)
+        return float(self.fallback.predict_proba(np.asarray(values, dtype=np.float32).reshape(1, -1))[0, 1])
+
+
+# BUILD
+def build_table(model, model_path=MODEL_NON_LAB_PATH, table_path=TABLE_PATH, dtype='uint16', batch_size=65536,
+                thresholds=None):
+    import pandas as pd
+    cutoffs = band_cutoffs(thresholds)
+    features = [str(f) for f in model.feature_names_in_]
+    _, sizes = grid_spec(features)
+    n = int(np.prod(sizes))
+    os.makedirs(os.path.dirname(table_path) or '.', exist_ok=True)
+    table = np.lib.format.open_memmap(table_path, mode='w+', dtype=dtype, shape=(n,))
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        X = pd.DataFrame(grid_rows(features, np.arange(start, stop)), columns=features)
+        prob = model.predict_proba(X)[:, 1]
+        if dtype == 'uint16':
+            table[start:stop] = quantize(prob, cutoffs)
+        else:
+            table[start:stop] = prob.astype(dtype)
+    table.flush()
+    del table
+
+    meta = {
+        'features': features,
+        'sizes': [int(s) for s in sizes],
+        'dtype': dtype,
+        'rows': n,
+        'model_path': model_path,
+        'model_sha256': file_hash(model_path),
+        'band_cutoffs': cutoffs,
+    }
+    with open(_meta_path(table_path), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+# MUAT (mmap, dibagi antarproses lewat page cache)
+def load_table(table_path=TABLE_PATH, model_path=MODEL_NON_LAB_PATH, fallback=None, check_hash=True,
+               thresholds=None):
+    meta_path = _meta_path(table_path)
+    if not (os.path.exists(table_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if check_hash and meta.get('model_sha256') != file_hash(model_path):
+        # Tabel dibuat dari model lain: jangan dipakai
+        return None
+    if meta.get('band_cutoffs') != band_cutoffs(thresholds):
+        # Ambang berubah (thresholds.json / manifest versi) sejak build: pembulatan bisa salah kategori
+        return None
+    table = np.load(table_path, mmap_mode='r')
+    if len(table) != meta['rows']:
+        return None
+    return NonLabLookupTable(table, meta['features'], meta['dtype'], fallback=fallback)
+
+
+def verify_table(table, model, n=5000, seed=0):
+    import pandas as pd
+    from scoring import risk_categories
+    rng = np.random.default_rng(seed)
+    total = int(np.prod(table.sizes))
+    rows = grid_rows(table.feature_names, rng.choice(total, size=min(n, total), replace=False))
+    expected = model.predict_proba(pd.DataFrame(rows, columns=table.feature_names))[:, 1]
+    actual = table.predict_proba(rows)[:, 1]
+    band_mismatch = int(np.sum(risk_categories(expected, *MODEL_THRESHOLDS['nonlab'])
+                               != risk_categories(actual, *MODEL_THRESHOLDS['nonlab'])))
+    return {
+        'checked': int(len(rows)),
+        'max_abs_error': float(np.max(np.abs(expected - actual))),
+        'band_mismatches': band_mismatch,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tabel lookup lengkap untuk model non-lab DiaLens.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help="Skor seluruh grid dan simpan tabel")
+    p_build.add_argument('--dtype', choices=['uint16', 'float16'], default='uint16')
+    p_build.add_argument('--batch-size', type=int, default=65536)
+    p_verify = sub.add_parser('verify', help="Cek acak tabel terhadap model")
+    p_verify.add_argument('--n', type=int, default=5000)
+    p_verify.add_argument('--seed', type=int, default=0)
+    p_verify.add_argument('--tolerance', type=float, help="Default: 2e-5 (uint16), 5e-4 (float16)")
+    for p in (p_build, p_verify):
+        p.add_argument('--table', default=TABLE_PATH)
+        p.add_argument('--model', default=MODEL_NON_LAB_PATH)
+    args = parser.parse_args(argv)
+
+    import joblib
+    model = joblib.load(args.model)
+
+    if args.command == 'build':
+        t0 = time.perf_counter()
+        meta = build_table(model, args.model, args.table, args.dtype, args.batch_size)
+        size_kb = os.path.getsize(args.table) / 1024
+        print(f"✅ {meta['rows']} kombinasi diskor dalam {time.perf_counter() - t0:.1f} dtk → "
+              f"{args.table} ({size_kb:.0f} KB, {meta['dtype']})")
+        return 0
+
+    table = load_table(args.table, args.model)
+    if table is None:
+        print("❌ Tabel tidak ada atau dibuat dari model yang berbeda. Jalankan 'build' ulang.", file=sys.stderr)
+        return 1
+    result = verify_table(table, model, args.n, args.seed)
+    tolerance = args.tolerance or DEFAULT_TOLERANCE['uint16' if table.quantized else 'float16']
+    ok = result['max_abs_error'] <= tolerance and (result['band_mismatches'] == 0 or not table.quantized)
+    print(json.dumps(result, indent=2))
+    print("✅ Tabel sesuai model" if ok else "❌ Tabel menyimpang dari model")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,144 +1,290 @@
 # FUNGSI: BUAT PETA GLOBAL DIABETES
-import pandas as pd 
-import plotly.graph_objects as go
-import country_converter as coco
+#
+# Kode ISO3 dihitung sekali dan disimpan di file sidecar; figure dibangun sekali per
+# mtime file data lalu dipakai bersama semua sesi (st.cache_resource).
+#
+#   python map.py build                  # sidecar ISO3 + figure JSON ringkas + gambar statis
+#   python map.py build --no-image       # tanpa gambar statis (tidak butuh kaleido)
+#
+# Mode tampilan lewat DIALENS_MAP_MODE: interactive (default) | compact | static
+import json
+import os
+import sys
+
 import streamlit as st
 
-def make_diabetes_map():
+from metrics import MAP_BUILD_SECONDS, MAP_RENDER_SECONDS
+
+DATA_PATH = 'diabetes_world_data.csv'
+ISO_SIDECAR_PATH = os.path.join('artifacts', 'diabetes_world_iso3.json')
+MAP_ARTIFACT_DIR = os.path.join('artifacts', 'map')
+COMPACT_JSON_NAME = 'world_map.min.json'
+STATIC_IMAGE_NAME = 'world_map.{fmt}'
+MAP_MODE = os.environ.get('DIALENS_MAP_MODE', 'interactive')
+
+# Buat kategori warna
+BINS = [0, 100, 500, 1000, 10000, 20000, float('inf')]
+LABELS = ['<100 thousand', '100-500 thousand', '500 thousand-1 million', '1-10 million', '10-20 million', '>20 million']
+
+# Mapping warna
+COLOR_MAP = {
+    '<100 thousand': '#457B9D',           # Biru muda
+    '100-500 thousand': '#1D3557',         # Biru tua
+    '500 thousand-1 million': '#000000',   # Hitam
+    '1-10 million': '#E9C46D',             # Pink muda
+    '10-20 million': '#F4A261',            # Pink tua
+    '>20 million': '#E76F51'               # Merah
+}
+
+
+# KODE ISO3 (country_converter hanya untuk nama yang belum ada di sidecar)
+def _load_sidecar(sidecar_path):
     try:
-        # Baca file CSV
-        df = pd.read_csv('diabetes_world_data.csv')
-        
-        # Hapus baris kosong
-        df = df.dropna(subset=['Location', 'Value'])
-        
-        # Konversi nama negara ke iso_alpha
-        df['iso_alpha'] = coco.convert(names=df['Location'], to='ISO3', not_found='None')
-        df = df[df['iso_alpha'] != 'None']
-        
-        # Konversi Value ke numerik
-        df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
-        df = df.dropna(subset=['Value'])
-
-        # Buat kategori warna
-        bins = [0, 100, 500, 1000, 10000, 20000, float('inf')]
-        labels = ['<100 thousand', '100-500 thousand', '500 thousand-1 million', '1-10 million', '10-20 million', '>20 million']
-        df['Category'] = pd.cut(df['Value'], bins=bins, labels=labels, right=False)
-
-        # Mapping warna
-        color_map = {
-            '<100 thousand': '#457B9D',           # Biru muda
-            '100-500 thousand': '#1D3557',         # Biru tua
-            '500 thousand-1 million': '#000000',   # Hitam
-            '1-10 million': '#E9C46D',             # Pink muda
-            '10-20 million': '#F4A261',            # Pink tua
-            '>20 million': '#E76F51'               # Merah
-        }
-
-        df['Color'] = df['Category'].map(color_map)
-
-        # Buat peta choropleth
-        fig = go.Figure(data=go.Choropleth(
-            locations=df['iso_alpha'],
-            z=df['Value'],  # Untuk hover info
-            colorscale=[
-                [0, '#457B9D'],       # <100k
-                [0.166, '#457B9D'],
-                [0.166, '#1D3557'],   # 100k-500k
-                [0.333, '#1D3557'],
-                [0.333, '#000000'],   # 500k-1M
-                [0.5, '#000000'],
-                [0.5, '#E9C46D'],     # 1-10M
-                [0.666, '#E9C46D'],
-                [0.666, '#F4A261'],   # 10-20M
-                [0.833, '#F4A261'],
-                [0.833, '#E76F51'],   # >20M
-                [1, '#E76F51']
-            ],
-            zmin=0,
-            zmax=20000,  # batas atas untuk warna >20M
-            text=df['Location'],
-            hovertemplate="<b>%{text}</b><br>Cases: %{z:,} thousand<br><extra></extra>",
-            marker_line_color='darkgray',
-            showscale=False,
-        ))
+        with open(sidecar_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
 
-        # Tambahkan legenda manual (karena Plotly tidak punya legenda kategori)
-        fig.add_trace(go.Scattergeo(
-            lon=[0], lat=[0],
-            mode='markers',
-            marker=dict(size=0),
-            showlegend=True,
-            name='<100 thousand'
-        ))
-        fig.add_trace(go.Scattergeo(
-            lon=[0], lat=[0],
-            mode='markers',
-            marker=dict(size=0),
-            showlegend=True,
-            name='100-500 thousand'
-        ))
-        fig.add_trace(go.Scattergeo(
-            lon=[0], lat=[0],
-            mode='markers',
-            marker=dict(size=0),
-            showlegend=True,
-            name='500 thousand-1 million'
-        ))
-        fig.add_trace(go.Scattergeo(
-            lon=[0], lat=[0],
-            mode='markers',
-            marker=dict(size=0),
-            showlegend=True,
-            name='1-10 million'
-        ))
-        fig.add_trace(go.Scattergeo(
-            lon=[0], lat=[0],
-            mode='markers',
-            marker=dict(size=0),
-            showlegend=True,
-            name='10-20 million'
-        ))
+
+def resolve_iso3(names, sidecar_path=ISO_SIDECAR_PATH):
+    mapping = _load_sidecar(sidecar_path)
+    missing = sorted(set(names) - set(mapping))
+    if missing:
+        import country_converter as coco
+        codes = coco.convert(names=missing, to='ISO3', not_found='None')
+        if isinstance(codes, str):
+            codes = [codes]
+        mapping.update({name: (code if code != 'None' else None) for name, code in zip(missing, codes)})
+        try:
+            os.makedirs(os.path.dirname(sidecar_path) or '.', exist_ok=True)
+            with open(sidecar_path, 'w') as f:
+                json.dump(mapping, f, indent=0, sort_keys=True, ensure_ascii=False)
+        except OSError:
+            pass
+    return [mapping[name] for name in names]
+
+
+def load_map_data(data_path=DATA_PATH, sidecar_path=ISO_SIDECAR_PATH):
+    import pandas as pd
+
+    # Baca file CSV
+    df = pd.read_csv(data_path)
+
+    # Hapus baris kosong
+    df = df.dropna(subset=['Location', 'Value'])
+
+    # Konversi nama negara ke iso_alpha
+    df['iso_alpha'] = resolve_iso3(df['Location'].tolist(), sidecar_path)
+    df = df.dropna(subset=['iso_alpha'])
+
+    # Konversi Value ke numerik
+    df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
+    df = df.dropna(subset=['Value'])
+
+    df['Category'] = pd.cut(df['Value'], bins=BINS, labels=LABELS, right=False)
+    df['Color'] = df['Category'].map(COLOR_MAP)
+    return df
+
+
+def build_diabetes_figure(df):
+    import plotly.graph_objects as go
+
+    # Buat peta choropleth
+    fig = go.Figure(data=go.Choropleth(
+        locations=df['iso_alpha'],
+        z=df['Value'],  # Untuk hover info
+        colorscale=[
+            [0, '#457B9D'],       # <100k
+            [0.166, '#457B9D'],
+            [0.166, '#1D3557'],   # 100k-500k
+            [0.333, '#1D3557'],
+            [0.333, '#000000'],   # 500k-1M
+            [0.5, '#000000'],
+            [0.5, '#E9C46D'],     # 1-10M
+            [0.666, '#E9C46D'],
+            [0.666, '#F4A261'],   # 10-20M
+            [0.833, '#F4A261'],
+            [0.833, '#E76F51'],   # >20M
+            [1, '#E76F51']
+        ],
+        zmin=0,
+        zmax=20000,  # batas atas untuk warna >20M
+        text=df['Location'],
+        hovertemplate="<b>%{text}</b><br>Cases: %{z:,} thousand<br><extra></extra>",
+        marker_line_color='darkgray',
+        showscale=False,
+    ))
+
+    # Tambahkan legenda manual (karena Plotly tidak punya legenda kategori)
+    for label in LABELS:
         fig.add_trace(go.Scattergeo(
             lon=[0], lat=[0],
             mode='markers',
             marker=dict(size=0),
             showlegend=True,
-            name='>20 million'
+            name=label
         ))
 
-        # Update layout
-        fig.update_layout(
-            title_text='Estimated Number of Adults (20–79) with Diabetes in 2024',
-            geo=dict(
-                showframe=False,
-                showcoastlines=False,
-                projection_type='equirectangular',
-                bgcolor='rgba(0,0,0,0)'
-            ),
-            margin=dict(l=0, r=0, t=60, b=0),
-            annotations=[dict(
-                x=0.95,
-                y=0.02,
-                xref='paper',
-                yref='paper',
-                text='Source: <a href="https://diabetesatlas.org/data/en/world/">IDF Diabetes Atlas</a>',
-                showarrow=False,
-                font=dict(size=10)
-            )],
-            legend=dict(
-                yanchor="bottom",
-                y=0.01,
-                xanchor="left",
-                x=0.01,
-                bgcolor='rgba(0,0,0,0.8)',
-                bordercolor='black',
-                borderwidth=1
-            )
+    # Update layout
+    fig.update_layout(
+        title_text='Estimated Number of Adults (20–79) with Diabetes in 2024',
+        geo=dict(
+            showframe=False,
+            showcoastlines=False,
+            projection_type='equirectangular',
+            bgcolor='rgba(0,0,0,0)'
+        ),
+        margin=dict(l=0, r=0, t=60, b=0),
+        annotations=[dict(
+            x=0.95,
+            y=0.02,
+            xref='paper',
+            yref='paper',
+            text='Source: <a href="https://diabetesatlas.org/data/en/world/">IDF Diabetes Atlas</a>',
+            showarrow=False,
+            font=dict(size=10)
+        )],
+        legend=dict(
+            yanchor="bottom",
+            y=0.01,
+            xanchor="left",
+            x=0.01,
+            bgcolor='rgba(0,0,0,0.8)',
+            bordercolor='black',
+            borderwidth=1
         )
+    )
+    return fig
 
-        return fig
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_cached_map(data_path, data_mtime_ns):
+    # data_mtime_ns hanya sebagai kunci cache: file data berubah → figure dibangun ulang.
+    # Serialisasi tetap dilakukan st.plotly_chart per render (≈ 2 ms; API publik hanya menerima figure)
+    with MAP_BUILD_SECONDS.time():
+        return build_diabetes_figure(load_map_data(data_path))
+
+
+def make_diabetes_map(data_path=DATA_PATH):
+    try:
+        return get_cached_map(data_path, os.stat(data_path).st_mtime_ns)
 
     except Exception as e:
         st.warning(f"⚠️ Gagal memuat peta global: {str(e)}")
         return None
+
+
+# ARTEFAK PETA RINGKAS (JSON minified + gambar statis opsional)
+def compact_figure_dict(fig, decimals=1):
+    import plotly.io as pio
+    spec = json.loads(pio.to_json(fig, validate=False))
+    # Template bawaan Plotly (~3,5 KB) tidak dipakai: Streamlit menerapkan temanya sendiri
+    spec['layout']['template'] = {}
+    for trace in spec['data']:
+        if 'z' in trace:
+            trace['z'] = [round(v, decimals) for v in trace['z']]
+    return spec
+
+
+def compact_json(fig, decimals=1):
+    return json.dumps(compact_figure_dict(fig, decimals), separators=(',', ':'), ensure_ascii=False)
+
+
+def _payload_sizes(data):
+    import gzip
+    data = data.encode() if isinstance(data, str) else data
+    return {'bytes': len(data), 'gzip_bytes': len(gzip.compress(data))}
+
+
+def build_map_artifacts(out_dir=MAP_ARTIFACT_DIR, data_path=DATA_PATH, image=True, image_format='webp',
+                        width=900, height=500, topojson=None):
+    import plotly.io as pio
+    fig = build_diabetes_figure(load_map_data(data_path))
+    os.makedirs(out_dir, exist_ok=True)
+
+    full = pio.to_json(fig, validate=False)
+    compact = compact_json(fig)
+    with open(os.path.join(out_dir, COMPACT_JSON_NAME), 'w') as f:
+        f.write(compact)
+    report = {'interactive_spec': _payload_sizes(full), 'compact_spec': _payload_sizes(compact)}
+
+    if image:
+        try:
+            # Render lokal dengan kaleido; topojson lokal jika server tidak bisa mengakses CDN Plotly
+            if topojson:
+                pio.kaleido.scope.topojson = topojson
+            img = fig.to_image(format=image_format, width=width, height=height)
+            with open(os.path.join(out_dir, STATIC_IMAGE_NAME.format(fmt=image_format)), 'wb') as f:
+                f.write(img)
+            report['static_image'] = {'format': image_format, **_payload_sizes(img)}
+        except Exception as e:
+            report['static_image'] = {'error': str(e)}
+    return report
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_compact_figure(path, mtime_ns):
+    import plotly.graph_objects as go
+    with open(path) as f:
+        return go.Figure(json.load(f))
+
+
+def _static_image_path(out_dir):
+    for fmt in ('webp', 'png', 'svg'):
+        path = os.path.join(out_dir, STATIC_IMAGE_NAME.format(fmt=fmt))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def render_diabetes_map(mode=MAP_MODE, out_dir=MAP_ARTIFACT_DIR):
+    with MAP_RENDER_SECONDS.labels(mode).time():
+        _render_diabetes_map(mode, out_dir)
+
+
+def _render_diabetes_map(mode, out_dir):
+    # static → gambar prebuilt; compact → figure JSON ringkas; lainnya/artefak tidak ada → interaktif
+    if mode == 'static':
+        image_path = _static_image_path(out_dir)
+        if image_path:
+            st.image(image_path, use_container_width=True)
+            return
+    compact_path = os.path.join(out_dir, COMPACT_JSON_NAME)
+    world_map = None
+    if mode in ('compact', 'static') and os.path.exists(compact_path):
+        try:
+            world_map = load_compact_figure(compact_path, os.stat(compact_path).st_mtime_ns)
+        except Exception:
+            world_map = None
+    if world_map is None:
+        world_map = make_diabetes_map()
+    if world_map is not None:
+        st.plotly_chart(world_map, use_container_width=True)
+
+
+def main(argv=None):
+    import argparse
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Langkah build peta global DiaLens.")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--sidecar', default=ISO_SIDECAR_PATH)
+    parser.add_argument('--out', default=MAP_ARTIFACT_DIR)
+    parser.add_argument('--no-image', action='store_true', help="Lewati gambar statis (kaleido)")
+    parser.add_argument('--image-format', choices=['webp', 'png', 'svg'], default='webp')
+    parser.add_argument('--topojson', help="Folder/URL topojson lokal untuk kaleido")
+    args = parser.parse_args(argv)
+
+    names = pd.read_csv(args.data).dropna(subset=['Location'])['Location'].tolist()
+    codes = resolve_iso3(names, args.sidecar)
+    print(f"✅ {sum(c is not None for c in codes)}/{len(codes)} negara → {args.sidecar}")
+
+    report = build_map_artifacts(args.out, args.data, image=not args.no_image,
+                                 image_format=args.image_format, topojson=args.topojson)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
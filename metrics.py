@@ -0,0 +1,394 @@
+# METRIK IN-PROCESS: histogram waktu + counter, diekspor sebagai teks Prometheus
+#
+# Murah untuk selalu aktif: satu perf_counter, satu bisect dan satu lock per observasi.
+# Ekspor (opsional, lewat env):
+#   DIALENS_METRICS_PORT=9464          → GET http://127.0.0.1:9464/metrics
+#   DIALENS_METRICS_FILE=metrics.prom  → file teks ditulis ulang tiap DIALENS_METRICS_INTERVAL dtk
+#
+#   python metrics.py --overhead       # ukur biaya per observasi
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_PORT = os.environ.get('DIALENS_METRICS_PORT')
+METRICS_FILE = os.environ.get('DIALENS_METRICS_FILE')
+METRICS_INTERVAL = float(os.environ.get('DIALENS_METRICS_INTERVAL', 15))
+
+# Dalam detik: 100 µs (prediksi tabel/cache) sampai 30 dtk (muat model dingin)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    inner = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"')) for k, v in pairs)
+    return '{' + inner + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('_upper', '_counts', '_sum', '_lock')
+
+    def __init__(self, buckets):
+        self._upper = buckets
+        self._counts = [0] * (len(buckets) + 1)  # + bucket +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self._upper, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _CounterChild:
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class _GaugeChild:
+    __slots__ = ('_value',)
+
+    def __init__(self):
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = float(value)
+
+    @property
+    def value(self):
+        return self._value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        # Kunci selalu tuple string (labels(3) dan labels('3') = anak yang sama, lookup tanpa lock)
+        if not values and labels:
+            if set(labels) != set(self.labelnames):
+                raise ValueError(f"{self.name} butuh label {self.labelnames}")
+            values = tuple(labels[n] for n in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} butuh label {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for values, child in self._items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {child.value}')
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        for values, child in self._items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if upper == float('inf') else repr(upper)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, values, ("le", le))} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metrik {metric.name} sudah terdaftar")
+        self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def timed(histogram, *label_values):
+    # Dekorator: child label di-resolve sekali saat dekorasi, bukan per panggilan
+    child = histogram.labels(*label_values)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# METRIK DIALENS
+MODEL_LOAD_SECONDS = Histogram(
+    'dialens_model_load_seconds', "Waktu memuat kedua model (load_bundle / load_models).", ['source'])
+MODEL_SWAP_TOTAL = Counter(
+    'dialens_model_swap_total', "Hasil pemuatan versi model dari registri (loaded/activated/rejected/error/student_missing).",
+    ['result'])
+PREDICT_SECONDS = Histogram(
+    'dialens_predict_seconds', "Waktu satu panggilan prediksi model per baris (predict_ai).", ['model', 'impl'])
+PREDICT_FALLBACK_TOTAL = Counter(
+    'dialens_predict_fallback_total', "Jumlah predict_ai yang mengembalikan 0.5 (fallback diam).",
+    ['model', 'reason'])
+PREDICT_CACHE_TOTAL = Counter(
+    'dialens_predict_cache_total', "Hasil lookup cache prediksi di predict_ai.", ['model', 'result'])
+BATCH_PREDICT_SECONDS = Histogram(
+    'dialens_batch_predict_seconds', "Waktu satu panggilan predict_proba batch (scoring).", ['impl'])
+BATCH_ROWS_TOTAL = Counter(
+    'dialens_batch_rows_total', "Jumlah baris yang diskor lewat jalur batch.", ['impl'])
+EXPLAIN_SECONDS = Histogram(
+    'dialens_explain_seconds', "Waktu menghitung atribusi fitur per baris (explain_ai, cache miss).", ['model'])
+SHADOW_PAIRS_TOTAL = Counter(
+    'dialens_shadow_pairs_total', "Pasangan prediksi utama/kandidat yang dicatat (shadow).", ['candidate'])
+SHADOW_DROPPED_TOTAL = Counter(
+    'dialens_shadow_dropped_total', "Permintaan shadow yang dibuang karena antrean penuh.")
+SHADOW_ERRORS_TOTAL = Counter(
+    'dialens_shadow_errors_total',
+    "Kandidat shadow yang gagal dimuat/diskor lalu dihentikan ('batch' = gagal di luar kandidat).", ['candidate'])
+SHADOW_BATCH_SECONDS = Histogram(
+    'dialens_shadow_batch_seconds', "Waktu worker shadow menskor satu batch untuk semua kandidat.")
+WHAT_IF_SWEEP_SECONDS = Histogram(
+    'dialens_what_if_sweep_seconds', "Waktu skor sapuan what-if per profil (cache miss).")
+LAB_RECORDS_TOTAL = Counter(
+    'dialens_lab_records_total', "Rekaman stream lab menurut hasil validasi (lab_stream).", ['result'])
+LAB_RESCORE_SECONDS = Histogram(
+    'dialens_lab_rescore_seconds', "Waktu skor ulang satu micro-batch pasien dari stream lab.")
+RISK_TRANSITIONS_TOTAL = Counter(
+    'dialens_risk_transitions_total', "Perpindahan kategori risiko akibat hasil lab baru.", ['from', 'to'])
+MAP_BUILD_SECONDS = Histogram(
+    'dialens_map_build_seconds', "Waktu membangun figure peta global (cache miss).")
+MAP_RENDER_SECONDS = Histogram(
+    'dialens_map_render_seconds', "Waktu render_diabetes_map per rerun.", ['mode'])
+STEP_RENDER_SECONDS = Histogram(
+    'dialens_step_render_seconds', "Waktu display_step_N per rerun Streamlit.", ['step'])
+RERUN_SECONDS = Histogram(
+    'dialens_rerun_seconds', "Waktu eksekusi skrip app.py per rerun.", ['step'])
+DRIFT_PSI = Gauge(
+    'dialens_drift_psi', "PSI distribusi saat ini vs referensi per kolom (drift.py; > 0.2 = drift).", ['column'])
+DRIFT_KS = Gauge(
+    'dialens_drift_ks', "Statistik KS (selisih CDF maks) saat ini vs referensi per kolom (drift.py).", ['column'])
+DRIFT_RATE = Gauge(
+    'dialens_drift_rate', "Proporsi saat ini: pengisian lab dan imputasi lab 5.5/95.0 (drift.py).", ['rate'])
+DRIFT_ROWS = Gauge(
+    'dialens_drift_rows', "Jumlah submission dalam jendela drift saat ini (drift.py).")
+REPORTS_TOTAL = Counter(
+    'dialens_reports_total', "Lembar hasil laporan massal (reports.py): rendered / invalid.", ['result'])
+INTERACTION_CPU_SECONDS = Histogram(
+    'dialens_interaction_cpu_seconds', "CPU thread skrip per interaksi: rerun penuh (unit=app) atau rerun fragmen.",
+    ['step', 'unit'])
+
+
+# EKSPOR
+def write_textfile(path, registry=REGISTRY):
+    # Tulis ke file sementara lalu rename agar pembaca (node_exporter textfile) tidak melihat file setengah jadi
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(registry.expose())
+    os.replace(tmp, path)
+
+
+def start_file_writer(path, interval=METRICS_INTERVAL, registry=REGISTRY):
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                write_textfile(path, registry)
+            except OSError:
+                pass
+
+    write_textfile(path, registry)
+    threading.Thread(target=loop, name='dialens-metrics-file', daemon=True).start()
+    return stop
+
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.expose().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=server.serve_forever, name='dialens-metrics-http', daemon=True).start()
+    return server
+
+
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE):
+    # Dipanggil sekali per proses (app.py lewat st.cache_resource); tanpa env → tidak ada yang dijalankan
+    exporters = {}
+    if port:
+        exporters['http'] = start_http_server(port)
+    if path:
+        exporters['file'] = start_file_writer(path)
+    return exporters
+
+
+def measure_overhead(n=200_000):
+    registry = Registry()
+    hist = Histogram('overhead_seconds', "uji", ['step'], registry=registry)
+    child = hist.labels('3')
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with child.time():
+            pass
+    t_timer = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for _ in range(n):
+        hist.labels(step='3').observe(0.001)
+    t_labels = (time.perf_counter() - t0) / n
+    return {'timer_us': t_timer * 1e6, 'labels_observe_us': t_labels * 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Metrik DiaLens.")
+    parser.add_argument('--overhead', action='store_true', help="Ukur biaya per observasi")
+    parser.add_argument('--serve', type=int, metavar='PORT', help="Jalankan endpoint /metrics (untuk uji)")
+    args = parser.parse_args(argv)
+
+    if args.overhead:
+        for key, value in measure_overhead().items():
+            print(f"{key}: {value:.2f}")
+        return 0
+    if args.serve:
+        start_http_server(args.serve)
+        print(f"✅ Metrik di http://127.0.0.1:{args.serve}/metrics")
+        threading.Event().wait()
+    sys.stdout.write(REGISTRY.expose())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# PEMUATAN MODEL DI LATAR BELAKANG
+#
+# Halaman pertama dirender tanpa menunggu model; model baru ditunggu saat prediksi.
+# Jika artefak terkompilasi ada (python model_loader.py export), model dimuat sebagai
+# array .npy ber-mmap tanpa mengimpor scikit-learn / XGBoost sama sekali.
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# NumPy diimpor di thread utama: impor paralel numpy dari dua thread bisa gagal (circular import)
+import numpy  # noqa: F401
+
+from config import MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH
+from metrics import MODEL_LOAD_SECONDS
+
+COMPILED_DIR = os.path.join('artifacts', 'compiled')
+# Set DIALENS_MODEL_MMAP=r agar joblib.load memakai mmap_mode untuk array di dalam pickle
+JOBLIB_MMAP_MODE = os.environ.get('DIALENS_MODEL_MMAP') or None
+
+# model_ids: (hash file non-lab, hash file gabungan) saat dimuat — identitas model di memori
+# untuk kunci cache prediksi/what-if, tetap sama walau file di disk diganti setelahnya
+ModelBundle = namedtuple('ModelBundle', [
+    'model_nl', 'model_gab', 'features_nl', 'features_gab', 'fast_nl', 'fast_gab', 'table_nl',
+    'explain_nl', 'explain_gab', 'model_ids',
+])
+
+
+def _compiled_dir(name, compiled_dir):
+    return os.path.join(compiled_dir, name)
+
+
+def load_bundle(non_lab_path=MODEL_NON_LAB_PATH, gabungan_path=MODEL_GABUNGAN_PATH,
+                compiled_dir=COMPILED_DIR, mmap_mode=JOBLIB_MMAP_MODE, table_path=None, nonlab_thresholds=None):
+    # nonlab_thresholds: (tinggi, sedang) non-lab versi registri; tabel lookup hanya dipakai jika
+    # dibuat dengan ambang yang sama (None → ambang global config)
+    from fast_inference import compile_model, load_compiled
+    from lookup_table import TABLE_PATH, load_table
+    from prediction_cache import model_fingerprint
+
+    t0 = time.perf_counter()
+    model_ids = (model_fingerprint(non_lab_path), model_fingerprint(gabungan_path))
+    fast_nl = load_compiled(_compiled_dir('nonlab', compiled_dir), non_lab_path)
+    fast_gab = load_compiled(_compiled_dir('gabungan', compiled_dir), gabungan_path)
+    model_nl = model_gab = None
+    if fast_nl is None or fast_gab is None:
+        import joblib
+        model_nl = joblib.load(non_lab_path, mmap_mode=mmap_mode)
+        model_gab = joblib.load(gabungan_path, mmap_mode=mmap_mode)
+        try:
+            fast_nl, fast_gab = compile_model(model_nl), compile_model(model_gab)
+        except Exception:
+            # predict_ai tetap bisa memakai model asli
+            fast_nl = fast_gab = None
+
+    features_nl = [str(f) for f in (model_nl if model_nl is not None else fast_nl).feature_names_in_]
+    features_gab = [str(f) for f in (model_gab if model_gab is not None else fast_gab).feature_names_in_]
+    try:
+        table_nl = load_table(table_path or TABLE_PATH, model_path=non_lab_path, fallback=fast_nl or model_nl,
+                              thresholds=nonlab_thresholds)
+    except Exception:
+        table_nl = None
+    explain_nl, explain_gab = _build_explainer(fast_nl), _build_explainer(fast_gab)
+    MODEL_LOAD_SECONDS.labels('joblib' if model_nl is not None else 'compiled').observe(time.perf_counter() - t0)
+    return ModelBundle(model_nl, model_gab, features_nl, features_gab, fast_nl, fast_gab, table_nl,
+                       explain_nl, explain_gab, model_ids)
+
+
+def _build_explainer(compiled):
+    # Tabel atribusi dibangun sekali per proses; tanpa cover (ekspor lama) → None, panel disembunyikan
+    from explain import build_explainer
+    try:
+        return build_explainer(compiled)
+    except Exception:
+        return None
+
+
+class BackgroundModelLoader:
+    def __init__(self, load_fn=load_bundle, *args, **kwargs):
+        self._load_fn = load_fn
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+        self._thread = None
+        self.bundle = None
+        self.error = None
+        self.load_seconds = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dialens-model-loader', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        t0 = time.perf_counter()
+        try:
+            self.bundle = self._load_fn(*self._args, **self._kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_seconds = time.perf_counter() - t0
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def failed(self):
+        return self.done and self.error is not None
+
+    def get(self, timeout=None):
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError("Model belum selesai dimuat")
+        if self.error is not None:
+            raise self.error
+        return self.bundle
+
+
+def export_compiled(non_lab_path=MODEL_NON_LAB_PATH, gabungan_path=MODEL_GABUNGAN_PATH, compiled_dir=COMPILED_DIR):
+    import joblib
+    from fast_inference import compile_model, save_compiled
+
+    for name, path in (('nonlab', non_lab_path), ('gabungan', gabungan_path)):
+        save_compiled(compile_model(joblib.load(path)), _compiled_dir(name, compiled_dir), source_path=path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ekspor model DiaLens ke artefak .npy yang bisa di-mmap.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_export = sub.add_parser('export', help="Kompilasi kedua model dan simpan ke artifacts/compiled")
+    p_export.add_argument('--out', default=COMPILED_DIR)
+    p_time = sub.add_parser('time', help="Ukur waktu load_bundle")
+    p_time.add_argument('--compiled-dir', default=COMPILED_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        export_compiled(compiled_dir=args.out)
+        print(f"✅ Artefak terkompilasi disimpan di {args.out}")
+        return 0
+
+    t0 = time.perf_counter()
+    bundle = load_bundle(compiled_dir=args.compiled_dir)
+    source = 'joblib' if bundle.model_nl is not None else 'compiled (mmap)'
+    print(f"load_bundle: {time.perf_counter() - t0:.3f} dtk via {source}, tabel non-lab: {bundle.table_nl is not None}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
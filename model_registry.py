@@ -0,0 +1,397 @@
+# REGISTRI MODEL LOKAL: versi model + manifest, reload tanpa restart
+#
+# Struktur (default artifacts/registry, ubah lewat DIALENS_MODEL_REGISTRY):
+#   versions/<versi>/manifest.json      hash, daftar fitur, ambang risiko
+#   versions/<versi>/nonlab.joblib, gabungan.joblib
+#   versions/<versi>/compiled/...       artefak .npy (mmap) + tabel lookup non-lab
+#   CURRENT                             nama versi aktif (ditulis atomik)
+#
+# Proses app memantau CURRENT. Versi baru dimuat di thread latar, diuji pada batch canary
+# terhadap versi yang sedang aktif, lalu dipasang dengan satu assignment referensi:
+# setiap rerun mengambil satu ActiveModels di awal, jadi satu permintaan tidak pernah
+# mencampur dua versi dan tidak ada permintaan yang menunggu.
+#
+#   python model_registry.py publish --version v1 --activate          # dari path di config.py
+#   python model_registry.py publish --version v2 --non-lab nl.joblib --gabungan gab.joblib --threshold 0.55
+#   python model_registry.py publish --version v3 --thresholds thresholds.json  # ambang per model (calibration.py)
+#   python model_registry.py activate v2
+#   python model_registry.py canary v2                                 # uji tanpa mengaktifkan
+#   python model_registry.py list
+#
+# Dengan student_dir (DIALENS_STUDENT, lihat distill.py) setiap versi disajikan lewat model murid
+# hasil distilasi; jika murid belum dilatih untuk file guru versi tersebut, guru yang dipakai.
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from config import (MEDIUM_THRESHOLD, MODEL_GABUNGAN_PATH, MODEL_NAMES, MODEL_NON_LAB_PATH, MODEL_THRESHOLDS,
+                    OPTIMAL_THRESHOLD_GABUNGAN, THRESHOLDS_PATH, load_thresholds)
+from metrics import MODEL_SWAP_TOTAL
+from model_loader import BackgroundModelLoader, load_bundle
+
+REGISTRY_DIR = os.environ.get('DIALENS_MODEL_REGISTRY', os.path.join('artifacts', 'registry'))
+POLL_INTERVAL = float(os.environ.get('DIALENS_MODEL_REGISTRY_POLL', 10))
+CANARY_ROWS = 2000
+# Minimal kesepakatan kategori risiko versi baru vs versi aktif pada batch canary
+CANARY_MIN_AGREEMENT = float(os.environ.get('DIALENS_CANARY_MIN_AGREEMENT', 0.8))
+
+MODEL_FILES = {'nonlab': 'nonlab.joblib', 'gabungan': 'gabungan.joblib'}
+
+# thresholds: {'nonlab': (tinggi, sedang), 'gabungan': (tinggi, sedang)}
+ActiveModels = namedtuple('ActiveModels', [
+    'version', 'bundle', 'non_lab_path', 'gabungan_path', 'thresholds',
+])
+
+
+class RegistryError(Exception):
+    pass
+
+
+# REGISTRI (file)
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def version_dir(self, version):
+        return os.path.join(self.root, 'versions', version)
+
+    def versions(self):
+        path = os.path.join(self.root, 'versions')
+        if not os.path.isdir(path):
+            return []
+        return sorted(v for v in os.listdir(path) if os.path.exists(os.path.join(path, v, 'manifest.json')))
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def manifest(self, version):
+        try:
+            with open(os.path.join(self.version_dir(version), 'manifest.json')) as f:
+                return json.load(f)
+        except OSError:
+            raise RegistryError(f"Versi {version} tidak ada di registri {self.root}")
+
+    def model_path(self, version, name):
+        return os.path.join(self.version_dir(version), self.manifest(version)['models'][name]['file'])
+
+    def activate(self, version):
+        self.manifest(version)
+        tmp = os.path.join(self.root, f'CURRENT.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            f.write(version + '\n')
+        os.replace(tmp, os.path.join(self.root, 'CURRENT'))
+
+    def publish(self, version, non_lab_path=MODEL_NON_LAB_PATH, gabungan_path=MODEL_GABUNGAN_PATH,
+                thresholds=None, notes='', build_table=True):
+        import joblib
+        from fast_inference import compile_model, save_compiled
+        from prediction_cache import file_hash
+
+        thresholds = thresholds or MODEL_THRESHOLDS
+        final_dir = self.version_dir(version)
+        if os.path.exists(final_dir):
+            raise RegistryError(f"Versi {version} sudah ada; versi bersifat immutable")
+        # Disiapkan di direktori sementara lalu di-rename: pemantau tidak pernah melihat versi setengah jadi
+        tmp_dir = final_dir + f'.{os.getpid()}.tmp'
+        os.makedirs(tmp_dir)
+        try:
+            models = {}
+            for name, source in (('nonlab', non_lab_path), ('gabungan', gabungan_path)):
+                dest = os.path.join(tmp_dir, MODEL_FILES[name])
+                shutil.copyfile(source, dest)
+                model = joblib.load(dest)
+                save_compiled(compile_model(model), os.path.join(tmp_dir, 'compiled', name), source_path=dest)
+                models[name] = {
+                    'file': MODEL_FILES[name],
+                    'sha256': file_hash(dest),
+                    'features': [str(f) for f in model.feature_names_in_],
+                    'type': type(model).__name__,
+                    'source': os.path.abspath(source),
+                }
+                if name == 'nonlab' and build_table:
+                    from lookup_table import build_table as build_lookup
+                    # Dikuantisasi di sekitar ambang non-lab versi ini, bukan ambang global
+                    build_lookup(model, model_path=dest, thresholds=thresholds['nonlab'],
+                                 table_path=os.path.join(tmp_dir, 'compiled', 'nonlab_table.npy'))
+            manifest = {
+                'version': version,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'models': models,
+                'thresholds': {name: {'high': float(high), 'medium': float(medium)}
+                               for name, (high, medium) in thresholds.items()},
+                'notes': notes,
+            }
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            # source_path di meta artefak masih menunjuk direktori sementara; validasi memakai hash, bukan path
+            os.rename(tmp_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return manifest
+
+    def load(self, version):
+        from prediction_cache import file_hash
+
+        manifest = self.manifest(version)
+        paths = {}
+        for name, info in manifest['models'].items():
+            path = os.path.join(self.version_dir(version), info['file'])
+            if file_hash(path) != info['sha256']:
+                raise RegistryError(f"Hash {path} tidak cocok dengan manifest versi {version}")
+            paths[name] = path
+        compiled_dir = os.path.join(self.version_dir(version), 'compiled')
+        thresholds = manifest_thresholds(manifest)
+        bundle = load_bundle(paths['nonlab'], paths['gabungan'], compiled_dir=compiled_dir,
+                             table_path=os.path.join(compiled_dir, 'nonlab_table.npy'),
+                             nonlab_thresholds=thresholds['nonlab'])
+        for name, features in (('nonlab', bundle.features_nl), ('gabungan', bundle.features_gab)):
+            if list(features) != manifest['models'][name]['features']:
+                raise RegistryError(f"Fitur model {name} versi {version} berbeda dengan manifest")
+        return ActiveModels(version, bundle, paths['nonlab'], paths['gabungan'], thresholds)
+
+
+def manifest_thresholds(manifest):
+    # Manifest lama: satu pasang {'high', 'medium'} untuk kedua model
+    data = manifest.get('thresholds', {})
+    if 'high' in data or not data:
+        pair = (float(data.get('high', OPTIMAL_THRESHOLD_GABUNGAN)), float(data.get('medium', MEDIUM_THRESHOLD)))
+        return {name: pair for name in MODEL_NAMES}
+    return {name: (float(data[name]['high']), float(data[name]['medium'])) for name in MODEL_NAMES}
+
+
+def load_config_models(non_lab_path=MODEL_NON_LAB_PATH, gabungan_path=MODEL_GABUNGAN_PATH):
+    # Tanpa registri: path dari config.py, ambang per model dari thresholds.json (atau konstanta)
+    return ActiveModels('config', load_bundle(non_lab_path, gabungan_path), non_lab_path, gabungan_path,
+                        dict(MODEL_THRESHOLDS))
+
+
+# CANARY
+def _predict(model, X, features):
+    if hasattr(model, 'predict_row'):
+        return model.predict_proba(X)[:, 1]
+    import pandas as pd
+    return model.predict_proba(pd.DataFrame(X, columns=features))[:, 1]
+
+
+def _bands(prob, threshold, medium):
+    return (prob >= medium).astype(np.int8) + (prob >= threshold)
+
+
+def canary_check(current, candidate, n=CANARY_ROWS, min_agreement=CANARY_MIN_AGREEMENT, seed=0):
+    from fast_inference import random_inputs
+
+    report = {'version': candidate.version, 'previous': current.version if current else None, 'rows': n}
+    pairs = (
+        ('nonlab', 'features_nl', lambda b: b.table_nl or b.fast_nl or b.model_nl),
+        ('gabungan', 'features_gab', lambda b: b.fast_gab or b.model_gab),
+    )
+    ok = True
+    for name, features_attr, pick in pairs:
+        features = list(getattr(candidate.bundle, features_attr))
+        X = random_inputs(features, n, seed)
+        prob_new = _predict(pick(candidate.bundle), X, features)
+        valid = bool(np.all(np.isfinite(prob_new)) and prob_new.min() >= 0 and prob_new.max() <= 1)
+        entry = {'valid_output': valid, 'mean_prob': round(float(np.mean(prob_new)), 4)}
+        ok &= valid
+        if current is not None:
+            old_features = list(getattr(current.bundle, features_attr))
+            if set(old_features) != set(features):
+                entry['error'] = "daftar fitur berbeda dengan versi aktif"
+                ok = False
+            else:
+                order = [features.index(f) for f in old_features]
+                prob_old = _predict(pick(current.bundle), X[:, order], old_features)
+                # Kedua versi dinilai dengan ambang kandidat: perubahan ambang yang disengaja tidak dihitung
+                cutoffs = candidate.thresholds[name]
+                agreement = float(np.mean(_bands(prob_new, *cutoffs) == _bands(prob_old, *cutoffs)))
+                entry['band_agreement'] = round(agreement, 4)
+                entry['mean_abs_diff'] = round(float(np.mean(np.abs(prob_new - prob_old))), 4)
+                ok &= agreement >= min_agreement
+        report[name] = entry
+    report['ok'] = bool(ok)
+    return report
+
+
+# LOADER + PEMANTAU (dipakai app.py)
+class RegistryModelLoader:
+    def __init__(self, root=REGISTRY_DIR, poll_interval=POLL_INTERVAL, min_agreement=CANARY_MIN_AGREEMENT,
+                 student_dir=None):
+        self.registry = ModelRegistry(root)
+        self.student_dir = student_dir
+        self.poll_interval = poll_interval
+        self.min_agreement = min_agreement
+        self.events = deque(maxlen=20)
+        self._active = None
+        # Versi registri yang aktif (ActiveModels.version murid diberi akhiran, mis. v1+tree)
+        self._version = None
+        self._rejected = set()
+        self._initial = BackgroundModelLoader(self._load_initial)
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _load_initial(self):
+        version = self.registry.current_version()
+        teacher = self.registry.load(version) if version else load_config_models()
+        self._version = teacher.version
+        self._active = self._serve(teacher)
+        self._record(self._active.version, 'loaded')
+        return self._active
+
+    def _serve(self, active):
+        if not self.student_dir:
+            return active
+        from distill import student_models
+        student = student_models(active, self.student_dir)
+        if student is None:
+            self._record(active.version, 'student_missing', student_dir=self.student_dir)
+            return active
+        return student
+
+    def _record(self, version, result, **details):
+        MODEL_SWAP_TOTAL.labels(result).inc()
+        self.events.append({'ts': time.time(), 'version': version, 'result': result, **details})
+
+    def start(self):
+        self._initial.start()
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='dialens-model-registry', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def done(self):
+        return self._initial.done
+
+    @property
+    def failed(self):
+        return self._initial.failed
+
+    @property
+    def error(self):
+        return self._initial.error
+
+    @property
+    def load_seconds(self):
+        return self._initial.load_seconds
+
+    @property
+    def active(self):
+        return self._active
+
+    def get(self, timeout=None):
+        # Setelah muat awal tidak pernah menunggu: selalu versi aktif saat ini
+        if self._active is None:
+            self._initial.get(timeout)
+        return self._active
+
+    def check_once(self):
+        version = self.registry.current_version()
+        current = self._active
+        if not version or current is None or version == self._version or version in self._rejected:
+            return None
+        try:
+            candidate = self._serve(self.registry.load(version))
+            report = canary_check(current, candidate, min_agreement=self.min_agreement)
+        except Exception as e:
+            self._rejected.add(version)
+            self._record(version, 'error', error=str(e))
+            return None
+        if not report['ok']:
+            self._rejected.add(version)
+            self._record(version, 'rejected', canary=report)
+            return report
+        # Satu assignment referensi: rerun yang sedang berjalan tetap memakai objek lama
+        self._active = candidate
+        self._version = version
+        self._record(version, 'activated', canary=report, previous=current.version)
+        return report
+
+    def _watch(self):
+        self._initial.get()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_once()
+            except Exception:
+                pass
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registri model DiaLens.")
+    parser.add_argument('--root', default=REGISTRY_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_pub = sub.add_parser('publish', help="Salin model ke registri sebagai versi baru")
+    p_pub.add_argument('--version', required=True)
+    p_pub.add_argument('--non-lab', default=MODEL_NON_LAB_PATH)
+    p_pub.add_argument('--gabungan', default=MODEL_GABUNGAN_PATH)
+    p_pub.add_argument('--thresholds', default=THRESHOLDS_PATH, help="File ambang per model (calibration.py)")
+    p_pub.add_argument('--threshold', type=float, help="Ambang Tinggi untuk kedua model (menimpa --thresholds)")
+    p_pub.add_argument('--medium-threshold', type=float, help="Ambang Sedang untuk kedua model")
+    p_pub.add_argument('--notes', default='')
+    p_pub.add_argument('--no-table', action='store_true', help="Lewati pembuatan tabel lookup non-lab")
+    p_pub.add_argument('--activate', action='store_true')
+    p_act = sub.add_parser('activate', help="Jadikan versi aktif (proses app berpindah setelah canary lolos)")
+    p_act.add_argument('version')
+    p_can = sub.add_parser('canary', help="Uji versi terhadap versi aktif tanpa mengaktifkan")
+    p_can.add_argument('version')
+    p_can.add_argument('--rows', type=int, default=CANARY_ROWS)
+    sub.add_parser('list', help="Daftar versi")
+    args = parser.parse_args(argv)
+    registry = ModelRegistry(args.root)
+
+    try:
+        if args.command == 'publish':
+            t0 = time.perf_counter()
+            thresholds = load_thresholds(args.thresholds)
+            for name, (high, medium) in thresholds.items():
+                thresholds[name] = (high if args.threshold is None else args.threshold,
+                                    medium if args.medium_threshold is None else args.medium_threshold)
+            registry.publish(args.version, args.non_lab, args.gabungan, thresholds, args.notes,
+                             build_table=not args.no_table)
+            print(f"✅ Versi {args.version} diterbitkan di {registry.version_dir(args.version)} "
+                  f"({time.perf_counter() - t0:.1f} dtk)")
+            if args.activate:
+                registry.activate(args.version)
+                print(f"✅ Versi aktif: {args.version}")
+        elif args.command == 'activate':
+            registry.activate(args.version)
+            print(f"✅ Versi aktif: {args.version}")
+        elif args.command == 'canary':
+            current_version = registry.current_version()
+            current = registry.load(current_version) if current_version else load_config_models()
+            report = canary_check(current, registry.load(args.version), args.rows)
+            print(json.dumps(report, indent=2))
+            print("✅ Canary lolos" if report['ok'] else "❌ Canary gagal")
+            return 0 if report['ok'] else 1
+        else:
+            current = registry.current_version()
+            for version in registry.versions():
+                manifest = registry.manifest(version)
+                marker = '*' if version == current else ' '
+                cutoffs = ' '.join(f"{name} {high:.2f}/{medium:.2f}"
+                                   for name, (high, medium) in manifest_thresholds(manifest).items())
+                print(f"{marker} {version}  {manifest['created']}  ambang {cutoffs}"
+                      f"  {manifest.get('notes', '')}")
+    except RegistryError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
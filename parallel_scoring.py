@@ -0,0 +1,232 @@
+# SKOR MULTI-PROSES DENGAN BOBOT MODEL DI SHARED MEMORY
+#
+# Model dimuat dan dikompilasi sekali di proses induk. Array pohonnya disalin sekali ke
+# satu blok shared memory yang dipetakan langsung oleh semua worker (tanpa unpickle ulang).
+# Chunk input ditulis sebagai matriks float32 ke slot shared memory; antrean tugas hanya
+# membawa nomor slot dan jumlah baris, dan worker menulis probabilitas ke slot yang sama.
+#
+#   python parallel_scoring.py skrining.parquet hasil.parquet --workers 4
+import argparse
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from config import MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH
+from fast_inference import CompiledTreeEnsemble, compile_model
+from scoring import ChunkWriter, DEFAULT_CHUNKSIZE, iter_chunks, load_models, score_columns, score_validated
+from validation import coerce_column, get_schema, input_fields, validate_matrix
+
+MODEL_KEYS = ('nl', 'gab')
+_ALIGN = 64
+
+
+class SharedArrays:
+    # Banyak array NumPy dalam satu blok shared memory; layout = {kunci: (offset, dtype, shape)}
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+
+    @classmethod
+    def allocate(cls, specs):
+        layout, offset = {}, 0
+        for key, (dtype, shape) in specs.items():
+            dtype = np.dtype(dtype)
+            layout[key] = (offset, dtype.str, tuple(shape))
+            nbytes = dtype.itemsize * int(np.prod(shape))
+            offset += -(-nbytes // _ALIGN) * _ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, _ALIGN))
+        return cls(shm, layout, owner=True)
+
+    @classmethod
+    def create(cls, arrays):
+        arrays = {key: np.ascontiguousarray(arr) for key, arr in arrays.items()}
+        shared = cls.allocate({key: (arr.dtype, arr.shape) for key, arr in arrays.items()})
+        for key, arr in arrays.items():
+            shared[key][...] = arr
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        name, layout = handle
+        # Worker pool berbagi resource tracker dengan induk; hanya induk yang unlink
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def handle(self):
+        return self.shm.name, self.layout
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def __getitem__(self, key):
+        offset, dtype, shape = self.layout[key]
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            # Masih ada view NumPy yang hidup; blok tetap dihapus di bawah
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def share_models(models):
+    arrays, meta = {}, {}
+    for key, model in zip(MODEL_KEYS, models):
+        for name in CompiledTreeEnsemble.ARRAYS:
+            arrays[f'{key}.{name}'] = getattr(model, name)
+        meta[key] = model.meta()
+    return SharedArrays.create(arrays), meta
+
+
+def attach_models(shared, meta):
+    return [CompiledTreeEnsemble(**{name: shared[f'{key}.{name}'] for name in CompiledTreeEnsemble.ARRAYS},
+                                 **meta[key])
+            for key in MODEL_KEYS]
+
+
+def fill_matrix(df, columns, out):
+    # Koersi kolom di proses induk; validasi rentang dilakukan worker (validate_matrix)
+    for j, col in enumerate(columns):
+        if col in df.columns:
+            out[:, j] = coerce_column(df[col])[0]
+        else:
+            out[:, j] = np.nan
+    return out
+
+
+def score_matrix(X, model_nl, model_gab, columns, features_nl, features_gab):
+    # Logika sama dengan scoring.score_frame, tetapi pada matriks float32 (kolom = columns)
+    checked = validate_matrix(X, get_schema(tuple(columns)))
+    return score_validated(checked, model_nl, model_gab, features_nl, features_gab)
+
+
+# WORKER: hanya memetakan shared memory, tidak memuat file model
+_WORKER = {}
+
+
+def _init_worker(model_handle, model_meta, slot_handle, columns, features_nl, features_gab):
+    model_store = SharedArrays.attach(model_handle)
+    _WORKER['models'] = attach_models(model_store, model_meta)
+    _WORKER['model_store'] = model_store
+    _WORKER['slots'] = SharedArrays.attach(slot_handle)
+    _WORKER['spec'] = (columns, features_nl, features_gab)
+
+
+def _score_slot(slot, n):
+    slots = _WORKER['slots']
+    model_nl, model_gab = _WORKER['models']
+    prob_nl, prob_gab = score_matrix(slots[f'x{slot}'][:n], model_nl, model_gab, *_WORKER['spec'])
+    out = slots[f'p{slot}']
+    out[:n, 0] = prob_nl
+    out[:n, 1] = prob_gab
+    return slot, n
+
+
+class ParallelScorer:
+    def __init__(self, models, workers=2, chunksize=DEFAULT_CHUNKSIZE):
+        model_nl, model_gab, features_nl, features_gab = models
+        compiled = [m if isinstance(m, CompiledTreeEnsemble) else compile_model(m) for m in (model_nl, model_gab)]
+        self.features_nl = list(features_nl)
+        self.features_gab = list(features_gab)
+        self.columns = input_fields(self.features_nl, self.features_gab)
+        self.workers = workers
+        self.chunksize = chunksize
+        self.n_slots = 2 * workers
+
+        self.model_store, model_meta = share_models(compiled)
+        specs = {}
+        for i in range(self.n_slots):
+            specs[f'x{i}'] = (np.float32, (chunksize, len(self.columns)))
+            specs[f'p{i}'] = (np.float64, (chunksize, 2))
+        self.slots = SharedArrays.allocate(specs)
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(self.model_store.handle, model_meta, self.slots.handle,
+                      self.columns, self.features_nl, self.features_gab),
+        )
+
+    def _split(self, chunks):
+        for chunk in chunks:
+            for start in range(0, len(chunk), self.chunksize):
+                yield chunk.iloc[start:start + self.chunksize]
+
+    def _finish(self, chunk, future, keep_columns):
+        slot, n = future.result()
+        probs = self.slots[f'p{slot}'][:n].copy()
+        scores = score_columns(probs[:, 0], probs[:, 1], chunk.index)
+        out = pd.concat([chunk, scores], axis=1) if keep_columns else scores
+        return slot, out
+
+    def score_chunks(self, chunks, keep_columns=True):
+        # Urutan output sama dengan urutan input; paling banyak n_slots chunk sedang diproses
+        free = deque(range(self.n_slots))
+        pending = deque()
+        for chunk in self._split(chunks):
+            if not free:
+                slot, out = self._finish(*pending.popleft(), keep_columns)
+                free.append(slot)
+                yield out
+            slot = free.popleft()
+            fill_matrix(chunk, self.columns, self.slots[f'x{slot}'][:len(chunk)])
+            pending.append((chunk, self._pool.submit(_score_slot, slot, len(chunk))))
+        while pending:
+            slot, out = self._finish(*pending.popleft(), keep_columns)
+            free.append(slot)
+            yield out
+
+    def close(self):
+        self._pool.shutdown()
+        self.slots.close()
+        self.model_store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_file_parallel(input_path, output_path, models=None, workers=2, chunksize=DEFAULT_CHUNKSIZE,
+                        keep_columns=True):
+    models = models or load_models(fast=True)
+    n_rows = 0
+    with ParallelScorer(models, workers, chunksize) as scorer, ChunkWriter(output_path) as writer:
+        for out in scorer.score_chunks(iter_chunks(input_path, chunksize), keep_columns):
+            writer.write(out)
+            n_rows += len(out)
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Skor file CSV/Parquet DiaLens dengan beberapa proses worker.")
+    parser.add_argument('input', help="File input (.csv atau .parquet)")
+    parser.add_argument('output', help="File output (.csv atau .parquet)")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--scores-only', action='store_true', help="Hanya tulis kolom skor")
+    parser.add_argument('--model-nl', default=MODEL_NON_LAB_PATH)
+    parser.add_argument('--model-gab', default=MODEL_GABUNGAN_PATH)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    models = load_models(args.model_nl, args.model_gab, fast=True)
+    n_rows = score_file_parallel(args.input, args.output, models, args.workers, args.chunksize,
+                                 not args.scores_only)
+    t_total = time.perf_counter() - t0
+    print(f"✅ {n_rows} baris diskor dengan {args.workers} worker dalam {t_total:.2f} dtk "
+          f"({n_rows / max(t_total, 1e-9):,.0f} baris/dtk)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
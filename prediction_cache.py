@@ -0,0 +1,116 @@
+# CACHE PREDIKSI: LRU terbatas yang dipakai bersama semua sesi
+#
+# Kunci = (file model, identitas model yang dimuat, tuple fitur kanonik). Identitas diberikan
+# pemanggil (hash file saat model dimuat, lihat ModelBundle.model_ids), bukan hash file di disk
+# saat ini: model di memori yang belum dimuat ulang tetap memakai entrinya sendiri. Jika
+# identitas untuk satu file berubah (model dimuat ulang), semua entri lama dibuang otomatis.
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = int(os.environ.get('DIALENS_PREDICTION_CACHE_SIZE', 4096))
+DEFAULT_TTL = float(os.environ.get('DIALENS_PREDICTION_CACHE_TTL', 3600))
+
+_FINGERPRINTS = {}
+_FINGERPRINT_LOCK = threading.Lock()
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def model_fingerprint(path):
+    # Hash dihitung ulang hanya jika mtime/ukuran file berubah
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _FINGERPRINT_LOCK:
+        cached = _FINGERPRINTS.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    digest = file_hash(path)
+    with _FINGERPRINT_LOCK:
+        _FINGERPRINTS[path] = (stamp, digest)
+    return digest
+
+
+def canonical_features(values, decimals=4):
+    # 35, 35.0 dan np.float32(35) menghasilkan kunci yang sama
+    return tuple(round(float(v), decimals) for v in values)
+
+
+class PredictionCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._hashes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_model(self, model_path, model_id):
+        if self._hashes.get(model_path) != model_id:
+            stale = [k for k in self._data if k[0] == model_path]
+            for k in stale:
+                del self._data[k]
+            if model_path in self._hashes:
+                self.invalidations += 1
+            self._hashes[model_path] = model_id
+        return model_id
+
+    def get(self, model_path, model_id, values):
+        with self._lock:
+            key = (model_path, self._check_model(model_path, model_id), canonical_features(values))
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            prob, expires = entry
+            if self.ttl and expires < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return prob
+
+    def put(self, model_path, model_id, values, prob):
+        with self._lock:
+            key = (model_path, self._check_model(model_path, model_id), canonical_features(values))
+            self._data[key] = (prob, time.monotonic() + self.ttl if self.ttl else float('inf'))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._hashes.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
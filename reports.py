@@ -0,0 +1,446 @@
+# LAPORAN MASSAL: satu lembar hasil (HTML siap cetak) per orang untuk seluruh kampanye skrining
+#
+# File skrining dibaca per chunk dan diskor sekali secara vektor (validasi + kedua model, sama
+# dengan scoring.py). Baris valid dipotong menjadi blok dan dikirim ke pool proses; tiap worker
+# memakai template yang dikompilasi sekali saat start (potongan literal + slot), merender blok,
+# dan langsung mengompres tiap lembar (raw deflate). Proses induk hanya menulis byte terkompresi
+# ke ZIP secara berurutan — header lokal lengkap tanpa seek, jadi output bisa berupa pipe (-).
+# Paling banyak 2 × workers blok sedang diproses dan direktori pusat ZIP ditampung di file
+# sementara, sehingga memori tetap datar berapa pun besar kohortnya.
+#
+# Lembar berisi data yang dimasukkan, kategori risiko + probabilitas kedua model, dan blok
+# rekomendasi yang sama dengan display_step_3 (RECOMMENDATIONS dipakai juga oleh app.py).
+#
+#   python reports.py skrining.parquet laporan.zip --workers 4
+#   python reports.py skrining.csv laporan.zip --id-column nik --date 2026-10-01
+#   python reports.py skrining.parquet - > laporan.zip
+import argparse
+import datetime
+import html
+import os
+import re
+import resource
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import INPUT_RANGES, LAB_DEFAULTS, MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH, MODEL_THRESHOLDS
+from metrics import REPORTS_TOTAL
+from validation import DECLARED_FIELDS
+
+DEFAULT_CHUNKSIZE = 50_000
+DEFAULT_BLOCK_ROWS = 500
+DEFAULT_COMPRESSLEVEL = 6
+PROGRESS_INTERVAL = 0.5
+RISK_BANDS = ('Rendah', 'Sedang', 'Tinggi')
+UNSAFE_NAME = re.compile(r'[^\w.-]')
+
+# REKOMENDASI (sama persis di app.py → render_recommendation)
+RECOMMENDATIONS = {
+    'Rendah': """
+            <div class="recommendation-box" style="background-color: #e8f5e9; border-left: 4px solid #2A9D8F; color: #264653;">
+            <h4 style="color: #2A9D8F; margin-top: 0;">🟢 Risiko Rendah – Pertahankan Gaya Hidup Sehat!</h4>
+            <ul>
+                <li>Lanjutkan pola makan seimbang dan aktivitas fisik rutin (≥150 menit/minggu).</li>
+                <li>Periksa gula darah setiap 2–3 tahun, terutama jika usia &gt;40 tahun.</li>
+                <li>Pertahankan literasi kesehatan — Anda sudah di jalur yang tepat!</li>
+            </ul>
+            </div>
+            """,
+    'Sedang': """
+            <div class="recommendation-box" style="background-color: #fff8e1; border-left: 4px solid #F4A261; color: #264653;">
+            <h4 style="color: #E9C46A; margin-top: 0;">🟡 Risiko Sedang – Waspadai & Ambil Langkah Pencegahan</h4>
+            <ul>
+                <li>Kurangi konsumsi gula, minuman manis, dan makanan olahan.</li>
+                <li>Tingkatkan aktivitas fisik (jalan cepat, bersepeda, olahraga ringan).</li>
+                <li>Lakukan pemeriksaan gula darah puasa atau HbA1c dalam 3–6 bulan.</li>
+                <li>Konsultasi dengan tenaga kesehatan untuk skrining lebih lanjut.</li>
+            </ul>
+            </div>
+            """,
+    'Tinggi': """
+            <div class="recommendation-box" style="background-color: #ffebee; border-left: 4px solid #E76F51; color: #1D3557;">
+            <h4 style="color: #E76F51; margin-top: 0;">🔴 Risiko Tinggi – Segera Konsultasi Medis!</h4>
+            <ul>
+                <li>Anda berada dalam kelompok berisiko tinggi untuk diabetes tipe 2.</li>
+                <li><strong>Segera konsultasi dengan dokter</strong> untuk pemeriksaan lengkap (HbA1c, GDP, profil lipid).</li>
+                <li>Hindari gula tambahan, rokok, dan gaya hidup sedentari.</li>
+                <li>Pertimbangkan program pencegahan diabetes terstruktur (jika tersedia).</li>
+            </ul>
+            <p style="font-style: italic; margin-top: 10px; color: #555;">
+                Ingat: Diagnosis dini dan intervensi gaya hidup dapat menurunkan risiko hingga 58%.
+            </p>
+            </div>
+            """,
+}
+
+# TEMPLATE LEMBAR HASIL ({{slot}} diisi per orang; selebihnya literal)
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="id">
+<head>
+<meta charset="utf-8">
+<title>DiaLens – Hasil Skrining {{id}}</title>
+<style>
+@page { size: A4; margin: 15mm; }
+body { font-family: "Source Sans Pro", Arial, sans-serif; color: #264653; max-width: 720px; margin: 0 auto; }
+h1 { font-size: 1.5em; color: #E76F51; margin-bottom: 4px; }
+h2 { font-size: 1.15em; border-bottom: 2px solid #f0f0f0; padding-bottom: 4px; margin-top: 24px; }
+.meta { color: #6c757d; font-size: 0.9em; }
+table.inputs { border-collapse: collapse; width: 100%; font-size: 0.95em; }
+table.inputs td { padding: 3px 6px; border-bottom: 1px solid #f0f0f0; }
+table.inputs td.value { text-align: right; font-weight: 600; }
+.imputed { color: #6c757d; font-style: italic; font-weight: normal; }
+.cards { display: flex; gap: 12px; }
+.card { flex: 1; border: 1px solid #dee2e6; border-radius: 8px; padding: 10px 14px; }
+.card .prob { font-size: 1.6em; font-weight: 700; }
+.card .note { color: #6c757d; font-size: 0.85em; }
+.risk-high { color: #E76F51; font-weight: bold; }
+.risk-medium { color: #F4A261; font-weight: bold; }
+.risk-low { color: #2A9D8F; font-weight: bold; }
+.recommendation-box { padding: 16px; border-radius: 10px; margin: 16px 0; }
+.footer { text-align: center; color: #6c757d; font-size: 0.85em; margin-top: 32px; }
+@media print { .recommendation-box, .card { break-inside: avoid; -webkit-print-color-adjust: exact; print-color-adjust: exact; } }
+</style>
+</head>
+<body>
+<h1>🩺 DiaLens – Hasil Skrining Risiko Diabetes</h1>
+<div class="meta">ID: <strong>{{id}}</strong> • Tanggal: {{date}}</div>
+<h2>📝 Data yang Dimasukkan</h2>
+<table class="inputs">{{inputs}}</table>
+<h2>📊 Hasil Prediksi</h2>
+<div class="cards">
+<div class="card"><div>🧠 Tanpa Lab</div>{{card_nl}}</div>
+<div class="card"><div>🧪 Dengan Data Laboratorium</div>{{card_gab}}</div>
+</div>
+<p>Kategori risiko akhir: {{final_risk}}</p>
+<h2>💡 Rekomendasi Personal dari DiaLens</h2>
+{{recommendation}}
+<div class="footer">Dibuat oleh DiaLens • Hasil ini bukan diagnosis medis</div>
+</body>
+</html>
+"""
+
+
+class ReportTemplate:
+    # Dikompilasi sekali: literal di posisi genap, nama slot di posisi ganjil
+    SLOT = re.compile(r'\{\{(\w+)\}\}')
+
+    def __init__(self, source=PAGE_TEMPLATE):
+        self.parts = self.SLOT.split(source)
+        self.slots = [(i, self.parts[i]) for i in range(1, len(self.parts), 2)]
+
+    def render(self, values):
+        out = self.parts.copy()
+        for i, name in self.slots:
+            out[i] = values[name]
+        return ''.join(out)
+
+
+# BAGIAN LEMBAR (fragmen tetap per kategori dibuat sekali)
+RISK_CSS = {'Tinggi': 'risk-high', 'Sedang': 'risk-medium', 'Rendah': 'risk-low'}
+RISK_SPANS = [f'<span class="{RISK_CSS[band]}">{band}</span>' for band in RISK_BANDS]
+RECOMMENDATION_BLOCKS = [RECOMMENDATIONS[band] for band in RISK_BANDS]
+NO_LAB_CARD = '<div class="note">Tidak tersedia – data laboratorium tidak diisi.</div>'
+IMPUTED_NOTE = '<div class="note">⚠️ Sebagian data lab diasumsikan normal karena tidak diisi.</div>'
+
+
+def _labels():
+    from explain import FEATURE_LABELS
+    return [html.escape(FEATURE_LABELS.get(f, f)) for f in DECLARED_FIELDS]
+
+
+def _format_value(field, value, imputed):
+    if imputed:
+        return '<span class="imputed">tidak diisi / tidak valid</span>'
+    if field in LAB_DEFAULTS:
+        return f'{value:g}'
+    if field in INPUT_RANGES:
+        return f'{value:.0f}'
+    return '✅ Ya' if value else '❌ Tidak'
+
+
+def _card(band, prob):
+    return f'<div class="prob">{prob:.1%}</div><div>Tingkat Risiko: {RISK_SPANS[band]}</div>'
+
+
+class SheetRenderer:
+    def __init__(self, date):
+        self.template = ReportTemplate()
+        self.labels = _labels()
+        self.date = html.escape(date)
+        self.lab_bits = [j for j, f in enumerate(DECLARED_FIELDS) if f in LAB_DEFAULTS]
+
+    def render(self, block, i):
+        x, imputed = block['X'][i], int(block['imputed'][i])
+        rows = ''.join(
+            f'<tr><td>{label}</td><td class="value">{_format_value(field, float(x[j]), imputed >> j & 1)}</td></tr>'
+            for j, (field, label) in enumerate(zip(DECLARED_FIELDS, self.labels)))
+        band_nl, band_gab, final = int(block['risk_nl'][i]), int(block['risk_gab'][i]), int(block['final'][i])
+        if band_gab < 0:
+            card_gab = NO_LAB_CARD
+        else:
+            card_gab = _card(band_gab, block['prob_gab'][i])
+            if any(imputed >> j & 1 for j in self.lab_bits):
+                card_gab += IMPUTED_NOTE
+        return self.template.render({
+            'id': block['ids'][i],
+            'date': self.date,
+            'inputs': rows,
+            'card_nl': _card(band_nl, block['prob_nl'][i]),
+            'card_gab': card_gab,
+            'final_risk': RISK_SPANS[final],
+            'recommendation': RECOMMENDATION_BLOCKS[final],
+        })
+
+
+def render_block(renderer, block, compresslevel=DEFAULT_COMPRESSLEVEL):
+    # → [(nama file, crc32, ukuran asli, raw deflate)]
+    out = []
+    for i in range(len(block['ids'])):
+        data = renderer.render(block, i).encode('utf-8')
+        deflate = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+        out.append((block['names'][i], zlib.crc32(data), len(data), deflate.compress(data) + deflate.flush()))
+    return out
+
+
+# WORKER: template dikompilasi sekali per proses
+_WORKER = {}
+
+
+def _init_worker(date, compresslevel):
+    _WORKER['renderer'] = SheetRenderer(date)
+    _WORKER['compresslevel'] = compresslevel
+
+
+def _render_block(block):
+    return render_block(_WORKER['renderer'], block, _WORKER['compresslevel'])
+
+
+# ZIP STREAMING
+class ZipStream:
+    # Entri sudah terkompresi (CRC & ukuran diketahui) → header lokal ditulis lengkap tanpa seek.
+    # Direktori pusat ditulis ke file sementara lalu disalin di close(); ZIP64 bila > 65535 entri
+    # atau offset > 4 GiB.
+    def __init__(self, fileobj, when=None):
+        self.fp = fileobj
+        self.offset = 0
+        self.count = 0
+        self.central = tempfile.TemporaryFile()
+        t = time.localtime(when)
+        self.dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+        self.dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def add(self, name, crc, size, compressed):
+        name = name.encode('utf-8')
+        header_offset = self.offset
+        # Flag 0x800 = nama UTF-8, metode 8 = deflate
+        self._write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, 0x800, 8, self.dos_time, self.dos_date,
+                                crc, len(compressed), size, len(name), 0) + name)
+        self._write(compressed)
+        extra = b''
+        if header_offset >= 0xFFFFFFFF:
+            extra = struct.pack('<HHQ', 0x0001, 8, header_offset)
+            header_offset = 0xFFFFFFFF
+        self.central.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 45 if extra else 20,
+                                       45 if extra else 20, 0x800, 8, self.dos_time, self.dos_date, crc,
+                                       len(compressed), size, len(name), len(extra), 0, 0, 0,
+                                       0o644 << 16, header_offset) + name + extra)
+        self.count += 1
+
+    def close(self):
+        cd_offset, cd_size = self.offset, self.central.tell()
+        self.central.seek(0)
+        while True:
+            data = self.central.read(1 << 20)
+            if not data:
+                break
+            self._write(data)
+        self.central.close()
+        if self.count >= 0xFFFF or cd_offset >= 0xFFFFFFFF or cd_size >= 0xFFFFFFFF:
+            zip64_offset = self.offset
+            self._write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, self.count, self.count,
+                                    cd_size, cd_offset))
+            self._write(struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1))
+            count, cd_size, cd_offset = 0xFFFF, min(cd_size, 0xFFFFFFFF), 0xFFFFFFFF
+        else:
+            count = self.count
+        self._write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0))
+        self.fp.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# SKOR (vektor) → BLOK
+def risk_codes(probs, threshold, medium):
+    # 0/1/2 = Rendah/Sedang/Tinggi, -1 = tidak diskor
+    codes = (probs >= medium).astype(np.int8) + (probs >= threshold)
+    codes[np.isnan(probs)] = -1
+    return codes
+
+
+def _ids(chunk, id_column, start):
+    rows = np.arange(start + 1, start + len(chunk) + 1)
+    if id_column is None or id_column not in chunk.columns:
+        return rows, [str(r) for r in rows], False
+    col = chunk[id_column]
+    if col.dtype.kind == 'f' and np.all(np.isnan(col) | (col == np.floor(col))):
+        col = col.astype('Int64')
+    return rows, [html.escape(str(v)) for v in col.astype('string').fillna('').tolist()], True
+
+
+def score_blocks(chunks, models, id_column='id', block_rows=DEFAULT_BLOCK_ROWS, thresholds=MODEL_THRESHOLDS,
+                 stats=None):
+    from scoring import score_validated
+    from validation import get_schema, validate_columns
+
+    model_nl, model_gab, features_nl, features_gab = models
+    schema = get_schema()
+    start = 0
+    for chunk in chunks:
+        checked = validate_columns(chunk, schema)
+        prob_nl, prob_gab = score_validated(checked, model_nl, model_gab, features_nl, features_gab)
+        risk_nl = risk_codes(prob_nl, *thresholds['nonlab'])
+        risk_gab = risk_codes(prob_gab, *thresholds['gabungan'])
+        final = np.where(risk_gab >= 0, risk_gab, risk_nl)
+        rows, ids, has_id = _ids(chunk, id_column, start)
+        start += len(chunk)
+        valid = np.flatnonzero(risk_nl >= 0)
+        if stats is not None:
+            stats['invalid'] += len(chunk) - len(valid)
+        REPORTS_TOTAL.labels('invalid').inc(len(chunk) - len(valid))
+        for b in range(0, len(valid), block_rows):
+            idx = valid[b:b + block_rows]
+            # Nomor baris di depan nama: urut dan unik walau ID ganda
+            yield {
+                'ids': [ids[i] for i in idx],
+                'names': [f'laporan/{rows[i]:07d}_{UNSAFE_NAME.sub("_", ids[i])}.html' if has_id
+                          else f'laporan/{rows[i]:07d}.html' for i in idx],
+                'X': checked.X[idx], 'imputed': checked.imputed[idx],
+                'prob_nl': prob_nl[idx], 'prob_gab': prob_gab[idx],
+                'risk_nl': risk_nl[idx], 'risk_gab': risk_gab[idx], 'final': final[idx],
+            }
+
+
+class Progress:
+    def __init__(self, total=None, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.t0 = self.last = time.perf_counter()
+        self.done = 0
+
+    def update(self, n, force=False):
+        self.done += n
+        now = time.perf_counter()
+        if force or now - self.last >= PROGRESS_INTERVAL:
+            self.last = now
+            rate = self.done / max(now - self.t0, 1e-9)
+            of = f"/{self.total:,}" if self.total else ''
+            self.stream.write(f"\r  {self.done:,}{of} laporan ({rate:,.0f}/dtk)")
+            self.stream.flush()
+
+
+def generate_reports(input_path, output, models=None, workers=1, id_column='id', date=None,
+                     chunksize=DEFAULT_CHUNKSIZE, block_rows=DEFAULT_BLOCK_ROWS,
+                     compresslevel=DEFAULT_COMPRESSLEVEL, progress=None):
+    # output: path .zip atau file biner (mis. sys.stdout.buffer); → statistik
+    from scoring import iter_chunks, load_models
+
+    models = models or load_models(fast=True)
+    date = date or datetime.date.today().isoformat()
+    stats = {'reports': 0, 'invalid': 0, 'bytes': 0}
+    blocks = score_blocks(iter_chunks(input_path, chunksize), models, id_column, block_rows, stats=stats)
+    fileobj = open(output, 'wb') if isinstance(output, str) else output
+    pool = None
+    try:
+        with ZipStream(fileobj) as archive:
+            def write(entries):
+                for entry in entries:
+                    archive.add(*entry)
+                stats['reports'] += len(entries)
+                REPORTS_TOTAL.labels('rendered').inc(len(entries))
+                if progress:
+                    progress.update(len(entries))
+
+            if workers <= 1:
+                renderer = SheetRenderer(date)
+                for block in blocks:
+                    write(render_block(renderer, block, compresslevel))
+            else:
+                # Urutan arsip = urutan input; paling banyak 2 × workers blok di antrean
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(date, compresslevel))
+                pending = deque()
+                for block in blocks:
+                    if len(pending) >= 2 * workers:
+                        write(pending.popleft().result())
+                    pending.append(pool.submit(_render_block, block))
+                while pending:
+                    write(pending.popleft().result())
+        stats['bytes'] = archive.offset
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if fileobj is not output:
+            fileobj.close()
+    if progress:
+        progress.update(0, force=True)
+        progress.stream.write('\n')
+    return stats
+
+
+def _row_count(path):
+    if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    return None
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Buat lembar hasil DiaLens per orang (ZIP berisi HTML siap cetak).")
+    parser.add_argument('input', help="File skrining (.csv atau .parquet)")
+    parser.add_argument('output', help="File .zip (atau - untuk stdout)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--id-column', default='id', help="Kolom ID orang (tidak ada = nomor baris)")
+    parser.add_argument('--date', default=None, help="Tanggal di lembar (default: hari ini)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--block-rows', type=int, default=DEFAULT_BLOCK_ROWS, help="Baris per tugas worker")
+    parser.add_argument('--compresslevel', type=int, default=DEFAULT_COMPRESSLEVEL)
+    parser.add_argument('--model-nl', default=MODEL_NON_LAB_PATH)
+    parser.add_argument('--model-gab', default=MODEL_GABUNGAN_PATH)
+    args = parser.parse_args(argv)
+
+    from scoring import load_models
+
+    t0 = time.perf_counter()
+    models = load_models(args.model_nl, args.model_gab, fast=True)
+    output = sys.stdout.buffer if args.output == '-' else args.output
+    stats = generate_reports(args.input, output, models, args.workers, args.id_column, args.date,
+                             args.chunksize, args.block_rows, args.compresslevel,
+                             Progress(_row_count(args.input)))
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"✅ {stats['reports']:,} laporan ({stats['bytes'] / 1e6:.1f} MB) dalam {elapsed:.2f} dtk "
+          f"({stats['reports'] / max(elapsed, 1e-9):,.0f}/dtk, {args.workers} worker, RSS puncak induk "
+          f"{peak_mb:.0f} MB)", file=sys.stderr)
+    if stats['invalid']:
+        print(f"❌ {stats['invalid']:,} baris tidak valid (tidak dibuatkan laporan)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
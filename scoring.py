@@ -0,0 +1,198 @@
+# MESIN SKOR BATCH: skor file skrining (CSV/Parquet) tanpa Streamlit
+#
+# Contoh:
+#   python scoring.py skrining.csv hasil.csv
+#   python scoring.py skrining.parquet hasil.parquet --chunksize 100000
+#   python scoring.py skrining.parquet hasil.parquet --workers 4
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from config import (MEDIUM_THRESHOLD, MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH, MODEL_THRESHOLDS,
+                    OPTIMAL_THRESHOLD_GABUNGAN)
+from metrics import BATCH_PREDICT_SECONDS, BATCH_ROWS_TOTAL, MODEL_LOAD_SECONDS
+from validation import get_schema, input_fields, validate_columns
+
+RISK_LABELS = np.array(['Rendah', 'Sedang', 'Tinggi'], dtype=object)
+SCORE_COLUMNS = ['prob_nl', 'risk_nl', 'prob_gab', 'risk_gab', 'final_risk']
+
+DEFAULT_CHUNKSIZE = 50_000
+
+
+# FUNGSI PEMUATAN MODEL + FITUR
+def load_models(non_lab_path=MODEL_NON_LAB_PATH, gabungan_path=MODEL_GABUNGAN_PATH, fast=False):
+    with MODEL_LOAD_SECONDS.labels('joblib').time():
+        model_nl = joblib.load(non_lab_path)
+        model_gab = joblib.load(gabungan_path)
+    if fast:
+        from fast_inference import compile_model
+        model_nl, model_gab = compile_model(model_nl), compile_model(model_gab)
+    features_nl = [str(f) for f in model_nl.feature_names_in_]
+    features_gab = [str(f) for f in model_gab.feature_names_in_]
+    return model_nl, model_gab, features_nl, features_gab
+
+
+# KATEGORI RISIKO (vektor)
+def risk_categories(probs, threshold=OPTIMAL_THRESHOLD_GABUNGAN, medium=MEDIUM_THRESHOLD):
+    # Ambang boleh skalar atau array per baris
+    probs = np.asarray(probs, dtype=float)
+    idx = (probs >= medium).astype(np.int8) + (probs >= threshold)
+    labels = RISK_LABELS[idx]
+    labels[np.isnan(probs)] = None
+    return labels
+
+
+def _predict_block(model, X, features):
+    if len(X) == 0:
+        return np.empty(0, dtype=float)
+    impl = type(model).__name__
+    if not hasattr(model, 'predict_row'):
+        # Model scikit-learn/XGBoost asli mengharapkan nama kolom
+        X = pd.DataFrame(X, columns=features)
+    with BATCH_PREDICT_SECONDS.labels(impl).time():
+        probs = model.predict_proba(X)[:, 1]
+    BATCH_ROWS_TOTAL.labels(impl).inc(len(X))
+    return probs
+
+
+def score_validated(checked, model_nl, model_gab, features_nl, features_gab):
+    # Baris dengan fitur wajib kosong / tidak valid tidak diskor (NaN);
+    # model gabungan hanya untuk baris dengan data lab (sama dengan display_step_3)
+    n = len(checked)
+    prob_nl = np.full(n, np.nan)
+    prob_gab = np.full(n, np.nan)
+
+    valid_nl = checked.valid(features_nl)
+    if valid_nl.any():
+        prob_nl[valid_nl] = _predict_block(model_nl, checked.matrix(features_nl)[valid_nl], features_nl)
+
+    use_gab = checked.lab_available & checked.valid(features_gab)
+    if use_gab.any():
+        prob_gab[use_gab] = _predict_block(model_gab, checked.matrix(features_gab)[use_gab], features_gab)
+    return prob_nl, prob_gab
+
+
+def score_frame(df, model_nl, model_gab, features_nl, features_gab):
+    checked = validate_columns(df, get_schema(input_fields(features_nl, features_gab)))
+    prob_nl, prob_gab = score_validated(checked, model_nl, model_gab, features_nl, features_gab)
+    return score_columns(prob_nl, prob_gab, df.index)
+
+
+def score_columns(prob_nl, prob_gab, index=None, thresholds=MODEL_THRESHOLDS):
+    risk_nl = risk_categories(prob_nl, *thresholds['nonlab'])
+    risk_gab = risk_categories(prob_gab, *thresholds['gabungan'])
+    final_risk = np.where(pd.isna(risk_gab), risk_nl, risk_gab)
+
+    return pd.DataFrame({
+        'prob_nl': prob_nl,
+        'risk_nl': pd.array(risk_nl, dtype='string'),
+        'prob_gab': prob_gab,
+        'risk_gab': pd.array(risk_gab, dtype='string'),
+        'final_risk': pd.array(final_risk, dtype='string'),
+    }, index=index)
+
+
+# BACA / TULIS STREAMING
+def _file_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext in ('.csv', '.txt', '.gz'):
+        return 'csv'
+    raise ValueError(f"Format file tidak didukung: {path}")
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    if _file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+class ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.fmt = _file_format(path)
+        self._writer = None
+        self._header = True
+
+    def write(self, df):
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            df.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_chunks(chunks, models, keep_columns=True):
+    model_nl, model_gab, features_nl, features_gab = models
+    for chunk in chunks:
+        scores = score_frame(chunk, model_nl, model_gab, features_nl, features_gab)
+        yield pd.concat([chunk, scores], axis=1) if keep_columns else scores
+
+
+def score_file(input_path, output_path, models=None, chunksize=DEFAULT_CHUNKSIZE, keep_columns=True):
+    models = models or load_models()
+    n_rows = 0
+    with ChunkWriter(output_path) as writer:
+        for out in score_chunks(iter_chunks(input_path, chunksize), models, keep_columns):
+            writer.write(out)
+            n_rows += len(out)
+    return n_rows
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Skor risiko diabetes DiaLens untuk file CSV/Parquet.")
+    parser.add_argument('input', help="File input (.csv atau .parquet)")
+    parser.add_argument('output', help="File output (.csv atau .parquet)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--scores-only', action='store_true', help="Hanya tulis kolom skor")
+    parser.add_argument('--model-nl', default=MODEL_NON_LAB_PATH)
+    parser.add_argument('--model-gab', default=MODEL_GABUNGAN_PATH)
+    parser.add_argument('--fast', action='store_true', help="Gunakan inferensi NumPy terkompilasi")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Jumlah proses worker (>1: bobot model dibagi lewat shared memory)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    models = load_models(args.model_nl, args.model_gab, fast=args.fast or args.workers > 1)
+    t_load = time.perf_counter() - t0
+    if args.workers > 1:
+        from parallel_scoring import score_file_parallel
+        n_rows = score_file_parallel(args.input, args.output, models, args.workers, args.chunksize,
+                                     not args.scores_only)
+    else:
+        n_rows = score_file(args.input, args.output, models, args.chunksize, not args.scores_only)
+    t_total = time.perf_counter() - t0
+    rate = n_rows / max(t_total - t_load, 1e-9)
+    print(f"✅ {n_rows} baris diskor dalam {t_total:.2f} dtk (muat model {t_load:.2f} dtk, {rate:,.0f} baris/dtk)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
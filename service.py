@@ -0,0 +1,291 @@
+# LAYANAN HTTP PREDIKSI (asyncio) dengan micro-batching
+#
+# Permintaan yang datang bersamaan dikumpulkan dalam jendela waktu singkat lalu
+# diskor dengan satu panggilan predict_proba per model.
+#
+#   python service.py --port 8600 --max-batch-size 64 --max-wait-ms 5
+#
+#   POST /predict   {"Age": 45, "DietQuality": 4, ..., "HbA1c": 0, "FastingBloodSugar": 0}
+#   GET  /health
+#   GET  /metrics   (teks Prometheus, lihat metrics.py)
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from config import MODEL_THRESHOLDS, risk_category
+from metrics import REGISTRY
+from scoring import _predict_block, load_models
+from validation import get_schema, input_fields, validate_record
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_QUEUE = 1024
+MAX_BODY_BYTES = 64 * 1024
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class InvalidInputError(ValueError):
+    pass
+
+
+class MicroBatcher:
+    def __init__(self, model, features, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 max_queue=DEFAULT_MAX_QUEUE):
+        self.model = model
+        self.features = features
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.n_batches = 0
+        self.n_items = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def predict(self, row):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            raise QueueFullError("Antrean prediksi penuh")
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _predict(self, X):
+        # Model asli (--no-fast) menerima DataFrame berkolom fitur, sama dengan scoring.py
+        return _predict_block(self.model, X, self.features)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            X = np.asarray([row for row, _ in batch], dtype=np.float32)
+            try:
+                # Model dijalankan di thread agar event loop tetap menerima permintaan
+                probs = await loop.run_in_executor(None, self._predict, X)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.n_batches += 1
+            self.n_items += len(batch)
+            for (_, future), prob in zip(batch, probs):
+                if not future.done():
+                    future.set_result(float(prob))
+
+
+class PredictionService:
+    def __init__(self, models, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 max_queue=DEFAULT_MAX_QUEUE):
+        model_nl, model_gab, self.features_nl, self.features_gab = models
+        self.schema = get_schema(input_fields(self.features_nl, self.features_gab))
+        self.batcher_nl = MicroBatcher(model_nl, self.features_nl, max_batch_size, max_wait_ms, max_queue)
+        self.batcher_gab = MicroBatcher(model_gab, self.features_gab, max_batch_size, max_wait_ms, max_queue)
+
+    def start(self):
+        self.batcher_nl.start()
+        self.batcher_gab.start()
+
+    async def stop(self):
+        await self.batcher_nl.stop()
+        await self.batcher_gab.stop()
+
+    async def predict(self, data):
+        # Logika sama dengan display_step_3 (validation.py): model gabungan hanya jika ada data lab
+        checked = validate_record(data, self.schema)
+        if not checked.valid()[0]:
+            raise InvalidInputError(f"Fitur wajib kosong atau tidak valid: {', '.join(checked.error_fields())}")
+        row_nl = list(checked.record(0, self.features_nl).values())
+        if checked.lab_available[0]:
+            row_gab = list(checked.record(0, self.features_gab).values())
+            prob_nl, prob_gab = await asyncio.gather(self.batcher_nl.predict(row_nl),
+                                                     self.batcher_gab.predict(row_gab))
+        else:
+            prob_nl, prob_gab = await self.batcher_nl.predict(row_nl), None
+
+        risk_nl = risk_category(prob_nl, *MODEL_THRESHOLDS['nonlab'])
+        risk_gab = risk_category(prob_gab, *MODEL_THRESHOLDS['gabungan']) if prob_gab is not None else None
+        return {
+            'prob_nl': prob_nl,
+            'risk_nl': risk_nl,
+            'prob_gab': prob_gab,
+            'risk_gab': risk_gab,
+            'final_risk': risk_gab or risk_nl,
+        }
+
+    def stats(self):
+        return {
+            name: {'batches': b.n_batches, 'items': b.n_items, 'queued': b.queue.qsize()}
+            for name, b in (('nonlab', self.batcher_nl), ('gabungan', self.batcher_gab))
+        }
+
+
+# KLIEN DALAM PROSES (tanpa HTTP)
+class PredictionClient:
+    def __init__(self, service):
+        self.service = service
+
+    async def predict(self, data):
+        return await self.service.predict(data)
+
+    async def predict_many(self, rows):
+        return await asyncio.gather(*(self.service.predict(r) for r in rows))
+
+
+# SERVER HTTP/1.1 MINIMAL
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def _response(status, payload, keep_alive=True):
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), 'text/plain; version=0.0.4; charset=utf-8'
+    else:
+        body, content_type = json.dumps(payload).encode(), 'application/json'
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+    if status == 503:
+        head += "Retry-After: 1\r\n"
+    return head.encode() + b"\r\n" + body
+
+
+class HttpServer:
+    def __init__(self, service, host='127.0.0.1', port=8600):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self.service.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.service.stop()
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _route(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok', 'batchers': self.service.stats()}
+        if path == '/metrics':
+            return 200, REGISTRY.expose()
+        if path != '/predict':
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'gunakan POST'}
+        try:
+            data = json.loads(body or b'{}')
+            if not isinstance(data, dict):
+                raise InvalidInputError("Body harus berupa objek JSON")
+            return 200, await self.service.predict(data)
+        except (json.JSONDecodeError, InvalidInputError) as e:
+            return 400, {'error': str(e)}
+        except QueueFullError as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    writer.write(_response(400, {'error': 'request line tidak valid'}, keep_alive=False))
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0) or 0)
+                if length > MAX_BODY_BYTES:
+                    writer.write(_response(413, {'error': 'body terlalu besar'}, keep_alive=False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version.upper() == 'HTTP/1.1')
+                status, payload = await self._route(method.upper(), path.split('?')[0], body)
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Layanan HTTP prediksi DiaLens dengan micro-batching.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+    parser.add_argument('--no-fast', action='store_true', help="Pakai model joblib asli, bukan versi terkompilasi")
+    args = parser.parse_args(argv)
+
+    models = load_models(fast=not args.no_fast)
+    service = PredictionService(models, args.max_batch_size, args.max_wait_ms, args.max_queue)
+
+    async def run():
+        server = await HttpServer(service, args.host, args.port).start()
+        print(f"✅ DiaLens API berjalan di http://{args.host}:{server.port}", file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
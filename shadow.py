@@ -0,0 +1,329 @@
+# EVALUASI SHADOW: setiap prediksi langkah 3 juga diskor model kandidat di latar
+#
+# Kandidat = versi di registri model (DIALENS_SHADOW_VERSIONS=v2,v3). display_step_3 hanya
+# memasukkan (fitur, probabilitas utama) ke queue tanpa menunggu; satu thread worker
+# mengumpulkan antrean jadi batch, menskor semua kandidat dengan satu predict_proba per
+# model, lalu menulis pasangan probabilitas ke log biner ringkas (21 byte per pasangan,
+# satu file per hari). Laporan offline membaca log per file (mmap) dengan memori konstan.
+#
+#   DIALENS_SHADOW_VERSIONS=v2 streamlit run app.py
+#   python shadow.py report                        # semua log di artifacts/shadow
+#   python shadow.py report --since 2026-10-01 --json laporan.json
+import argparse
+import fcntl
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from metrics import SHADOW_BATCH_SECONDS, SHADOW_DROPPED_TOTAL, SHADOW_ERRORS_TOTAL, SHADOW_PAIRS_TOTAL
+
+SHADOW_DIR = os.environ.get('DIALENS_SHADOW_DIR', os.path.join('artifacts', 'shadow'))
+SHADOW_VERSIONS = [v.strip() for v in os.environ.get('DIALENS_SHADOW_VERSIONS', '').split(',') if v.strip()]
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT = 1.0
+DEFAULT_MAX_QUEUE = 10_000
+
+MODEL_KINDS = ('nl', 'gab')
+THRESHOLD_KEYS = {'nl': 'nonlab', 'gab': 'gabungan'}  # kunci ActiveModels.thresholds
+BAND_NAMES = ('Rendah', 'Sedang', 'Tinggi')
+PAIR_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('model', 'u1'),           # indeks MODEL_KINDS
+    ('primary', 'u1'),         # id versi (lihat versions.json)
+    ('candidate', 'u1'),
+    ('band_primary', 'u1'),    # indeks BAND_NAMES
+    ('band_candidate', 'u1'),
+    ('prob_primary', '<f4'),
+    ('prob_candidate', '<f4'),
+])
+DELTA_BINS = 1000  # histogram |Δp| untuk kuantil tanpa menyimpan semua pasangan
+REPORT_CHUNK_ROWS = 1 << 20
+
+
+def _bands(prob, threshold, medium):
+    return ((prob >= medium).astype(np.uint8) + (prob >= threshold)).astype(np.uint8)
+
+
+# LOG PASANGAN
+class PairLog:
+    def __init__(self, root=SHADOW_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._versions_path = os.path.join(root, 'versions.json')
+        self.versions = read_versions(root)
+
+    def version_id(self, name):
+        # versions.json dipakai bersama semua proses/replika di root yang sama: id baru hanya
+        # diberikan di bawah flock dari daftar yang dibaca ulang (append-only, id lama tidak berubah)
+        if name not in self.versions:
+            with open(os.path.join(self.root, 'versions.lock'), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.versions = read_versions(self.root)
+                if name not in self.versions:
+                    if len(self.versions) >= 255:
+                        raise ValueError("Terlalu banyak versi di log shadow")
+                    self.versions.append(name)
+                    tmp = f'{self._versions_path}.{os.getpid()}.tmp'
+                    with open(tmp, 'w') as f:
+                        json.dump(self.versions, f)
+                    os.replace(tmp, self._versions_path)
+        return self.versions.index(name)
+
+    def write(self, pairs):
+        # Satu write() per batch; file per hari (UTC) agar laporan bisa dibatasi tanggal
+        path = os.path.join(self.root, time.strftime('pairs-%Y%m%d.bin', time.gmtime()))
+        with open(path, 'ab') as f:
+            f.write(pairs.tobytes())
+
+
+def read_versions(root=SHADOW_DIR):
+    try:
+        with open(os.path.join(root, 'versions.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def iter_pair_files(root=SHADOW_DIR, since=None, chunk_rows=REPORT_CHUNK_ROWS):
+    for path in sorted(glob.glob(os.path.join(root, 'pairs-*.bin'))):
+        day = os.path.basename(path)[6:14]
+        if since and day < since.replace('-', ''):
+            continue
+        n = os.path.getsize(path) // PAIR_DTYPE.itemsize
+        if not n:
+            continue
+        # Baris terakhir yang belum lengkap (tulisan sedang berjalan) diabaikan; dibaca per irisan
+        pairs = np.memmap(path, dtype=PAIR_DTYPE, mode='r', shape=(n,))
+        for start in range(0, n, chunk_rows):
+            yield pairs[start:start + chunk_rows]
+
+
+# WORKER
+class ShadowEvaluator:
+    def __init__(self, versions, registry=None, log=None, batch_size=DEFAULT_BATCH_SIZE,
+                 max_wait=DEFAULT_MAX_WAIT, max_queue=DEFAULT_MAX_QUEUE):
+        from model_registry import ModelRegistry
+
+        self.versions = list(versions)
+        self.registry = registry or ModelRegistry()
+        self.log = log or PairLog()
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.candidates = {}
+        self.errors = {}
+        self.n_batches = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dialens-shadow', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, kind, values, features, prob, primary):
+        # Dipanggil di jalur permintaan: hanya put_nowait, tidak pernah menunggu
+        try:
+            self.queue.put_nowait((time.time(), kind, tuple(values), tuple(features), float(prob),
+                                   primary.version, *primary.thresholds[THRESHOLD_KEYS[kind]]))
+            return True
+        except queue.Full:
+            SHADOW_DROPPED_TOTAL.inc()
+            return False
+
+    def _load_candidates(self):
+        for version in self.versions:
+            if version in self.candidates or version in self.errors:
+                continue
+            try:
+                self.candidates[version] = self.registry.load(version)
+            except Exception as e:
+                self.errors[version] = str(e)
+                SHADOW_ERRORS_TOTAL.labels(version).inc()
+
+    def _collect(self):
+        items = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        self._load_candidates()
+        while not self._stop.is_set():
+            items = self._collect()
+            if any(item is None for item in items):
+                items = [item for item in items if item is not None]
+                self._stop.set()
+            if items:
+                try:
+                    self.process(items)
+                except Exception as e:
+                    self.errors['batch'] = str(e)
+                    SHADOW_ERRORS_TOTAL.labels('batch').inc()
+
+    def process(self, items):
+        with SHADOW_BATCH_SECONDS.time():
+            blocks = []
+            # Kelompokkan per (jenis model, urutan fitur) → satu matriks per kandidat
+            groups = {}
+            for item in items:
+                groups.setdefault((item[1], item[3]), []).append(item)
+            for (kind, features), group in groups.items():
+                X = np.array([item[2] for item in group], dtype=np.float32)
+                ts = np.array([item[0] for item in group])
+                prob_primary = np.array([item[4] for item in group], dtype=np.float32)
+                band_primary = _bands(prob_primary, np.array([item[6] for item in group]),
+                                      np.array([item[7] for item in group]))
+                primary_ids = np.array([self.log.version_id(item[5]) for item in group], dtype=np.uint8)
+                for version, candidate in list(self.candidates.items()):
+                    try:
+                        prob = _candidate_proba(candidate, kind, X, list(features))
+                    except Exception as e:
+                        # Mis. kandidat butuh fitur yang tidak dikirim model utama: kandidat ini
+                        # dihentikan (tidak dimuat ulang), kandidat lain tetap ditulis
+                        del self.candidates[version]
+                        self.errors[version] = f"{type(e).__name__}: {e}"
+                        SHADOW_ERRORS_TOTAL.labels(version).inc()
+                        continue
+                    block = np.empty(len(group), dtype=PAIR_DTYPE)
+                    block['ts'] = ts
+                    block['model'] = MODEL_KINDS.index(kind)
+                    block['primary'] = primary_ids
+                    block['candidate'] = self.log.version_id(version)
+                    block['band_primary'] = band_primary
+                    block['band_candidate'] = _bands(prob, *candidate.thresholds[THRESHOLD_KEYS[kind]])
+                    block['prob_primary'] = prob_primary
+                    block['prob_candidate'] = prob
+                    blocks.append(block)
+                    SHADOW_PAIRS_TOTAL.labels(version).inc(len(group))
+            if blocks:
+                self.log.write(np.concatenate(blocks))
+            self.n_batches += 1
+
+    def close(self, timeout=5.0):
+        # Sentinel: sisa antrean diproses dulu sebelum thread berhenti
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+
+def _candidate_proba(candidate, kind, X, features):
+    bundle = candidate.bundle
+    if kind == 'nl':
+        model, cand_features = bundle.table_nl or bundle.fast_nl or bundle.model_nl, bundle.features_nl
+    else:
+        model, cand_features = bundle.fast_gab or bundle.model_gab, bundle.features_gab
+    if list(cand_features) != features:
+        X = X[:, [features.index(f) for f in cand_features]]
+    if hasattr(model, 'predict_row'):
+        return model.predict_proba(X)[:, 1].astype(np.float32)
+    import pandas as pd
+    return model.predict_proba(pd.DataFrame(X, columns=cand_features))[:, 1].astype(np.float32)
+
+
+# LAPORAN OFFLINE
+def _new_group():
+    return {'n': 0, 'confusion': np.zeros(9, dtype=np.int64), 'sum_delta': 0.0, 'sum_abs': 0.0,
+            'max_abs': 0.0, 'hist': np.zeros(DELTA_BINS, dtype=np.int64)}
+
+
+def report(root=SHADOW_DIR, since=None):
+    # Akumulasi per (model, utama, kandidat): jumlah, matriks kategori 3x3, momen Δp, histogram |Δp|
+    acc = {}
+    n_total = 0
+    for pairs in iter_pair_files(root, since):
+        key = (pairs['model'].astype(np.int64) * 256 + pairs['primary']) * 256 + pairs['candidate']
+        keys, inv = np.unique(key, return_inverse=True)
+        G = len(keys)
+        delta = pairs['prob_candidate'].astype(np.float64) - pairs['prob_primary']
+        abs_delta = np.abs(delta)
+        cell = pairs['band_primary'].astype(np.int64) * 3 + pairs['band_candidate']
+        bins = np.minimum((abs_delta * DELTA_BINS).astype(np.int64), DELTA_BINS - 1)
+        counts = np.bincount(inv, minlength=G)
+        confusion = np.bincount(inv * 9 + cell, minlength=G * 9).reshape(G, 9)
+        sum_delta = np.bincount(inv, weights=delta, minlength=G)
+        sum_abs = np.bincount(inv, weights=abs_delta, minlength=G)
+        hist = np.bincount(inv * DELTA_BINS + bins, minlength=G * DELTA_BINS).reshape(G, DELTA_BINS)
+        max_abs = np.zeros(G)
+        np.maximum.at(max_abs, inv, abs_delta)
+        for g, k in enumerate(keys):
+            group = acc.setdefault(int(k), _new_group())
+            group['n'] += int(counts[g])
+            group['confusion'] += confusion[g]
+            group['sum_delta'] += sum_delta[g]
+            group['sum_abs'] += sum_abs[g]
+            group['max_abs'] = max(group['max_abs'], float(max_abs[g]))
+            group['hist'] += hist[g]
+        n_total += len(pairs)
+
+    names = read_versions(root)
+    groups = []
+    for k, group in sorted(acc.items()):
+        model, rest = divmod(k, 256 * 256)
+        primary, candidate = divmod(rest, 256)
+        n = group['n']
+        matrix = group['confusion'].reshape(3, 3)
+        cdf = np.cumsum(group['hist']) / n
+        groups.append({
+            'model': MODEL_KINDS[model],
+            'primary': names[primary] if primary < len(names) else str(primary),
+            'candidate': names[candidate] if candidate < len(names) else str(candidate),
+            'pairs': n,
+            'band_agreement': round(float(np.trace(matrix)) / n, 4),
+            'confusion': {BAND_NAMES[i]: dict(zip(BAND_NAMES, map(int, matrix[i]))) for i in range(3)},
+            'mean_delta': round(group['sum_delta'] / n, 5),
+            'mean_abs_delta': round(group['sum_abs'] / n, 5),
+            # Batas atas bin histogram (resolusi 1/DELTA_BINS)
+            'p50_abs_delta': round(float(np.searchsorted(cdf, 0.5) + 1) / DELTA_BINS, 3),
+            'p95_abs_delta': round(float(np.searchsorted(cdf, 0.95) + 1) / DELTA_BINS, 3),
+            'max_abs_delta': round(group['max_abs'], 5),
+        })
+    return {'pairs': n_total, 'groups': groups}
+
+
+def format_report(result):
+    lines = [f"{result['pairs']:,} pasangan"]
+    for g in result['groups']:
+        lines.append(
+            f"  [{g['model']}] {g['primary']} → {g['candidate']}: {g['pairs']:,} pasangan, "
+            f"kesepakatan kategori {g['band_agreement']:.1%}, Δp rata-rata {g['mean_delta']:+.4f}, "
+            f"|Δp| rata-rata {g['mean_abs_delta']:.4f} (p95 ≤ {g['p95_abs_delta']:.3f}, maks {g['max_abs_delta']:.4f})")
+    return '\n'.join(lines)
+
+
+# CLI
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluasi shadow model kandidat DiaLens.")
+    parser.add_argument('--log-dir', default=SHADOW_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_report = sub.add_parser('report', help="Ringkasan kesepakatan dan selisih probabilitas")
+    p_report.add_argument('--since', help="Tanggal awal (YYYY-MM-DD, UTC)")
+    p_report.add_argument('--json', help="Simpan hasil lengkap (termasuk matriks kategori) ke file JSON")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    result = report(args.log_dir, args.since)
+    print(format_report(result))
+    print(f"✅ Laporan dihitung dalam {time.perf_counter() - t0:.2f} dtk", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
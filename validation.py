@@ -0,0 +1,202 @@
+# VALIDASI & KOERSI INPUT: satu skema untuk UI (satu baris) dan skor batch (jutaan baris)
+#
+# Skema dibentuk dari feature_names_in_ model + rentang di config.py. Kolom dikonversi ke
+# matriks float sekaligus (tanpa loop per baris); hasilnya bitmask per baris, bit j = kolom j:
+#   errors   — fitur wajib kosong / bukan angka / di luar rentang → baris tidak diskor
+#   imputed  — data lab kosong (0) / tidak valid → diganti LAB_DEFAULTS
+#   rejected — data lab diisi tetapi bukan angka / di luar rentang (bagian dari imputed)
+#
+# Ringkasan validasi file skrining:
+#   python validation.py skrining.parquet
+import argparse
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from config import BINARY_FEATURES, INPUT_RANGES, LAB_DEFAULTS, LAB_RANGES
+
+DECLARED_FIELDS = list(INPUT_RANGES) + BINARY_FEATURES + list(LAB_RANGES)
+
+
+class Schema:
+    def __init__(self, fields):
+        self.fields = list(fields)
+        if len(self.fields) > 32:
+            raise ValueError(f"Skema maksimal 32 kolom (bitmask uint32), diberikan {len(self.fields)}")
+        ranges = {**INPUT_RANGES, **LAB_RANGES, **{f: (0, 1) for f in BINARY_FEATURES}}
+        self.position = {f: j for j, f in enumerate(self.fields)}
+        self.low = np.array([ranges.get(f, (-np.inf, np.inf))[0] for f in self.fields], dtype=np.float64)
+        self.high = np.array([ranges.get(f, (-np.inf, np.inf))[1] for f in self.fields], dtype=np.float64)
+        self.binary = np.array([f in BINARY_FEATURES for f in self.fields])
+        self.default = np.array([LAB_DEFAULTS.get(f, np.nan) for f in self.fields], dtype=np.float64)
+        self.optional = ~np.isnan(self.default)
+        self.optional_bits = self.bits(f for f in self.fields if f in LAB_DEFAULTS)
+
+    def bits(self, fields=None):
+        fields = self.fields if fields is None else fields
+        return np.uint32(sum(1 << self.position[f] for f in fields))
+
+    def names(self, bits):
+        bits = int(bits)
+        return [f for j, f in enumerate(self.fields) if bits >> j & 1]
+
+
+@lru_cache(maxsize=16)
+def get_schema(fields=tuple(DECLARED_FIELDS)):
+    return Schema(fields)
+
+
+def input_fields(features_nl, features_gab):
+    # Kolom gabungan dulu (urutan model), lalu sisa fitur non-lab dan kolom lab
+    fields = list(features_gab)
+    fields += [f for f in list(features_nl) + list(LAB_DEFAULTS) if f not in fields]
+    return tuple(fields)
+
+
+# KOERSI (vektor)
+def coerce_column(values, dtype=np.float32):
+    # → (nilai float, mask "diisi tetapi bukan angka" atau None); kosong/None/NaN = NaN
+    if not hasattr(values, 'dtype'):
+        values = np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        if hasattr(values, 'to_numpy'):
+            return values.to_numpy(dtype=dtype, na_value=np.nan), None
+        return np.asarray(values, dtype=dtype), None
+    import pandas as pd
+    text = pd.Series(values).astype('string').str.strip().str.replace(',', '.', regex=False)
+    nums = pd.to_numeric(text, errors='coerce')
+    unparsed = (nums.isna() & text.notna() & (text != '')).to_numpy(dtype=bool)
+    return nums.to_numpy(dtype=dtype, na_value=np.nan), unparsed
+
+
+class Validation:
+    def __init__(self, schema, X, errors, imputed, rejected):
+        self.schema = schema
+        self.X = X
+        self.errors = errors
+        self.imputed = imputed
+        self.rejected = rejected
+
+    def __len__(self):
+        return len(self.errors)
+
+    def valid(self, fields=None):
+        return (self.errors & self.schema.bits(fields)) == 0
+
+    @property
+    def lab_available(self):
+        # Sama dengan display_step_3: minimal satu nilai lab diisi dan valid
+        return (~self.imputed & self.schema.optional_bits) != 0
+
+    def matrix(self, fields):
+        if list(fields) == self.schema.fields:
+            return self.X
+        return self.X[:, [self.schema.position[f] for f in fields]]
+
+    def record(self, i, fields):
+        values = self.X[i, [self.schema.position[f] for f in fields]].tolist()
+        return dict(zip(fields, values))
+
+    def error_fields(self, i=0):
+        return self.schema.names(self.errors[i])
+
+    def imputed_fields(self, i=0):
+        return self.schema.names(self.imputed[i])
+
+    def rejected_fields(self, i=0):
+        return self.schema.names(self.rejected[i])
+
+
+def validate_matrix(X, schema, unparsed=None):
+    # X (n, kolom skema) float; nilai lab yang diimputasi ditulis langsung ke X
+    n = X.shape[0]
+    errors = np.zeros(n, dtype=np.uint32)
+    imputed = np.zeros(n, dtype=np.uint32)
+    rejected = np.zeros(n, dtype=np.uint32) if unparsed is None else unparsed & schema.optional_bits
+    for j in range(len(schema.fields)):
+        x = X[:, j]
+        bit = np.uint32(1 << j)
+        missing = np.isnan(x)
+        bad = (x < schema.low[j]) | (x > schema.high[j])
+        if schema.binary[j]:
+            bad |= (x != 0) & (x != 1)
+        if schema.optional[j]:
+            # 0 = tidak diisi (bukan di luar rentang)
+            empty = missing | (x == 0)
+            bad &= ~empty
+            fill = empty | bad
+            x[fill] = schema.default[j]
+            np.bitwise_or(imputed, bit, out=imputed, where=fill)
+            np.bitwise_or(rejected, bit, out=rejected, where=bad)
+        else:
+            np.bitwise_or(errors, bit, out=errors, where=missing | bad)
+    return Validation(schema, X, errors, imputed, rejected)
+
+
+def validate_columns(columns, schema, n=None, dtype=np.float32):
+    # columns: DataFrame / {nama: array, Series, list}; kolom yang tidak ada = kosong
+    present = [f for f in schema.fields if f in columns]
+    if n is None:
+        n = len(columns) if hasattr(columns, 'columns') else (len(columns[present[0]]) if present else 0)
+    X = np.full((n, len(schema.fields)), np.nan, dtype=dtype)
+    unparsed = None
+    for f in present:
+        j = schema.position[f]
+        X[:, j], bad = coerce_column(columns[f], dtype)
+        if bad is not None and bad.any():
+            if unparsed is None:
+                unparsed = np.zeros(n, dtype=np.uint32)
+            np.bitwise_or(unparsed, np.uint32(1 << j), out=unparsed, where=bad)
+    # Nilai wajib yang bukan angka sudah NaN → tercatat sebagai error
+    return validate_matrix(X, schema, unparsed)
+
+
+def validate_record(record, schema=None):
+    # Satu baris (dict dari form / JSON); float64 agar nilai tampil persis seperti diketik
+    schema = schema or get_schema()
+    return validate_columns({f: [record[f]] for f in schema.fields if f in record}, schema, n=1,
+                            dtype=np.float64)
+
+
+# CLI
+def summarize(path, chunksize=None):
+    from scoring import DEFAULT_CHUNKSIZE, iter_chunks, load_models
+
+    _, _, features_nl, features_gab = load_models()
+    schema = get_schema(input_fields(features_nl, features_gab))
+    k = len(schema.fields)
+    counts = {name: np.zeros(k, dtype=np.int64) for name in ('errors', 'imputed', 'rejected')}
+    n_rows = n_invalid = n_lab = 0
+    for chunk in iter_chunks(path, chunksize or DEFAULT_CHUNKSIZE):
+        result = validate_columns(chunk, schema)
+        n_rows += len(result)
+        n_invalid += int((result.errors != 0).sum())
+        n_lab += int(result.lab_available.sum())
+        for name, total in counts.items():
+            bits = getattr(result, name)
+            total += ((bits[:, None] >> np.arange(k, dtype=np.uint32)) & 1).sum(axis=0, dtype=np.int64)
+    return schema, n_rows, n_invalid, n_lab, counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validasi input skrining DiaLens (CSV/Parquet).")
+    parser.add_argument('input', help="File input (.csv atau .parquet)")
+    parser.add_argument('--chunksize', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    schema, n_rows, n_invalid, n_lab, counts = summarize(args.input, args.chunksize)
+    elapsed = time.perf_counter() - t0
+    print(f"{n_rows} baris: {n_invalid} tidak valid (tidak diskor), {n_lab} dengan data lab "
+          f"({elapsed:.2f} dtk)")
+    print(f"{'kolom':<24}{'error':>10}{'imputasi':>10}{'ditolak':>10}")
+    for j, f in enumerate(schema.fields):
+        print(f"{f:<24}{counts['errors'][j]:>10}{counts['imputed'][j]:>10}{counts['rejected'][j]:>10}")
+    print("✅ Semua baris valid" if n_invalid == 0 else f"❌ {n_invalid} baris tidak valid")
+    return 0 if n_invalid == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
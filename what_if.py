@@ -0,0 +1,202 @@
+# SIMULASI WHAT-IF: kurva risiko untuk profil pengguna saat satu/dua fitur diubah
+#
+# Setiap sapuan (DietQuality x Smoking, HbA1c 4.0–10.0) dibuat sebagai satu matriks dan
+# diskor dengan satu predict_proba per model. Hasil + figure di-cache per profil, sehingga
+# menggeser slider simulasi hanya lookup ke array, bukan panggilan model.
+import numpy as np
+import streamlit as st
+
+from config import LAB_DEFAULTS, MODEL_GABUNGAN_PATH, MODEL_NON_LAB_PATH, MODEL_THRESHOLDS, risk_category
+from metrics import WHAT_IF_SWEEP_SECONDS
+
+DIET_VALUES = np.arange(0, 11)
+SMOKING_VALUES = np.array([0, 1])
+HBA1C_VALUES = np.round(np.arange(40, 101) / 10, 1)  # 4.0–10.0, langkah 0.1
+
+
+# SAPUAN (vektor)
+def lab_available(profile):
+    # Sama dengan display_step_3
+    return profile.get('HbA1c', 0) != 0 or profile.get('FastingBloodSugar', 0) != 0
+
+
+def model_input(profile, features, lab_defaults=False):
+    values = []
+    for feat in features:
+        val = profile.get(feat)
+        if lab_defaults and feat in LAB_DEFAULTS and val == 0:
+            val = LAB_DEFAULTS[feat]
+        values.append(val)
+    return np.asarray(values, dtype=np.float32)
+
+
+def grid_matrix(base, features, columns):
+    # Produk kartesius nilai pada `columns` ({fitur: nilai}); kolom lain tetap nilai profil
+    names = list(columns)
+    mesh = np.meshgrid(*[np.asarray(columns[name], dtype=np.float32) for name in names], indexing='ij')
+    X = np.repeat(base[None, :], mesh[0].size, axis=0)
+    for name, values in zip(names, mesh):
+        X[:, features.index(name)] = values.ravel()
+    return X
+
+
+def _predict(model, X, features):
+    if hasattr(model, 'predict_row'):
+        return model.predict_proba(X)[:, 1]
+    import pandas as pd
+    return model.predict_proba(pd.DataFrame(X, columns=features))[:, 1]
+
+
+def compute_sweeps(profile, model_nl, features_nl, model_gab, features_gab):
+    lab = lab_available(profile)
+    diet_columns = {'DietQuality': DIET_VALUES, 'Smoking': SMOKING_VALUES}
+    base_gab = model_input(profile, features_gab, lab_defaults=True)
+    X_hba1c = grid_matrix(base_gab, features_gab, {'HbA1c': HBA1C_VALUES})
+    with WHAT_IF_SWEEP_SECONDS.time():
+        if lab:
+            # Kedua sapuan memakai model gabungan → digabung jadi satu panggilan
+            X_diet = grid_matrix(base_gab, features_gab, diet_columns)
+            probs = _predict(model_gab, np.vstack([X_diet, X_hba1c]), features_gab)
+            diet, hba1c = probs[:len(X_diet)], probs[len(X_diet):]
+        else:
+            X_diet = grid_matrix(model_input(profile, features_nl), features_nl, diet_columns)
+            diet = _predict(model_nl, X_diet, features_nl)
+            hba1c = _predict(model_gab, X_hba1c, features_gab)
+    return {
+        'lab_available': lab,
+        'diet_smoking': diet.reshape(len(DIET_VALUES), len(SMOKING_VALUES)),
+        'hba1c': hba1c,
+    }
+
+
+def hba1c_index(value):
+    return int(np.clip(round((value - HBA1C_VALUES[0]) * 10), 0, len(HBA1C_VALUES) - 1))
+
+
+def profile_hba1c(profile):
+    value = profile.get('HbA1c', 0)
+    return value if value else LAB_DEFAULTS['HbA1c']
+
+
+# FIGURE
+def _threshold_lines(fig, thresholds):
+    fig.add_hline(y=thresholds[0], line_dash='dash', line_color='#E76F51',
+                  annotation_text='Tinggi', annotation_position='top left')
+    fig.add_hline(y=thresholds[1], line_dash='dot', line_color='#F4A261',
+                  annotation_text='Sedang', annotation_position='bottom left')
+
+
+def _layout(fig, x_title):
+    fig.update_layout(
+        xaxis_title=x_title,
+        yaxis=dict(title='Probabilitas risiko', tickformat='.0%', range=[0, 1]),
+        margin=dict(l=0, r=0, t=30, b=0),
+        height=320,
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='left', x=0),
+    )
+
+
+def diet_thresholds(sweeps, thresholds):
+    # Sapuan diet memakai model gabungan jika ada data lab, selain itu model non-lab
+    return thresholds['gabungan' if sweeps['lab_available'] else 'nonlab']
+
+
+def build_sweep_figures(sweeps, profile, thresholds=MODEL_THRESHOLDS):
+    import plotly.graph_objects as go
+
+    diet_smoking = sweeps['diet_smoking']
+    fig_diet = go.Figure()
+    for smoking, name, color in ((0, 'Tidak merokok', '#2A9D8F'), (1, 'Merokok', '#E76F51')):
+        fig_diet.add_trace(go.Scatter(
+            x=DIET_VALUES, y=diet_smoking[:, smoking], mode='lines+markers', name=name,
+            line=dict(color=color), hovertemplate='Diet %{x}: %{y:.1%}<extra></extra>',
+        ))
+    diet, smoking = int(profile['DietQuality']), int(profile['Smoking'])
+    fig_diet.add_trace(go.Scatter(
+        x=[diet], y=[diet_smoking[diet, smoking]], mode='markers', name='Profil Anda',
+        marker=dict(size=14, color='#F4A261', symbol='star'), hovertemplate='Profil Anda: %{y:.1%}<extra></extra>',
+    ))
+    _threshold_lines(fig_diet, diet_thresholds(sweeps, thresholds))
+    _layout(fig_diet, 'Kualitas Diet')
+
+    current = profile_hba1c(profile)
+    fig_hba1c = go.Figure(go.Scatter(
+        x=HBA1C_VALUES, y=sweeps['hba1c'], mode='lines', name='HbA1c', line=dict(color='#1D3557'),
+        hovertemplate='HbA1c %{x:.1f}%: %{y:.1%}<extra></extra>',
+    ))
+    fig_hba1c.add_trace(go.Scatter(
+        x=[current], y=[sweeps['hba1c'][hba1c_index(current)]], mode='markers', name='Profil Anda',
+        marker=dict(size=14, color='#F4A261', symbol='star'), hovertemplate='Profil Anda: %{y:.1%}<extra></extra>',
+    ))
+    for x, label in ((5.7, 'Prediabetes'), (6.5, 'Diabetes')):
+        fig_hba1c.add_vline(x=x, line_dash='dot', line_color='#6C757D', annotation_text=label)
+    _threshold_lines(fig_hba1c, thresholds['gabungan'])
+    _layout(fig_hba1c, 'HbA1c (%)')
+    return fig_diet, fig_hba1c
+
+
+# CACHE PER PROFIL (dipakai bersama semua sesi)
+def profile_key(profile):
+    return tuple(sorted((k, float(v)) for k, v in profile.items() if v is not None))
+
+
+def model_versions(non_lab_path=MODEL_NON_LAB_PATH, gabungan_path=MODEL_GABUNGAN_PATH):
+    from prediction_cache import model_fingerprint
+    return model_fingerprint(non_lab_path), model_fingerprint(gabungan_path)
+
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def get_what_if(profile_items, versions, _models, thresholds=tuple(MODEL_THRESHOLDS.items())):
+    # versions hanya sebagai kunci cache: file model / versi registri berubah → sapuan dihitung ulang
+    profile = dict(profile_items)
+    sweeps = compute_sweeps(
+        profile,
+        _models.table_nl or _models.fast_nl or _models.model_nl, _models.features_nl,
+        _models.fast_gab or _models.model_gab, _models.features_gab,
+    )
+    return sweeps, *build_sweep_figures(sweeps, profile, dict(thresholds))
+
+
+# PANEL STREAMLIT
+def _risk_delta(prob, base, thresholds):
+    return f"{(prob - base) * 100:+.1f} poin • {risk_category(prob, *thresholds)}"
+
+
+def render_what_if_panel(profile, models, versions=None, thresholds=None):
+    st.header("🔍 Simulasi: Bagaimana Jika...?")
+    st.caption("Ubah nilai di bawah untuk melihat perkiraan perubahan risiko tanpa kembali ke langkah 2.")
+    thresholds = thresholds or MODEL_THRESHOLDS
+    try:
+        sweeps, fig_diet, fig_hba1c = get_what_if(profile_key(profile), versions or model_versions(), models,
+                                                  tuple(sorted(thresholds.items())))
+    except Exception as e:
+        st.warning(f"⚠️ Simulasi tidak tersedia: {str(e)}")
+        return
+
+    model_label = "dengan data lab" if sweeps['lab_available'] else "tanpa lab"
+    tab_diet, tab_hba1c = st.tabs(["🥗 Diet & Merokok", "🧪 HbA1c"])
+
+    with tab_diet:
+        diet_now, smoking_now = int(profile['DietQuality']), int(profile['Smoking'])
+        col1, col2 = st.columns(2)
+        with col1:
+            diet = st.slider("Kualitas Diet (simulasi)", 0, 10, diet_now, key="wi_diet")
+        with col2:
+            smoking = st.radio(
+                "Merokok (simulasi)", [0, 1], index=smoking_now,
+                format_func=lambda x: "❌ Tidak" if x == 0 else "✅ Ya", horizontal=True, key="wi_smoking",
+            )
+        prob = float(sweeps['diet_smoking'][diet, smoking])
+        base = float(sweeps['diet_smoking'][diet_now, smoking_now])
+        st.metric(f"Probabilitas (model {model_label})", f"{prob:.1%}", _risk_delta(prob, base, diet_thresholds(sweeps, thresholds)), delta_color="inverse")
+        st.plotly_chart(fig_diet, use_container_width=True)
+
+    with tab_hba1c:
+        hba1c_now = profile_hba1c(profile)
+        hba1c = st.slider("HbA1c (%) (simulasi)", 4.0, 10.0, float(np.clip(hba1c_now, 4.0, 10.0)), 0.1, key="wi_hba1c")
+        prob = float(sweeps['hba1c'][hba1c_index(hba1c)])
+        base = float(sweeps['hba1c'][hba1c_index(hba1c_now)])
+        st.metric("Probabilitas (model dengan data lab)", f"{prob:.1%}", _risk_delta(prob, base, thresholds['gabungan']), delta_color="inverse")
+        if not sweeps['lab_available']:
+            st.caption(f"Data lab tidak diisi: kurva memakai gula darah puasa normal ({LAB_DEFAULTS['FastingBloodSugar']:.0f} mg/dL).")
+        st.plotly_chart(fig_hba1c, use_container_width=True)